@@ -17,15 +17,20 @@ class Entry
         // what score it is given by the algorithm
         double score;
 
+        // its structural mismatch score
+        double str_score;
+
         // kmer in second sequence it was compared to
         string match;
 
         // constructor to set values from within program
-        Entry(string iseq, int ipos, double iscore, string imatch)
+        Entry(string iseq, int ipos, double iscore, double istr_score,
+              string imatch)
         {
             seq = iseq;
             pos = ipos;
             score = iscore;
+            str_score = istr_score;
             match = imatch;
         }
 };
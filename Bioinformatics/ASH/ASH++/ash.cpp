@@ -8,7 +8,9 @@
 
 using namespace std;
 
-int main(void)
+// "ash" runs the example below, "ash SEQ1 SEQ2 KMER" scores two aligned
+// sequences and prints every kmer
+int main(int argc, char *argv[])
 {
     // two strings to analyze
     string x = "CDSVVVHVLKLQGAVPFVHTNVPQSMFSYDCSNPLFGQTVNPWKSSKSPGGSSGGEGALI";
@@ -17,16 +19,30 @@ int main(void)
     // desired kmer length
     int kmer = 15;
 
-    // get a vector of Entry objects of results 
+    // show every kmer when given sequences, or those with a
+    // mismatch score above, say, 4
+    double threshold = 4;
+    if ( argc == 4 ) {
+        x = argv[1];
+        y = argv[2];
+        kmer = atoi(argv[3]);
+        threshold = -1;
+    }
+    else if ( argc != 1 ) {
+        cerr << "usage: ash [SEQ1 SEQ2 KMER]" << endl;
+        return 1;
+    }
+
+    // get a vector of Entry objects of results
     vector <Entry> test_results = seq_to_seq(x, y, kmer);
 
     // iterate though vector of objects and display results
-    // with a mistmatch score above, say, 4
     for( Entry item : test_results) {
-        if (item.score > 4 ) {
+        if (item.score > threshold ) {
             cout << item.pos << "\t";
             cout << item.seq << "\t";
             cout << item.score << "\t";
+            cout << item.str_score << "\t";
             cout << item.match << "\t" << endl;
         }
     }
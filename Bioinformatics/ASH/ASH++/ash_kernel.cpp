@@ -0,0 +1,74 @@
+/*  Window scoring kernel for the Python version of ASH. Python loads
+    this as a shared library (see native.py) and passes its NumPy
+    arrays straight in, so nothing is copied on the way. The kernel
+    does not know the scale itself: it is handed the same 256x256
+    lookup tables that scoring.py builds from the scalar methods of
+    Analysis, so the two can't drift apart the way ash_utils.h has.
+    The sums are added up in the same order NumPy adds them up, which
+    keeps the results identical to the pure Python path.
+
+    Build it with "make" in this directory.                          */
+
+#include <cmath>
+#include <cstdint>
+
+extern "C" {
+
+
+// fills in the prefix sums of the per-position scores of an aligned
+// pair, with a leading zero, so the sum of window i of length k is
+// cum[i + k] - cum[i]. Returns the first position the tables can't
+// score (a NaN in either table), or -1 if every position is scored
+int64_t ash_profile(const unsigned char* seq1, const unsigned char* seq2,
+                    int64_t size, const double* hydro,
+                    const double* structure, const int64_t* philic,
+                    const int64_t* complexity, double* cum_hydro,
+                    double* cum_struct, int64_t* cum_philic,
+                    int64_t* cum_complex)
+{
+    int64_t unscored = -1;
+
+    cum_hydro[0]   = 0.0;
+    cum_struct[0]  = 0.0;
+    cum_philic[0]  = 0;
+    cum_complex[0] = 0;
+
+    for ( int64_t i = 0; i < size; i++ ) {
+        // index into the flattened tables
+        int64_t pair = seq1[i] * 256 + seq2[i];
+        double hydro_score  = hydro[pair];
+        double struct_score = structure[pair];
+
+        if ( unscored < 0 &&
+             ( std::isnan(hydro_score) || std::isnan(struct_score) ) ) {
+            unscored = i;
+        }
+        cum_hydro[i + 1]   = cum_hydro[i] + hydro_score;
+        cum_struct[i + 1]  = cum_struct[i] + struct_score;
+        cum_philic[i + 1]  = cum_philic[i] + philic[seq1[i]];
+        cum_complex[i + 1] = cum_complex[i] + complexity[seq1[i]];
+    }
+    return unscored;
+}
+
+
+// scores the windows of a given length at positions start to stop
+// from the prefix sums: both mismatch scores, and the number of
+// hydrophiles and structurally complex residues each window holds
+void ash_windows(const double* cum_hydro, const double* cum_struct,
+                 const int64_t* cum_philic, const int64_t* cum_complex,
+                 int64_t length, int64_t start, int64_t stop,
+                 double* hy_score, double* str_score,
+                 int64_t* philic, int64_t* complexity)
+{
+    for ( int64_t i = start; i < stop; i++ ) {
+        int64_t j = i - start;
+        hy_score[j]   = cum_hydro[i + length] - cum_hydro[i];
+        str_score[j]  = cum_struct[i + length] - cum_struct[i];
+        philic[j]     = cum_philic[i + length] - cum_philic[i];
+        complexity[j] = cum_complex[i + length] - cum_complex[i];
+    }
+}
+
+
+}
@@ -11,11 +11,26 @@ map <char, float> weight =
     {'D',  0.5}, {'E',  0.5}, {'R',  0.5}, {'K',  0.5}
 };
 
+// the structurally complex residues are weighted 1, the rest 0
+map <char, float> struct_weight =
+{
+    {'L', 0.0}, {'A', 0.0}, {'F', 1.0}, {'Y', 1.0},
+    {'W', 1.0}, {'I', 0.0}, {'V', 0.0}, {'H', 1.0},
+    {'N', 0.0}, {'C', 0.0}, {'G', 0.0}, {'M', 0.0},
+    {'Q', 0.0}, {'P', 1.0}, {'S', 0.0}, {'T', 0.0},
+    {'D', 0.0}, {'E', 0.0}, {'R', 0.0}, {'K', 0.0}
+};
+
 
 
 // function that gets distance between two residues
 double score_residues(char residue1, char residue2)
 {
+    // a gap against a residue is the largest mismatch
+    if ( residue1 == '-' || residue2 == '-' ) {
+        return 2.0;
+    }
+
     // get absolute value
     float subscore = abs(weight[residue1] - weight[residue2]);
 
@@ -64,6 +79,44 @@ double mismatch(string input_seq1, string input_seq2)
 
 
 
+// structural distance between two residues, as in the Python version
+double structure_score(char residue1, char residue2)
+{
+    if ( residue1 == '-' || residue2 == '-' ) {
+        return 2.0;
+    }
+    float subscore = abs(struct_weight[residue1] - struct_weight[residue2]);
+
+    // both complex or both not, but different residues
+    if ( subscore == 0 ) {
+        return 0.5;
+    }
+    else {
+        return subscore;
+    }
+}
+
+
+
+// structural mismatch of two strings: only pairs where at least one
+// residue is structurally complex, and that differ, are scored
+double structural_mismatch(string input_seq1, string input_seq2)
+{
+    double score = 0.0;
+    int size = input_seq1.length();
+
+    for ( int i = 0; i < size ; i++ ) {
+        bool complex1 = struct_weight[input_seq1[i]] > 0;
+        bool complex2 = struct_weight[input_seq2[i]] > 0;
+        if ( ( complex1 || complex2 ) && input_seq1[i] != input_seq2[i] ) {
+            score = score + structure_score(input_seq1[i], input_seq2[i]);
+        }
+    }
+    return score;
+}
+
+
+
 // function that gets a vector of custom Entry objects (see Entry.h)
 // for each kmer in string as compared to its match in the other string
 vector<Entry> seq_to_seq(string seq1, string seq2, int length)
@@ -84,13 +137,18 @@ vector<Entry> seq_to_seq(string seq1, string seq2, int length)
         // call mismatch to score the two compare_peptides
         double entry = mismatch(current_peptide, compare_peptide);
 
-        // create and Entry object capturing the score, position,
+        // and their structural mismatch
+        double str_entry = structural_mismatch(current_peptide,
+                                               compare_peptide);
+
+        // create and Entry object capturing the scores, position,
         // the sequence, and what it was compared to
         Entry results_obj = Entry
         (
                 current_peptide,    // seq
                 position,           // pos
                 entry,              // score
+                str_entry,          // str_score
                 compare_peptide     // match
         );
 
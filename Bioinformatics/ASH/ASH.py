@@ -8,7 +8,8 @@
 #                                                                      #
 #                     Usage Dependencies:                              #
 #                        -Python 3.5.3                                 #
-#                        -Scikit-bio                                   #
+#                        -NumPy                                        #
+#                        -Scikit-bio (optional, see aligner.py)        #
 #                                                                      #
 # This program analyzes FASTA sequences to find regions of chemical    #
 # distinctness and antigenicty. It takes in two fasta files, a name    #
@@ -28,9 +29,19 @@
 #----------------------------------------------------------------------#
 
 
+import heapq
 import sys
-from skbio.alignment import StripedSmithWaterman
-from models.Entry import Entry
+import aligner
+import background
+from models.Results import Results, Changes
+import scoring
+import selection
+import distinct
+import instrument
+import scales
+import scan
+import fastaio
+import numpy as np
 
 class Analysis(object):
 
@@ -45,28 +56,117 @@ class Analysis(object):
                        "G":+0.0, "M":+0.0, "Q":+0.0, "P":+1.0, "S":+0.0,
                        "T":+0.0, "D":+0.0, "E":+0.0, "R":+0.0, "K":+0.0 }
 
+
 #----------------------------------------------------------------------#
 #                            constructor                               #
 #----------------------------------------------------------------------#
 # The constructor takes 3 arguments: two .fasta files and an integer   #
 # of the desired kmer length. It calls functions to get the sequences  #
 # out of the files(get_seq), align the sequences (align), compare them #
-# using the scale(seq_to_seq), and writes the data to a csv            #
+# using the scale(seq_to_seq), and writes the data to a csv. A kmer of #
+# None skips the scan, which is useful when scan_kmers will be used to #
+# score several kmer sizes against the same alignment. With lazy=True  #
+# nothing is scanned up front either; iter_windows then scores the     #
+# kmers as they are asked for. An Instrument (see instrument.py)       #
+# given as instrument records the time spent in each stage. unknown    #
+# says what to do with residues that aren't on the scale: "error"      #
+# raises a KeyError, "gap" and "ignore" score lowercase letters and    #
+# ambiguity codes (B, Z, J) from the residues they stand for, and      #
+# anything else as a gap or as no mismatch (see scoring.resolve).      #
+# align_backend picks the aligner for this object: "ssw", "python" or  #
+# "banded" (see aligner.py), or None for the default. With workers     #
+# other than 1 the kmers are scanned chunk_size at a time by that many #
+# workers (None for all cores) in a "process" or "thread" pool (see    #
+# scan.py), which gives the same results as scanning them all at once  #
+#----------------------------------------------------------------------#
+    def __init__(self, first_seq_in, second_seq_in, kmer, cache=None,
+                 lazy=False, instrument=None, unknown="error",
+                 align_backend=None, workers=1, chunk_size=None,
+                 pool="process"):
+        self.instrument = instrument
+        # get the two sequences, then run the analysis on them
+        self.setup(self.get_seq(first_seq_in),
+                   self.get_seq(second_seq_in),
+                   kmer, cache=cache, lazy=lazy, instrument=instrument,
+                   unknown=unknown, align_backend=align_backend,
+                   workers=workers, chunk_size=chunk_size, pool=pool)
+
+
+#----------------------------------------------------------------------#
+#                          from_sequences                              #
+#----------------------------------------------------------------------#
+# Alternate constructor that takes the two sequences as strings rather #
+# than as .fasta files. If the pair has already been aligned, the      #
+# aligned sequences can be passed in as aligned and align is skipped.  #
+# Used by batch.py, which reads many targets from one file             #
+#----------------------------------------------------------------------#
+    @classmethod
+    def from_sequences(cls, first_seq, second_seq, kmer, aligned=None,
+                       cache=None, lazy=False, instrument=None,
+                       unknown="error", align_backend=None, workers=1,
+                       chunk_size=None, pool="process"):
+        analysis = cls.__new__(cls)
+        analysis.setup(first_seq, second_seq, kmer, aligned, cache, lazy,
+                       instrument, unknown, align_backend, workers,
+                       chunk_size, pool)
+        return analysis
+
+
+#----------------------------------------------------------------------#
+#                               setup                                  #
+#----------------------------------------------------------------------#
+# Does the work of the constructor once the sequences are in hand:     #
+# aligns them (unless an alignment is given) and scans the kmers (not  #
+# if lazy). If an AlignmentCache (see cache.py) is given, align looks  #
+# there first                                                          #
 #----------------------------------------------------------------------#
-    def __init__(self, first_seq_in, second_seq_in, kmer):
+    def setup(self, first_fasta, second_fasta, kmer, aligned=None,
+              cache=None, lazy=False, instrument=None, unknown="error",
+              align_backend=None, workers=1, chunk_size=None,
+              pool="process"):
         # the kmer size
         self.kmer_size    = kmer
-        # get the two sequences
-        self.first_fasta  = self.get_seq(first_seq_in)
-        self.second_fasta = self.get_seq(second_seq_in)
+        # where the stage timings go, if anywhere
+        self.instrument   = instrument
+        # how residues off the scale are scored
+        if unknown not in scoring.UNKNOWN:
+            raise ValueError("unknown must be one of %s"
+                             % ", ".join(scoring.UNKNOWN))
+        self.unknown      = unknown
+        # where alignments are kept between runs, if anywhere
+        self.cache        = cache
+        # which aligner align uses, checked before anything is aligned
+        if align_backend is not None:
+            aligner.get_backend(align_backend)
+        self.align_backend = align_backend
+        # how the kmers are scanned, checked before anything is aligned
+        if workers is not None and workers < 1:
+            raise ValueError("workers must be at least 1")
+        if chunk_size is not None and chunk_size < 1:
+            raise ValueError("chunk_size must be at least 1")
+        if pool not in scan.POOLS:
+            raise ValueError("pool must be one of %s"
+                             % ", ".join(scan.POOLS))
+        self.workers      = workers
+        self.chunk_size   = chunk_size
+        self.pool         = pool
+        # the two sequences
+        self.first_fasta  = first_fasta
+        self.second_fasta = second_fasta
         # call the skikit bio alignmnt function
-        self.aligned      = self.align(self.first_fasta,
+        if aligned is None:
+            aligned       = self.align(self.first_fasta,
                                        self.second_fasta)
+        self.aligned      = aligned
         # get the two sequences from the alignment
         self.sequence1    = self.aligned[0]
         self.sequence2    = self.aligned[1]
+        # where the aligned part starts in the first sequence
+        self.offset       = self.aligned_offset(self.first_fasta, aligned)
         # implement the ASH proceedure on the two sequences
-        self.results      = self.seq_to_seq(self.sequence1,
+        self.results      = None
+        if self.kmer_size is not None and not lazy:
+            self.results  = self.seq_to_seq(self.sequence1,
                                             self.sequence2,
                                             self.kmer_size)
 
@@ -74,51 +174,86 @@ class Analysis(object):
 #----------------------------------------------------------------------#
 #                            get_entries                               #
 #----------------------------------------------------------------------#
-# Member of ASH class, not Entry. Basic getter method returns list of  #
-# Entry objects created when a new ASH object is created.              #                                 #
+# Member of ASH class, not Entry. Basic getter method returns the      #
+# Results (one row per kmer) created when a new ASH object is created. #
+# It can be used like a list of Entry objects. A lazy object scans all #
+# its kmers the first time this is called                              #
 #----------------------------------------------------------------------#
     def get_entries(self):
+        if self.results is None and self.kmer_size is not None:
+            self.results = self.seq_to_seq(self.sequence1,
+                                           self.sequence2,
+                                           self.kmer_size)
         return self.results
 
 
+#----------------------------------------------------------------------#
+#                              stage                                   #
+#----------------------------------------------------------------------#
+# Returns a with-block that times the named stage on this object's     #
+# Instrument, or does nothing if it hasn't got one                     #
+#----------------------------------------------------------------------#
+    def stage(self, name):
+        return instrument.stage(getattr(self, "instrument", None), name)
+
+
 #----------------------------------------------------------------------#
 #                            get_seq                                   #
 #----------------------------------------------------------------------#
-# This is a vanilla fasta parser for solo fasta files. Skips header,   #
-# strips newlines, and concatenates sequences. Returns sequence        #
+# Returns the sequence of the first record in a fasta file. The file   #
+# is read by the streaming parser in fastaio.py, which joins the lines #
+# in one go, reads gzipped files, and doesn't run the records of a     #
+# multi-record file together. A name like file.fasta:RECORD_ID picks   #
+# one record out of a large file through its .fai index instead, and   #
+# a store made by seqstore.py is mapped rather than parsed             #
 #----------------------------------------------------------------------#
     def get_seq(self, filename):
-        # will store the sequence
-        seq = ""
-        # bail if file is not valid
-        data = open(filename, "r").readlines()
-        # get the sequence
-        for line in data:
-            if not line.startswith(">"):      # skips header
-                line = line.replace("\n", "") # removes newlines
-                seq += line
-        return seq
+        with self.stage("get_seq"):
+            return fastaio.read_sequence(filename)
 
 
 #----------------------------------------------------------------------#
 #                               align                                  #
 #----------------------------------------------------------------------#
 # Takes the parsed fasta files from get_seq (called by contructor) and #
-# passes them to scikit bio's StripedSmithWaterman function. Returns   #
-# an array with the sequences. We need to access the sequences         #
-# individually now that the gaps have been filled in appropiately      #
+# passes them to scikit bio's StripedSmithWaterman function, or to     #
+# whichever aligner in aligner.py align_backend names. Returns an      #
+# array with the sequences. We need to access the sequences            #
+# individually now that the gaps have been filled in appropiately.     #
+# With a cache, a pair that has been aligned before is read back from  #
+# it instead of being aligned again                                    #
 #----------------------------------------------------------------------#
     def align(self, seq1, seq2):
-        # store sequences
-        aligned_seqs = []
-        # make initial query
-        query = StripedSmithWaterman(seq1)
-        # align second seq against initial query
-        align = query(seq2)
-        # add individual sequences to results
-        aligned_seqs.append(align.aligned_query_sequence)
-        aligned_seqs.append(align.aligned_target_sequence)
-        return aligned_seqs
+        with self.stage("align"):
+            cache   = getattr(self, "cache", None)
+            backend = getattr(self, "align_backend", None)
+            if cache is not None:
+                key    = cache.make_key(seq1, seq2,
+                                        aligner.align_params(backend))
+                cached = cache.get(key)
+                if cached is not None:
+                    return cached
+            # align second seq against the first, scikit-bio is only
+            # imported the first time this is done
+            aligned_seqs = aligner.align_pair(seq1, seq2, backend)
+            if cache is not None:
+                cache.put(key, aligned_seqs)
+            return aligned_seqs
+
+
+#----------------------------------------------------------------------#
+#                          aligned_offset                              #
+#----------------------------------------------------------------------#
+# The index in seq of the first residue of the aligned pair's first    #
+# sequence. The aligner says where it started (aligner.Alignment);     #
+# for a pair aligned elsewhere the first place the aligned residues    #
+# turn up in seq is the best guess there is                            #
+#----------------------------------------------------------------------#
+    def aligned_offset(self, seq, aligned):
+        start = getattr(aligned, "start", None)
+        if start is None:
+            start = max(seq.find(aligned[0].replace("-", "")), 0)
+        return start
 
 
 #----------------------------------------------------------------------#
@@ -240,48 +375,327 @@ class Analysis(object):
         return round(score/len(seq), 2)
 
 
+#----------------------------------------------------------------------#
+#                           get_profile                                #
+#----------------------------------------------------------------------#
+# Takes two aligned sequences and returns their per-residue scoring    #
+# profile (see scoring.py). Each position is scored once using lookup  #
+# tables built from the scale, and the profile of the last pair is     #
+# kept so scoring the same alignment again doesn't redo the work       #
+#----------------------------------------------------------------------#
+    def get_profile(self, seq1, seq2):
+        profile = getattr(self, "profile", None)
+        # reuse the last profile if it is for the same pair
+        if profile is None or profile.seq1 != seq1 or profile.seq2 != seq2:
+            profile = scoring.Profile(seq1, seq2, scoring.get_tables(self))
+            self.profile = profile
+        return profile
+
+
 #----------------------------------------------------------------------#
 #                            seq_to_seq                                #
 #----------------------------------------------------------------------#
 # This function is the driver of the tool. It acts on the whole        #
 # protein sequence of the files entered into the contructor. It also   #
-# takes the kmer length argument. It iterates through the whole        #
-# of both sequences in steps equal to the kmer size. It asses the two  #
-# kmers at that region in both proteins, and scores them. It builds an #
-# Entry object for each kmer, and returns a list of Entry objects      #
+# takes the kmer length argument. It scores every kmer that fits in    #
+# the sequences, at every position. The window scores all come from    #
+# one per-residue profile of the alignment, so this is linear in the   #
+# length of the sequences rather than in length times kmer size. The   #
+# scores are returned as a Results object (models/Results.py), which   #
+# holds one array per Entry attribute instead of one Entry per kmer,   #
+# but can be indexed and iterated over just like the list of Entry     #
+# objects it replaces. With workers, the windows are scored a chunk at #
+# a time in a pool and put back together (see scan.py)                 #
 #----------------------------------------------------------------------#
     def seq_to_seq(self, seq1, seq2, length):
-        # to store Entry objects
-        results = []
-        # start at zero
-        position = 0
-        # while move along the sequence won't put us over the edge
-        while position + length <= len(seq1):
-            # the current_peptide is the kmer is seq one, it
-            # starts at the currrent position, ends at position + kmer length
-            current_peptide = seq1[position:position+length]
-            compare_peptide = seq2[position:position+length]
-            # call hydro mismatch on the current kmers
-            hydro_entry     = self.hydro_mismatch(current_peptide,
-                                                  compare_peptide)
-            # get percent hydrophiles
-            hydro_entry_pct = self.hydro_percent(current_peptide)
-            # get structural mismatch of current kmers
-            struct_entry    = self.structural_mismatch(current_peptide,
-                                                       compare_peptide)
-            # find percent structurally complex residues
-            struct_entry_pct = self.struct_percent(current_peptide)
-
-            # store results is an Entry object
-            results_obj   = Entry(
-                seq       = current_peptide,
-                pos       = position,
-                hy_score  = hydro_entry,
-                hy_pct    = hydro_entry_pct,
-                str_score = struct_entry,
-                str_pct   = struct_entry_pct,
-                analog    = compare_peptide)
-            # store object, increment
-            results.append(results_obj)
-            position += 1
+        with self.stage("seq_to_seq") as stage:
+            workers = getattr(self, "workers", 1)
+            if workers == 1:
+                # score every window of this length at once
+                windows = self.get_profile(seq1, seq2).windows(length)
+            else:
+                windows = scan.scan_windows(
+                    seq1, seq2, length, scoring.get_tables(self), workers,
+                    getattr(self, "chunk_size", None) or scan.CHUNK_SIZE,
+                    getattr(self, "pool", "process"))
+            stage.windows = len(windows.pos)
+            # store them by column, peptides are sliced out when needed
+            return Results.from_windows(seq1, seq2, length, windows)
+
+
+#----------------------------------------------------------------------#
+#                            scan_kmers                                #
+#----------------------------------------------------------------------#
+# Takes a list (or range) of kmer sizes and runs seq_to_seq on the     #
+# aligned sequences for each of them. The alignment and the            #
+# per-residue profile are only computed once; every kmer size takes    #
+# its window sums from the same cumulative arrays. Returns a dict of   #
+# kmer size to that size's Results                                     #
+#----------------------------------------------------------------------#
+    def scan_kmers(self, kmers):
+        results = {}
+        for length in kmers:
+            results[length] = self.seq_to_seq(self.sequence1,
+                                              self.sequence2,
+                                              length)
         return results
+
+
+#----------------------------------------------------------------------#
+#                         apply_mutations                              #
+#----------------------------------------------------------------------#
+# Edits the first sequence and updates the results, without starting   #
+# over. Takes (pos, new) pairs, pos being a 0-based residue of the     #
+# ungapped first sequence as it is before any of the edits, and new    #
+# what replaces that residue: one residue for a substitution, "" to    #
+# delete it, or several to insert after it (e.g. "AG" for A followed   #
+# by a new G). Substitutions keep the alignment as it is, put the new  #
+# residues in the same columns, and rescore only the kmer windows that #
+# cover them. An insertion or deletion realigns the pair (through the  #
+# cache, if there is one) and rescans it. Returns a Changes tuple (see #
+# models/Results.py) of the rows that are different: before holds      #
+# the old rows and after the new ones. Nothing is changed if an edit   #
+# can't be scored                                                      #
+#----------------------------------------------------------------------#
+    def apply_mutations(self, mutations):
+        if self.kmer_size is None:
+            raise ValueError("apply_mutations needs a kmer size")
+        edits = sorted(mutations)
+        seq   = self.first_fasta
+        for i, (pos, new) in enumerate(edits):
+            if not 0 <= pos < len(seq):
+                raise IndexError("no residue %d in the first sequence" % pos)
+            if i > 0 and edits[i - 1][0] == pos:
+                raise ValueError("residue %d is edited twice" % pos)
+            if "-" in new:
+                raise ValueError("use \"\" to delete residue %d" % pos)
+        old = self.get_entries()
+
+        # the edited first sequence, built in one go
+        pieces, last = [], 0
+        for pos, new in edits:
+            pieces.append(seq[last:pos])
+            pieces.append(new)
+            last = pos + 1
+        pieces.append(seq[last:])
+        first = "".join(pieces)
+
+        offset = self.offset
+        if any(len(new) != 1 for pos, new in edits):
+            # the columns move, so the pair has to be aligned again
+            aligned = self.align(first, self.second_fasta)
+            offset  = self.aligned_offset(first, aligned)
+            results = self.seq_to_seq(aligned[0], aligned[1],
+                                      self.kmer_size)
+        else:
+            aligned, results = self.substitute(edits, old)
+
+        # rows at the same position that came out the same are left out
+        same   = old.same_rows(results)
+        before = np.ones(len(old), dtype=bool)
+        after  = np.ones(len(results), dtype=bool)
+        before[:len(same)] = ~same
+        after[:len(same)]  = ~same
+
+        self.first_fasta = first
+        self.aligned     = aligned
+        self.offset      = offset
+        self.sequence1   = aligned[0]
+        self.sequence2   = aligned[1]
+        self.results     = results
+        return Changes(old[before], results[after])
+
+
+#----------------------------------------------------------------------#
+#                            substitute                                #
+#----------------------------------------------------------------------#
+# The substitution half of apply_mutations. Puts the new residues in   #
+# the aligned first sequence (residues outside the aligned region have #
+# no column, and change no window) and scores the windows that cover   #
+# an edited column, each run of them from a profile of just that part  #
+# of the alignment. Those sums only match a full rescan if they are    #
+# exact (see scan.sums_are_exact), so for any other scale the whole    #
+# alignment is rescanned. Returns the new aligned pair and a new       #
+# Results                                                              #
+#----------------------------------------------------------------------#
+    def substitute(self, edits, old):
+        seq1    = self.sequence1
+        length  = self.kmer_size
+        # column of each residue of the aligned part of the first
+        # protein, which starts at self.offset
+        codes   = scoring.encode(seq1)
+        columns = np.flatnonzero(codes != ord("-"))
+        offset  = self.offset
+        edited  = []
+        for pos, new in edits:
+            if 0 <= pos - offset < len(columns):
+                edited.append((int(columns[pos - offset]), new))
+        aligned = aligner.Alignment([seq1, self.sequence2], offset)
+        if not edited:
+            return aligned, old
+        letters = list(seq1)
+        for column, new in edited:
+            letters[column] = new
+        aligned[0] = "".join(letters)
+        tables  = scoring.get_tables(self)
+        if not scan.sums_are_exact(tables, len(seq1)):
+            return aligned, self.seq_to_seq(aligned[0], aligned[1], length)
+
+        # the windows that cover an edited column, merged into runs
+        count = len(old)
+        runs  = []
+        for column, new in edited:
+            first = max(column - length + 1, 0)
+            last  = min(column + 1, count)
+            if first >= last:
+                continue
+            if runs and first <= runs[-1][1]:
+                runs[-1][1] = max(runs[-1][1], last)
+            else:
+                runs.append([first, last])
+
+        results = Results(aligned[0], aligned[1], length, old.pos,
+                          old.hy_score.copy(), old.str_score.copy(),
+                          old.hy_pct.copy(), old.str_pct.copy())
+        for first, last in runs:
+            part    = scoring.Profile(aligned[0][first:last + length - 1],
+                                      aligned[1][first:last + length - 1],
+                                      tables)
+            windows = part.windows(length)
+            results.hy_score[first:last]  = windows.hy_score
+            results.str_score[first:last] = windows.str_score
+            results.hy_pct[first:last]    = windows.hy_pct
+            results.str_pct[first:last]   = windows.str_pct
+        return aligned, results
+
+
+#----------------------------------------------------------------------#
+#                           iter_windows                               #
+#----------------------------------------------------------------------#
+# Generator over the kmers of the aligned sequences that doesn't keep  #
+# them all. The windows are scored chunk_size at a time, and where, a  #
+# filter on the columns like "str_score > 2" (see Results.mask) or a   #
+# function from a Results chunk to a boolean array, drops the ones     #
+# that fail before any object is made for them. Without top, the       #
+# windows that pass are yielded in order as EntryView objects. With    #
+# top=N only the best N by the key column are kept, in a heap of N     #
+# entries, and yielded best first (ties by position) once the scan is  #
+# done, so memory stays O(N) however long the proteins are             #
+#----------------------------------------------------------------------#
+    def iter_windows(self, where=None, top=None, key="hy_score",
+                     chunk_size=1 << 16):
+        if key not in Results.columns:
+            raise ValueError("can't rank windows by %r" % key)
+        profile = self.get_profile(self.sequence1, self.sequence2)
+        length  = self.kmer_size
+        # the best windows so far: (score, -pos, row values)
+        heap    = []
+        for start in range(0, profile.window_count(length), chunk_size):
+            windows = profile.windows(length, start, start + chunk_size)
+            chunk   = Results.from_windows(self.sequence1, self.sequence2,
+                                           length, windows)
+            # rows that pass the thresholds
+            if where is None:
+                keep = np.arange(len(chunk))
+            elif callable(where):
+                keep = np.flatnonzero(where(chunk))
+            else:
+                keep = chunk.where(where)
+            if top is None:
+                for i in keep:
+                    yield chunk[i]
+                continue
+            # only this chunk's best N can make it into the heap
+            scores = getattr(chunk, key)[keep]
+            keep   = keep[np.lexsort((chunk.pos[keep], -scores))[:top]]
+            for i in keep.tolist():
+                item = (float(getattr(chunk, key)[i]), -int(chunk.pos[i]),
+                        [column[i] for column in windows])
+                if len(heap) < top:
+                    heapq.heappush(heap, item)
+                elif item[:2] > heap[0][:2]:
+                    heapq.heapreplace(heap, item)
+        if top is None:
+            return
+        # best first
+        rows = [item[2] for item in sorted(heap, key=lambda item: item[:2],
+                                            reverse=True)]
+        best = Results(self.sequence1, self.sequence2, length,
+                       *[[row[c] for row in rows]
+                         for c in range(len(Results.columns))])
+        for view in best:
+            yield view
+
+
+#----------------------------------------------------------------------#
+#                          select_epitopes                             #
+#----------------------------------------------------------------------#
+# Picks the distinct peptides: the set of kmers with the highest total #
+# score where no two overlap, or with gap, where at least gap residues #
+# separate any two of them. score is a column ("hy_score" by default)  #
+# or a function from a Results to an array of scores, and where limits #
+# the candidates as in Results.where. Runs in O(L log L) (see          #
+# selection.py) and returns a Selection, whose covering method gives   #
+# the chosen windows over a residue of the original first sequence     #
+#----------------------------------------------------------------------#
+    def select_epitopes(self, score="hy_score", gap=0, where=None):
+        return selection.select_windows(self.get_entries(), self.first_fasta,
+                                        score, gap, where, self.offset)
+
+
+#----------------------------------------------------------------------#
+#                         proteome_distance                            #
+#----------------------------------------------------------------------#
+# Checks the kmers of the first protein against a whole off-target     #
+# proteome rather than just the second sequence. targets is a          #
+# distinct.KmerIndex, or a .fasta file or a store (see seqstore.py)    #
+# to index. Returns a Nearest tuple of arrays (see distinct.py) with,  #
+# for each kmer of the ungapped first sequence, the smallest           #
+# hydro_mismatch to any target kmer and where that kmer is. processes  #
+# workers share the search, and share a store's pages rather than      #
+# each getting a copy of the targets                                   #
+#----------------------------------------------------------------------#
+    def proteome_distance(self, targets, processes=None):
+        if not isinstance(targets, distinct.KmerIndex):
+            targets = distinct.KmerIndex.from_fasta(targets, self.kmer_size,
+                                                    self)
+        return distinct.min_distances(self.first_fasta, targets, processes)
+
+
+#----------------------------------------------------------------------#
+#                           score_scales                               #
+#----------------------------------------------------------------------#
+# Scores the kmers of the aligned sequences on other residue scales    #
+# from the registry in scales.py, such as "kyte_doolittle" and         #
+# "hopp_woods", or on Scale objects, all in one pass. length defaults  #
+# to the kmer size. Returns a scales.ScaleWindows with the mismatch    #
+# and the percentage of positive residues of every window, by scale    #
+#----------------------------------------------------------------------#
+    def score_scales(self, scale_list, length=None):
+        if length is None:
+            length = self.kmer_size
+        profile = scales.ScaleProfile(self.sequence1, self.sequence2,
+                                      scale_list)
+        return profile.windows(length)
+
+
+#----------------------------------------------------------------------#
+#                         score_background                             #
+#----------------------------------------------------------------------#
+# How unusual each kmer's scores are. The aligned second sequence is   #
+# replaced by permutations decoys made from its own residues, shuffled #
+# (method="shuffle") or drawn from its composition ("composition"),    #
+# every kmer is scored against all of them, and a Background tuple of  #
+# arrays (see background.py) gives each kmer's p-value and z-score     #
+# against the decoys. seed makes the decoys repeatable, and processes  #
+# workers (all cores by default) share them out chunk_size at a time   #
+#----------------------------------------------------------------------#
+    def score_background(self, permutations=1000, method="shuffle",
+                         seed=None, processes=None, chunk_size=1000,
+                         length=None):
+        if length is None:
+            length = self.kmer_size
+        return background.score_background(self.sequence1, self.sequence2,
+                                           length, scoring.get_tables(self),
+                                           permutations, method, seed,
+                                           processes, chunk_size)
@@ -0,0 +1,406 @@
+#----------------------------------------------------------------------#
+#                        ASH pairwise aligners                         #
+#----------------------------------------------------------------------#
+# ASH aligns with scikit-bio's StripedSmithWaterman, but importing     #
+# scikit-bio takes seconds, which every short run used to pay even for #
+# --help. This module imports it only when an alignment is made, and   #
+# has a Smith-Waterman of its own, in NumPy, for when scikit-bio isn't #
+# installed. The backends:                                             #
+#                                                                      #
+#   ssw     scikit-bio's StripedSmithWaterman                          #
+#   python  smith_waterman below, the whole matrix                     #
+#   banded  banded_smith_waterman below: only a band of diagonals      #
+#           around the exact matches (seeds) the two sequences share,  #
+#           for long and nearly identical sequences, falling back to   #
+#           the whole matrix when the alignment leaves the band        #
+#                                                                      #
+# The default is ssw when scikit-bio can be found and python when it   #
+# can't; the environment variable ASH_ALIGNER picks one, and Analysis  #
+# takes one per call as align_backend.                                 #
+#                                                                      #
+# All score the way StripedSmithWaterman does with the settings ASH    #
+# has always used, its defaults: it reads the sequences as nucleotides #
+# so A, C, G and T match for 2 and mismatch for -3 and every other     #
+# letter scores 0, a gap costs 5 to open and 2 for each residue after  #
+# the first. All give the best local alignment, so the score is the    #
+# same, but where several alignments tie they may pick different ones. #
+# The backend's name is part of the alignment cache key. The pair      #
+# comes back as an Alignment, which also says where in seq1 the        #
+# aligned part starts.                                                 #
+#----------------------------------------------------------------------#
+
+
+import importlib.util
+import os
+import numpy as np
+
+# the backends, and what the cache key calls them
+BACKENDS = { "ssw":    "StripedSmithWaterman",
+             "python": "smith_waterman",
+             "banded": "banded_smith_waterman" }
+
+# StripedSmithWaterman's defaults
+MATCH      = 2
+MISMATCH   = -3
+GAP_OPEN   = 5
+GAP_EXTEND = 2
+
+# the letters that score, everything else is N
+NUCLEOTIDES = "ACGT"
+
+# the seeds that place the band of a banded alignment, how far either
+# side of them it reaches, and the widest band worth using, as a share
+# of the shorter sequence
+SEED_LENGTH    = 8
+SEED_HASH_BASE = np.uint64(1000003)
+BAND_MARGIN    = 32
+MAX_BAND_SHARE = 0.5
+
+# bits of the traceback of each cell: where H came from, and whether
+# E and F opened their gap there rather than extending it
+FROM_DIAGONAL = 1
+FROM_E        = 2
+FROM_F        = 3
+H_SOURCE      = 3
+E_OPENED      = 4
+F_OPENED      = 8
+
+
+#----------------------------------------------------------------------#
+#                         Alignment(class)                             #
+#----------------------------------------------------------------------#
+# An aligned pair, [aligned seq1, aligned seq2], that is a list like   #
+# any other but also keeps start: the index in seq1 of the first       #
+# residue of its aligned part. The aligned part can turn up more than  #
+# once in seq1, so only the aligner can say which one it aligned.      #
+# start is None when it isn't known, for a pair aligned elsewhere      #
+#----------------------------------------------------------------------#
+class Alignment(list):
+
+    def __init__(self, aligned, start=None):
+        list.__init__(self, aligned)
+        self.start = start
+
+
+#----------------------------------------------------------------------#
+#                           have_skbio                                 #
+#----------------------------------------------------------------------#
+# Whether scikit-bio is installed, found without importing it          #
+#----------------------------------------------------------------------#
+def have_skbio():
+    return importlib.util.find_spec("skbio") is not None
+
+
+#----------------------------------------------------------------------#
+#                          get_backend                                 #
+#----------------------------------------------------------------------#
+# The backend to use: the one given, else ASH_ALIGNER, else ssw if     #
+# scikit-bio is installed                                              #
+#----------------------------------------------------------------------#
+def get_backend(backend=None):
+    if backend is None:
+        backend = os.environ.get("ASH_ALIGNER")
+    if backend is None:
+        backend = "ssw" if have_skbio() else "python"
+    if backend not in BACKENDS:
+        raise ValueError("unknown aligner %r, use one of %s"
+                         % (backend, ", ".join(sorted(BACKENDS))))
+    return backend
+
+
+#----------------------------------------------------------------------#
+#                          load_backend                                #
+#----------------------------------------------------------------------#
+# Imports what a backend needs now rather than at its first alignment, #
+# for a long-running process that wants it loaded up front (see        #
+# server.warm). Returns the backend's name                             #
+#----------------------------------------------------------------------#
+def load_backend(backend=None):
+    backend = get_backend(backend)
+    if backend == "ssw":
+        import skbio.alignment
+    return backend
+
+
+#----------------------------------------------------------------------#
+#                          align_params                                #
+#----------------------------------------------------------------------#
+# How a backend aligns, for the alignment cache key                    #
+#----------------------------------------------------------------------#
+def align_params(backend=None):
+    return { "aligner": BACKENDS[get_backend(backend)] }
+
+
+#----------------------------------------------------------------------#
+#                          query_aligner                               #
+#----------------------------------------------------------------------#
+# Returns a function that aligns targets against query_seq and returns #
+# the Alignment [aligned query, aligned target], sharing whatever can  #
+# be worked out from the query alone between targets (the              #
+# StripedSmithWaterman query profile)                                  #
+#----------------------------------------------------------------------#
+def query_aligner(query_seq, backend=None):
+    if get_backend(backend) == "ssw":
+        # imported here, the first time an alignment is made
+        from skbio.alignment import StripedSmithWaterman
+        query = StripedSmithWaterman(query_seq)
+
+        def align(target_seq):
+            result = query(target_seq)
+            return Alignment([result.aligned_query_sequence,
+                              result.aligned_target_sequence],
+                             result.query_begin)
+        return align
+
+    if get_backend(backend) == "banded":
+        def align(target_seq):
+            found = banded_align(query_seq, target_seq)
+            return Alignment(found[:2], found[4])
+        return align
+
+    def align(target_seq):
+        found = local_align(query_seq, target_seq)
+        return Alignment(found[:2], found[4])
+    return align
+
+
+#----------------------------------------------------------------------#
+#                           align_pair                                 #
+#----------------------------------------------------------------------#
+# Aligns two sequences, returning the Alignment [aligned seq1, aligned #
+# seq2]                                                                #
+#----------------------------------------------------------------------#
+def align_pair(seq1, seq2, backend=None):
+    return query_aligner(seq1, backend)(seq2)
+
+
+#----------------------------------------------------------------------#
+#                             encode                                   #
+#----------------------------------------------------------------------#
+# The index of each letter among A, C, G, T, N, in either case         #
+#----------------------------------------------------------------------#
+def encode(seq):
+    table = np.full(256, len(NUCLEOTIDES), dtype=np.intp)
+    for i, letter in enumerate(NUCLEOTIDES):
+        table[ord(letter)] = i
+        table[ord(letter.lower())] = i
+    return table[np.frombuffer(seq.encode("ascii", "replace"),
+                               dtype=np.uint8)]
+
+
+#----------------------------------------------------------------------#
+#                         smith_waterman                               #
+#----------------------------------------------------------------------#
+# Local alignment with affine gaps (Gotoh). Returns the aligned seq1,  #
+# the aligned seq2 and the score; two empty strings if nothing scores  #
+# above 0. band, a (lo, hi) pair of diagonals (j - i), keeps the       #
+# alignment between them; see local_align                              #
+#----------------------------------------------------------------------#
+def smith_waterman(seq1, seq2, match=MATCH, mismatch=MISMATCH,
+                   gap_open=GAP_OPEN, gap_extend=GAP_EXTEND, band=None):
+    return local_align(seq1, seq2, match, mismatch, gap_open, gap_extend,
+                       band)[:3]
+
+
+#----------------------------------------------------------------------#
+#                           local_align                                #
+#----------------------------------------------------------------------#
+# Does the work of smith_waterman. H is the best score of an alignment #
+# ending at each cell, E of one ending in a gap in seq1 and F of one   #
+# ending in a gap in seq2. A row of the matrices is worked out at a    #
+# time with NumPy: F and the diagonal come from the row before, and E, #
+# which runs along the row, is a running maximum. Only a byte of       #
+# traceback is kept per cell, not the scores, and with a band only the #
+# cells inside it are worked out or kept, so time and memory grow with #
+# the length times the width of the band. The fourth value returned    #
+# says whether the alignment touches the edge of the band, in which    #
+# case a better one outside it may have been missed, and the fifth is  #
+# the index in seq1 the alignment starts at                            #
+#----------------------------------------------------------------------#
+def local_align(seq1, seq2, match=MATCH, mismatch=MISMATCH,
+                gap_open=GAP_OPEN, gap_extend=GAP_EXTEND, band=None):
+    # a gap opened straight after another one never beats extending
+    # it, which is what lets E be worked out from H before E is added
+    if gap_open < gap_extend:
+        raise ValueError("gap_open must be at least gap_extend")
+    rows, cols = len(seq1), len(seq2)
+    if band is None:
+        band   = (-rows, cols)
+    lo, hi     = band
+    # the traceback keeps width cells a row, from starts[i]
+    width      = min(hi - lo + 1, cols + 1)
+    starts     = np.clip(np.arange(rows + 1) + lo, 0, cols + 1 - width)
+    size       = len(NUCLEOTIDES)
+    scores     = np.full((size + 1, size + 1), 0, dtype=np.int64)
+    scores[:size, :size] = mismatch
+    np.fill_diagonal(scores[:size, :size], match)
+    # the score of each residue of seq1 against all of seq2
+    profile    = scores[:, encode(seq2)]
+    codes1     = encode(seq1)
+    trace      = np.zeros((rows + 1, width), dtype=np.uint8)
+    # the row before; cells outside the band are never written, so
+    # they stay at no score
+    h_prev     = np.zeros(cols + 1, dtype=np.int64)
+    f_prev     = np.full(cols + 1, -gap_open, dtype=np.int64)
+    # the position of each column, for the running maximum of E
+    steps      = np.arange(cols + 1, dtype=np.int64) * gap_extend
+    # the best score in each column and the first row it was seen in
+    col_best   = np.zeros(cols + 1, dtype=np.int64)
+    col_row    = np.zeros(cols + 1, dtype=np.int64)
+    for i in range(1, rows + 1):
+        # the columns of this row inside the band
+        first   = max(1, i + lo)
+        last    = min(cols, i + hi)
+        if first > last:
+            continue
+        cells   = slice(first, last + 1)
+        # a gap in seq2, coming down from the row before
+        f_open  = h_prev[cells] - gap_open
+        f_ext   = f_prev[cells] - gap_extend
+        f       = np.maximum(f_open, f_ext)
+        diag    = h_prev[first - 1:last] + profile[codes1[i - 1],
+                                                   first - 1:last]
+        h       = np.maximum(np.maximum(diag, f), 0)
+        # a gap in seq1, along the row: E[j] is the best of H[k] - open
+        # - (j - 1 - k) * extend over k < j
+        best    = np.maximum.accumulate(h + steps[cells])
+        e       = np.full(len(h), -gap_open, dtype=np.int64)
+        e[1:]   = best[:-1] - steps[first:last] - gap_open
+        e_open  = np.zeros(len(h), dtype=bool)
+        e_open[1:] = h[:-1] - gap_open >= e[1:]
+        h       = np.maximum(h, e)
+        # where each cell came from, the diagonal first
+        source  = np.where(h == 0, 0,
+                  np.where(h == diag, FROM_DIAGONAL,
+                  np.where(h == e, FROM_E, FROM_F)))
+        offset  = first - starts[i]
+        trace[i, offset:offset + len(h)] = (source + E_OPENED * e_open
+                                            + F_OPENED * (f_open >= f_ext))
+        better  = h > col_best[cells]
+        col_best[cells] = np.where(better, h, col_best[cells])
+        col_row[cells]  = np.where(better, i, col_row[cells])
+        h_prev[cells]   = h
+        f_prev[cells]   = f
+    j     = int(np.argmax(col_best))
+    score = int(col_best[j])
+    if score == 0:
+        return "", "", 0, False, 0
+    aligned1, aligned2, edge, start = traceback(seq1, seq2, trace, starts,
+                                                band, int(col_row[j]), j)
+    return aligned1, aligned2, score, edge, start
+
+
+#----------------------------------------------------------------------#
+#                            traceback                                 #
+#----------------------------------------------------------------------#
+# Follows the traceback bits back from the cell (i, j) the best        #
+# alignment ends at to where its score started from 0. Returns the two #
+# aligned strings, whether the path went along the edge of the band,   #
+# where it may have been cut off from a better way round, and the      #
+# index of the first residue of seq1 in the alignment                  #
+#----------------------------------------------------------------------#
+def traceback(seq1, seq2, trace, starts, band, i, j):
+    lo, hi = band
+    cols   = len(seq2)
+    aligned1, aligned2 = [], []
+    edge   = False
+    # which matrix the path is in
+    state  = "H"
+    while i > 0 and j > 0:
+        if (j == i + lo and j > 1) or (j == i + hi and j < cols):
+            edge = True
+        cell = trace[i, j - starts[i]]
+        if state == "E":
+            aligned1.append("-")
+            aligned2.append(seq2[j - 1])
+            if cell & E_OPENED:
+                state = "H"
+            j -= 1
+        elif state == "F":
+            aligned1.append(seq1[i - 1])
+            aligned2.append("-")
+            if cell & F_OPENED:
+                state = "H"
+            i -= 1
+        else:
+            source = cell & H_SOURCE
+            if source == 0:
+                break
+            if source == FROM_E:
+                state = "E"
+            elif source == FROM_F:
+                state = "F"
+            else:
+                aligned1.append(seq1[i - 1])
+                aligned2.append(seq2[j - 1])
+                i -= 1
+                j -= 1
+    return ("".join(reversed(aligned1)), "".join(reversed(aligned2)),
+            edge, i)
+
+
+#----------------------------------------------------------------------#
+#                            find_band                                 #
+#----------------------------------------------------------------------#
+# Seeds for a banded alignment: the kmers of seed_length that occur    #
+# exactly once in seq2 and also in seq1. Returns the band of diagonals #
+# (j - i) from the lowest seed's to the highest's, widened by margin   #
+# on either side, or None if there are no seeds or the band would be   #
+# more than max_share of the shorter sequence wide, when banding saves #
+# little                                                               #
+#----------------------------------------------------------------------#
+def find_band(seq1, seq2, seed_length=SEED_LENGTH, margin=BAND_MARGIN,
+              max_share=MAX_BAND_SHARE):
+    if min(len(seq1), len(seq2)) < seed_length:
+        return None
+    hashes1  = seed_hashes(seq1, seed_length)
+    hashes2  = seed_hashes(seq2, seed_length)
+    # the seeds of seq2 that are unique, in order of their hash
+    unique, where, counts = np.unique(hashes2, return_index=True,
+                                      return_counts=True)
+    unique   = unique[counts == 1]
+    where    = where[counts == 1]
+    if len(unique) == 0:
+        return None
+    found    = np.minimum(np.searchsorted(unique, hashes1), len(unique) - 1)
+    hits     = np.flatnonzero(unique[found] == hashes1)
+    if len(hits) == 0:
+        return None
+    diagonals = where[found[hits]] - hits
+    lo       = int(diagonals.min()) - margin
+    hi       = int(diagonals.max()) + margin
+    if hi - lo + 1 > max_share * min(len(seq1), len(seq2)):
+        return None
+    return lo, hi
+
+# a 64-bit polynomial hash of every kmer of seed_length, in either case
+def seed_hashes(seq, seed_length):
+    codes  = np.frombuffer(seq.upper().encode("ascii", "replace"),
+                           dtype=np.uint8)
+    count  = len(codes) - seed_length + 1
+    hashes = np.zeros(count, dtype=np.uint64)
+    for i in range(seed_length):
+        hashes = hashes * SEED_HASH_BASE + codes[i:i + count]
+    return hashes
+
+
+#----------------------------------------------------------------------#
+#                      banded_smith_waterman                           #
+#----------------------------------------------------------------------#
+# smith_waterman in the band the seeds give. If there are no seeds,    #
+# or the alignment runs along the edge of the band, the whole matrix   #
+# is aligned instead                                                   #
+#----------------------------------------------------------------------#
+def banded_smith_waterman(seq1, seq2, seed_length=SEED_LENGTH,
+                          margin=BAND_MARGIN):
+    return banded_align(seq1, seq2, seed_length, margin)[:3]
+
+
+# the same, returning all that local_align does
+def banded_align(seq1, seq2, seed_length=SEED_LENGTH, margin=BAND_MARGIN):
+    band = find_band(seq1, seq2, seed_length, margin)
+    if band is not None:
+        found = local_align(seq1, seq2, band=band)
+        if not found[3]:
+            return found
+    return local_align(seq1, seq2)
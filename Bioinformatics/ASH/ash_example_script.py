@@ -23,3 +23,15 @@ print("\nFiltered Results:")
 for record in hiv_entries:
     if record.hy_score > 10 and record.str_score > 2:
         print(record.seq, record.hy_score, "at", record.pos)
+
+# the same filter, run on the columns without looking at each record
+print("\nFiltered Results (vectorized):")
+matches = hiv_entries.where("hy_score > 10 & str_score > 2")
+for record in hiv_entries[matches]:
+    print(record.seq, record.hy_score, "at", record.pos)
+
+# or, without keeping every kmer, the 10 most distinct with str_score > 2
+print("\nTop 10 Results (lazy):")
+lazy_ash_obj = ASH.Analysis("sample_data/ENV_HV1MN.fasta", "sample_data/ENV_HV1VI.fasta", 15, lazy=True)
+for record in lazy_ash_obj.iter_windows(where="str_score > 2", top=10):
+    print(record.seq, record.hy_score, "at", record.pos)
@@ -0,0 +1,186 @@
+#----------------------------------------------------------------------#
+#                  ASH scores against a shuffled background            #
+#----------------------------------------------------------------------#
+# A hy_score of 10 is a lot for a window of a protein with few         #
+# hydrophiles and little for one with many. To say how unusual each    #
+# window's score is, the second sequence is replaced by many decoys    #
+# made from its own residues, every window of the first sequence is    #
+# scored against every decoy, and each observed score is compared with #
+# the scores its window got against the decoys. That gives each window #
+# an empirical p-value (how often a decoy scored at least as high) and #
+# a z-score (how many standard deviations above the decoys' mean).     #
+#                                                                      #
+# The decoys keep the gaps of the alignment where they are and move    #
+# the residues between the other columns: "shuffle" permutes them, so  #
+# every decoy has exactly the composition of the second sequence, and  #
+# "composition" draws each one at random from that composition. A      #
+# batch of decoys is scored at once, as a 2D array of per-position     #
+# scores with prefix sums along each row, and only running totals are  #
+# kept, never the decoys' scores. The decoys are made in chunks, each  #
+# chunk from its own random stream spawned from one seed, and the      #
+# chunks can be shared out among worker processes; the same seed gives #
+# the same answer however many processes there are.                    #
+#----------------------------------------------------------------------#
+
+
+import os
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import scoring
+
+# per window: its position, the mean and standard deviation of its
+# scores against the decoys, and its z-score and p-value, for the hydro
+# and structural scores
+Background = namedtuple("Background", ["pos", "hy_mean", "hy_std",
+                                       "hy_z", "hy_p", "str_mean",
+                                       "str_std", "str_z", "str_p"])
+
+# the ways to make a decoy
+METHODS = ("shuffle", "composition")
+
+# decoys scored at once
+BATCH_SIZE = 256
+
+# set up in each worker by init_worker
+_setup = None
+
+
+#----------------------------------------------------------------------#
+#                           init_worker                                #
+#----------------------------------------------------------------------#
+# Runs once in each worker process and keeps what every chunk needs:   #
+# the two aligned sequences as codes, the kmer size, the hydro and     #
+# structural pair tables, and the decoy method                         #
+#----------------------------------------------------------------------#
+def init_worker(setup):
+    global _setup
+    _setup = setup
+
+
+#----------------------------------------------------------------------#
+#                          window_scores                               #
+#----------------------------------------------------------------------#
+# Takes the codes of the first sequence and a 2D array of rows of      #
+# codes to score it against, and returns the hydro and structural      #
+# scores of every window of every row. The window sums are differences #
+# of prefix sums, as in scoring.Profile, so a row equal to the second  #
+# sequence gets exactly the scores Analysis gives                      #
+#----------------------------------------------------------------------#
+def window_scores(codes1, rows, length, hydro_table, struct_table):
+    pairs  = codes1.astype(np.intp) * scoring.TABLE_SIZE + rows
+    scores = []
+    for table in (hydro_table, struct_table):
+        values = table[pairs]
+        cum    = np.zeros((len(rows), rows.shape[1] + 1))
+        np.cumsum(values, axis=1, out=cum[:, 1:])
+        scores.append(cum[:, length:] - cum[:, :-length])
+    return scores
+
+
+#----------------------------------------------------------------------#
+#                           make_decoys                                #
+#----------------------------------------------------------------------#
+# count decoys of the second sequence as a 2D array of codes, made     #
+# with rng. The gaps stay in their columns, the residues are shuffled  #
+# or drawn among the others                                            #
+#----------------------------------------------------------------------#
+def make_decoys(rng, codes2, columns, count, method):
+    residues = codes2[columns]
+    if method == "shuffle":
+        moved = rng.permuted(np.broadcast_to(residues,
+                                             (count, len(residues))), axis=1)
+    else:
+        moved = rng.choice(residues, size=(count, len(residues)))
+    decoys = np.repeat(codes2[None, :], count, axis=0)
+    decoys[:, columns] = moved
+    return decoys
+
+
+#----------------------------------------------------------------------#
+#                           score_chunk                                #
+#----------------------------------------------------------------------#
+# Takes (seed, count), scores count decoys made from that seed a batch #
+# at a time, and returns the totals for every window: the sum and sum  #
+# of squares of its scores, and how many decoys scored at least its    #
+# observed score, for the hydro and then the structural scores         #
+#----------------------------------------------------------------------#
+def score_chunk(task):
+    seed, count = task
+    (codes1, codes2, length, hydro_table, struct_table,
+     method) = _setup
+    rng      = np.random.default_rng(seed)
+    columns  = np.flatnonzero(codes2 != ord("-"))
+    observed = window_scores(codes1, codes2[None, :], length,
+                             hydro_table, struct_table)
+    totals   = [np.zeros(len(observed[0][0])) for i in range(6)]
+    for first in range(0, count, BATCH_SIZE):
+        decoys = make_decoys(rng, codes2, columns,
+                             min(BATCH_SIZE, count - first), method)
+        scores = window_scores(codes1, decoys, length,
+                               hydro_table, struct_table)
+        for s in range(2):
+            totals[3 * s]     += scores[s].sum(axis=0)
+            totals[3 * s + 1] += (scores[s] ** 2).sum(axis=0)
+            totals[3 * s + 2] += (scores[s] >= observed[s]).sum(axis=0)
+    return totals
+
+
+#----------------------------------------------------------------------#
+#                         score_background                             #
+#----------------------------------------------------------------------#
+# Scores every window of length of the aligned pair seq1, seq2 against #
+# permutations decoys of seq2 and returns a Background tuple of        #
+# arrays. tables are the scoring.ScoreTables of the scale. The decoys  #
+# are made chunk_size at a time, each chunk from its own stream of     #
+# the SeedSequence seed, by processes workers (all cores by default;   #
+# 1 runs everything in this process). The p-value of a window is       #
+# (1 + decoys at least as high) / (1 + permutations), and its z-score  #
+# is NaN if every decoy scored the same                                #
+#----------------------------------------------------------------------#
+def score_background(seq1, seq2, length, tables, permutations=1000,
+                     method="shuffle", seed=None, processes=None,
+                     chunk_size=1000):
+    if method not in METHODS:
+        raise ValueError("method must be one of %s" % ", ".join(METHODS))
+    if length < 1:
+        raise ValueError("kmer length must be at least 1")
+    if permutations < 1:
+        raise ValueError("permutations must be at least 1")
+    # the observed scores, which also checks every residue can be scored
+    profile  = scoring.Profile(seq1, seq2, tables)
+    observed = profile.windows(length)
+    setup    = (scoring.encode(seq1), scoring.encode(seq2), length,
+                tables.hydro, tables.struct, method)
+
+    # the same chunks, and streams, however many processes there are
+    sizes   = [min(chunk_size, permutations - first)
+               for first in range(0, permutations, chunk_size)]
+    streams = np.random.SeedSequence(seed).spawn(len(sizes))
+    tasks   = list(zip(streams, sizes))
+    if len(observed.pos) == 0:
+        tasks = []
+    if processes is None:
+        processes = os.cpu_count() or 1
+    if processes == 1 or len(tasks) <= 1:
+        init_worker(setup)
+        parts = [score_chunk(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(processes, initializer=init_worker,
+                                 initargs=(setup,)) as pool:
+            parts = list(pool.map(score_chunk, tasks))
+
+    totals = [sum(part[i] for part in parts) if parts
+              else np.zeros(len(observed.pos)) for i in range(6)]
+    stats  = []
+    for s, score in enumerate((observed.hy_score, observed.str_score)):
+        total, squares, higher = totals[3 * s:3 * s + 3]
+        mean     = total / permutations
+        variance = squares / permutations - mean ** 2
+        # what's left of a zero variance after rounding is zero
+        variance[variance < 1e-12 * (1 + mean ** 2)] = 0
+        std      = np.sqrt(variance)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            z = np.where(std > 0, (score - mean) / std, np.nan)
+        stats.extend([mean, std, z, (1 + higher) / (1 + permutations)])
+    return Background(observed.pos, *stats)
@@ -0,0 +1,161 @@
+#----------------------------------------------------------------------#
+#                      ASH one-vs-many screening                       #
+#----------------------------------------------------------------------#
+# Runs ASH for one query protein against every record of a             #
+# multi-record FASTA file of targets, for example a panel of strain    #
+# variants. The targets are handed out in chunks to a pool of worker   #
+# processes. Each worker builds the alignment profile of the query     #
+# once, when it starts, and reuses it for every target it aligns.      #
+# Only a bounded number of chunks are in flight at a time, so the      #
+# panel is never held in memory all at once, and the results come      #
+# back as soon as each chunk finishes.                                 #
+#----------------------------------------------------------------------#
+
+
+import os
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from ASH import Analysis
+import aligner
+import fastaio
+import seqstore
+
+# the result for one target: where it was in the file, its header,
+# the aligned pair, and the Results for its kmers
+Hit = namedtuple("Hit", ["index", "header", "aligned", "entries"])
+
+# set up in each worker by init_worker
+_query       = None
+_query_seq   = None
+_kmer        = None
+_cache       = None
+_unknown     = "error"
+_backend     = None
+
+
+#----------------------------------------------------------------------#
+#                           init_worker                                #
+#----------------------------------------------------------------------#
+# Runs once in each worker process. Builds the query profile that all  #
+# of the worker's alignments will share                                #
+#----------------------------------------------------------------------#
+def init_worker(query_seq, kmer, cache=None, unknown="error",
+                align_backend=None):
+    global _query, _query_seq, _kmer, _cache, _unknown, _backend
+    _query     = aligner.query_aligner(query_seq, align_backend)
+    _query_seq = query_seq
+    _kmer      = kmer
+    _cache     = cache
+    _unknown   = unknown
+    _backend   = align_backend
+
+
+#----------------------------------------------------------------------#
+#                           score_targets                              #
+#----------------------------------------------------------------------#
+# Takes a chunk of (index, (header, sequence)) targets, or Records,    #
+# aligns each of them against the worker's query and scores their      #
+# kmers. Returns a list of Hit tuples                                  #
+#----------------------------------------------------------------------#
+def score_targets(chunk):
+    hits = []
+    for index, record in chunk:
+        header, target = record[0], record[1]
+        aligned  = None
+        # look for the pair in the alignment cache, if there is one
+        if _cache is not None:
+            key     = _cache.make_key(_query_seq, target,
+                                      aligner.align_params(_backend))
+            aligned = _cache.get(key)
+        if aligned is None:
+            # the query profile is reused, only the target is new
+            aligned = _query(target)
+            if _cache is not None:
+                _cache.put(key, aligned)
+        analysis = Analysis.from_sequences(_query_seq, target, _kmer,
+                                           aligned, unknown=_unknown)
+        hits.append(Hit(index, header, aligned, analysis.get_entries()))
+    return hits
+
+
+#----------------------------------------------------------------------#
+#                             chunked                                  #
+#----------------------------------------------------------------------#
+# Groups an iterable into lists of at most size items, lazily          #
+#----------------------------------------------------------------------#
+def chunked(items, size):
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+#----------------------------------------------------------------------#
+#                              screen                                  #
+#----------------------------------------------------------------------#
+# Scores query_seq against every (header, sequence, ...) in targets.   #
+# processes is the number of workers (all cores by default), and       #
+# 1 runs everything in this process. chunk_size targets go to a        #
+# worker at a time, and at most max_pending chunks (two per worker by  #
+# default) are queued at once. Hits are yielded in the order they      #
+# finish, so use the index to put them back in file order. An          #
+# AlignmentCache given as cache is shared by all the workers, unknown  #
+# is passed on to Analysis, and align_backend picks the aligner        #
+#----------------------------------------------------------------------#
+def screen(query_seq, targets, kmer, processes=None, chunk_size=8,
+           max_pending=None, cache=None, unknown="error",
+           align_backend=None):
+    chunks = chunked(enumerate(targets), chunk_size)
+
+    # no pool, score in this process
+    if processes == 1:
+        init_worker(query_seq, kmer, cache, unknown, align_backend)
+        for chunk in chunks:
+            for hit in score_targets(chunk):
+                yield hit
+        return
+
+    if processes is None:
+        processes = os.cpu_count() or 1
+    if max_pending is None:
+        max_pending = 2 * processes
+
+    with ProcessPoolExecutor(processes, initializer=init_worker,
+                             initargs=(query_seq, kmer, cache, unknown,
+                                       align_backend)) as pool:
+        pending = set()
+        for chunk in chunks:
+            pending.add(pool.submit(score_targets, chunk))
+            # wait for room before reading any more targets
+            while len(pending) >= max_pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    for hit in future.result():
+                        yield hit
+        # drain what's left
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                for hit in future.result():
+                    yield hit
+
+
+#----------------------------------------------------------------------#
+#                            screen_file                               #
+#----------------------------------------------------------------------#
+# Convenience wrapper: takes a query .fasta file and a multi-record    #
+# .fasta file (or a store, see seqstore.py) of targets and screens the #
+# first against all of the second. The remaining arguments are passed  #
+# to screen                                                            #
+#----------------------------------------------------------------------#
+def screen_file(query_file, targets_file, kmer, **options):
+    query_seq = fastaio.read_sequence(query_file)
+    if seqstore.is_store(targets_file):
+        targets = seqstore.SequenceStore(targets_file).records()
+    else:
+        targets = fastaio.read_fasta(targets_file)
+    return screen(query_seq, targets, kmer, **options)
@@ -0,0 +1,359 @@
+#----------------------------------------------------------------------#
+#                        ASH benchmark suite                           #
+#----------------------------------------------------------------------#
+# Times each stage of an ASH run on synthetic proteins so changes that #
+# make it slower can be caught. Proteins and multi-record panels of    #
+# the given sizes are generated from a fixed seed, so two runs on the  #
+# same machine see exactly the same input and nothing is downloaded.   #
+# The stages are timed separately:                                     #
+#                                                                      #
+#   get_seq     reading the first record of a FASTA file               #
+#   read_panel  reading every record of a multi-record FASTA file      #
+#   align       aligning the pair (only up to --align-limit residues,  #
+#               as Smith-Waterman is quadratic)                        #
+#   seq_to_seq  scoring every kmer of the aligned pair                 #
+#   write       writing the Results in each output format              #
+#   cold_start  starting a fresh Python and importing ASH (import), or #
+#               running run_ash.py --help (help), which every short    #
+#               job pays                                               #
+#                                                                      #
+# Each stage is run --repeat times and the fastest time is kept, then  #
+# run once more under tracemalloc for its peak memory (what Python and #
+# NumPy allocate). The results are saved as JSON, and --compare checks #
+# them against an earlier run and flags every stage that got slower by #
+# more than --threshold. A cold start slower than --cold-start-target  #
+# seconds fails the run as well.                                       #
+#                                                                      #
+#   $ python3 benchmark.py -o before.json                              #
+#   $ python3 benchmark.py -o after.json --compare before.json         #
+#----------------------------------------------------------------------#
+
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+from ASH import Analysis
+import fastaio
+import writers
+
+# the residues the ASH scale knows
+RESIDUES = np.frombuffer(b"LAFYWIVHNCGMQPSTDERK", dtype=np.uint8)
+
+# defaults: 1k to 1M residues, kmers from 5 to 50
+SIZES       = [1000, 10000, 100000, 1000000]
+KMERS       = [5, 10, 25, 50]
+FORMATS     = ["tsv", "npy"]
+ALIGN_LIMIT = 10000
+
+# the commands timed from a cold start, and how long they may take
+HERE              = os.path.dirname(os.path.abspath(__file__))
+COLD_START        = { "import": [sys.executable, "-c", "import ASH"],
+                      "help":   [sys.executable, "run_ash.py", "--help"] }
+COLD_START_TARGET = 0.5
+
+# residues per record of the generated panels
+PANEL_RECORD = 500
+
+# residues per line of the generated FASTA files
+LINE_WIDTH = 60
+
+
+#----------------------------------------------------------------------#
+#                           random_protein                             #
+#----------------------------------------------------------------------#
+# A random protein of the given length, as an array of byte values     #
+#----------------------------------------------------------------------#
+def random_protein(rng, length):
+    return RESIDUES[rng.integers(0, len(RESIDUES), length)]
+
+
+#----------------------------------------------------------------------#
+#                             make_pair                                #
+#----------------------------------------------------------------------#
+# A synthetic aligned pair: a random protein and a copy with a share   #
+# of its residues substituted and a smaller share gapped on either     #
+# side, like a real alignment of two variants. Returns the two aligned #
+# strings, which are the same length                                   #
+#----------------------------------------------------------------------#
+def make_pair(rng, length, substitutions=0.2, gaps=0.02):
+    seq1  = random_protein(rng, length)
+    seq2  = seq1.copy()
+    swap  = rng.random(length) < substitutions
+    seq2[swap] = random_protein(rng, int(swap.sum()))
+    # a gap in one sequence or the other
+    gap   = rng.random(length) < gaps
+    side  = rng.random(length) < 0.5
+    seq1[gap & side]  = ord("-")
+    seq2[gap & ~side] = ord("-")
+    return seq1.tobytes().decode("ascii"), seq2.tobytes().decode("ascii")
+
+
+#----------------------------------------------------------------------#
+#                            write_fasta                               #
+#----------------------------------------------------------------------#
+# Writes (header, sequence) records to a FASTA file, 60 residues a     #
+# line                                                                 #
+#----------------------------------------------------------------------#
+def write_fasta(filename, records):
+    with open(filename, "w") as outfile:
+        for header, seq in records:
+            outfile.write(">" + header + "\n")
+            for start in range(0, len(seq), LINE_WIDTH):
+                outfile.write(seq[start:start + LINE_WIDTH] + "\n")
+
+
+#----------------------------------------------------------------------#
+#                            make_panel                                #
+#----------------------------------------------------------------------#
+# Records of PANEL_RECORD residues adding up to size residues          #
+#----------------------------------------------------------------------#
+def make_panel(rng, size):
+    records = []
+    for start in range(0, size, PANEL_RECORD):
+        length = min(PANEL_RECORD, size - start)
+        seq    = random_protein(rng, length).tobytes().decode("ascii")
+        records.append(("variant_%d" % len(records), seq))
+    return records
+
+
+#----------------------------------------------------------------------#
+#                              measure                                 #
+#----------------------------------------------------------------------#
+# Runs func repeat times and returns the fastest time in seconds and   #
+# the peak memory of one more run under tracemalloc, which is done     #
+# apart from the timing as tracing slows everything down               #
+#----------------------------------------------------------------------#
+def measure(func, repeat=3):
+    times = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        func()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return min(times), peak
+
+
+#----------------------------------------------------------------------#
+#                               run                                    #
+#----------------------------------------------------------------------#
+# Benchmarks every stage at every size (and kmer size, and format,     #
+# where they apply) in a scratch directory. Returns a list of dicts,   #
+# one per measurement, with stage, size, k, format, seconds and        #
+# peak_bytes. report, if given, is called with each one as it is done  #
+#----------------------------------------------------------------------#
+def run(sizes=SIZES, kmers=KMERS, formats=FORMATS, seed=0, repeat=3,
+        align_limit=ALIGN_LIMIT, report=None):
+    rng     = np.random.default_rng(seed)
+    rows    = []
+    workdir = tempfile.mkdtemp(prefix="ash_benchmark_")
+
+    def record(stage, size, func, k=None, fmt=None):
+        seconds, peak = measure(func, repeat)
+        row = {"stage": stage, "size": size, "k": k, "format": fmt,
+               "seconds": seconds, "peak_bytes": peak}
+        rows.append(row)
+        if report is not None:
+            report(row)
+
+    try:
+        # build the lookup tables before anything is timed
+        scorer = Analysis.__new__(Analysis)
+        scorer.get_profile("A", "A")
+        for size in sizes:
+            aligned  = make_pair(rng, size)
+            seqs     = [s.replace("-", "") for s in aligned]
+            fasta    = os.path.join(workdir, "query_%d.fasta" % size)
+            panel    = os.path.join(workdir, "panel_%d.fasta" % size)
+            write_fasta(fasta, [("query", seqs[0])])
+            write_fasta(panel, make_panel(rng, size))
+
+            record("get_seq", size, lambda: scorer.get_seq(fasta))
+            record("read_panel", size,
+                   lambda: list(fastaio.read_fasta(panel)))
+            if size <= align_limit:
+                record("align", size, lambda: scorer.align(*seqs))
+
+            for k in kmers:
+                # a fresh object each time, so no profile is reused
+                def scan():
+                    return Analysis.__new__(Analysis).seq_to_seq(
+                        aligned[0], aligned[1], k)
+                record("seq_to_seq", size, scan, k)
+                results = scan()
+                for fmt in formats:
+                    out = os.path.join(workdir, "out_%d_%d.%s"
+                                       % (size, k, fmt))
+                    def write():
+                        with writers.open_writer(out, fmt) as outfile:
+                            outfile.write(results)
+                    record("write", size, write, k, fmt)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return rows
+
+
+#----------------------------------------------------------------------#
+#                           cold_start                                 #
+#----------------------------------------------------------------------#
+# Times each COLD_START command in a new process, keeping the fastest  #
+# of repeat runs. Returns rows like run's, with the command's name as  #
+# the format. The memory of another process isn't traced, so           #
+# peak_bytes is None                                                   #
+#----------------------------------------------------------------------#
+def cold_start(repeat=3, report=None):
+    rows = []
+    for name, command in sorted(COLD_START.items()):
+        times = []
+        for i in range(repeat):
+            start = time.perf_counter()
+            subprocess.run(command, cwd=HERE, stdout=subprocess.DEVNULL,
+                           check=True)
+            times.append(time.perf_counter() - start)
+        row = {"stage": "cold_start", "size": None, "k": None,
+               "format": name, "seconds": min(times), "peak_bytes": None}
+        rows.append(row)
+        if report is not None:
+            report(row)
+    return rows
+
+
+#----------------------------------------------------------------------#
+#                            describe                                  #
+#----------------------------------------------------------------------#
+# What was run and on what, saved alongside the timings                #
+#----------------------------------------------------------------------#
+def describe(args):
+    return {"seed":        args.seed,
+            "repeat":      args.repeat,
+            "align_limit": args.align_limit,
+            "python":      platform.python_version(),
+            "numpy":       np.__version__,
+            "platform":    platform.platform(),
+            "processor":   platform.processor(),
+            "cpus":        os.cpu_count(),
+            "date":        time.strftime("%Y-%m-%dT%H:%M:%S")}
+
+
+#----------------------------------------------------------------------#
+#                             row_key                                  #
+#----------------------------------------------------------------------#
+# What identifies a measurement between runs                           #
+#----------------------------------------------------------------------#
+def row_key(row):
+    return (row["stage"], row["size"], row["k"], row["format"])
+
+
+#----------------------------------------------------------------------#
+#                             compare                                  #
+#----------------------------------------------------------------------#
+# Takes the rows of an old and a new run and returns (key, old         #
+# seconds, new seconds, ratio) for every measurement in both that got  #
+# slower by more than threshold (0.2 is 20% slower), worst first.      #
+# Stages so quick that they slowed by less than min_delta seconds are  #
+# left out, as their timings are mostly noise                          #
+#----------------------------------------------------------------------#
+def compare(old_rows, new_rows, threshold=0.2, min_delta=0.001):
+    old = dict((row_key(row), row["seconds"]) for row in old_rows)
+    regressions = []
+    for row in new_rows:
+        key = row_key(row)
+        if key not in old or old[key] <= 0:
+            continue
+        ratio = row["seconds"] / old[key]
+        slower = row["seconds"] - old[key]
+        if ratio > 1 + threshold and slower >= min_delta:
+            regressions.append((key, old[key], row["seconds"], ratio))
+    return sorted(regressions, key=lambda item: item[3], reverse=True)
+
+
+#----------------------------------------------------------------------#
+#                            format_row                                #
+#----------------------------------------------------------------------#
+# One line of the progress report                                      #
+#----------------------------------------------------------------------#
+def format_row(row):
+    name = row["stage"]
+    if row["k"] is not None:
+        name += " k=%d" % row["k"]
+    if row["format"] is not None:
+        name += " " + row["format"]
+    size = "-" if row["size"] is None else "%d" % row["size"]
+    peak = "-" if row["peak_bytes"] is None else "%.1f" % (
+        row["peak_bytes"] / 1e6)
+    return "%-22s %9s residues %10.4f s %10s MB" % (
+        name, size, row["seconds"], peak)
+
+
+def int_list(text):
+    return [int(value) for value in text.split(",")]
+
+
+#----------------------------------------------------------------------#
+#                               main                                   #
+#----------------------------------------------------------------------#
+# Runs the benchmarks from the command line. Exits with status 1 if    #
+# --compare found any regressions or a cold start was too slow         #
+#----------------------------------------------------------------------#
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark ASH's stages")
+    parser.add_argument("-o", "--outfile", default="benchmark.json")
+    parser.add_argument("--sizes", type=int_list, default=SIZES)
+    parser.add_argument("--kmers", type=int_list, default=KMERS)
+    parser.add_argument("--formats", default=",".join(FORMATS))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--align-limit", type=int, default=ALIGN_LIMIT)
+    parser.add_argument("--compare")
+    parser.add_argument("--threshold", type=float, default=0.2)
+    parser.add_argument("--cold-start-target", type=float,
+                        default=COLD_START_TARGET)
+    args = parser.parse_args(argv)
+
+    formats = args.formats.split(",")
+    for fmt in formats:
+        if fmt not in writers.FORMATS:
+            parser.error("unknown format %r" % fmt)
+    if args.repeat < 1:
+        parser.error("--repeat must be at least 1")
+
+    report = lambda row: print(format_row(row), flush=True)
+    rows   = cold_start(args.repeat, report)
+    slow   = [row for row in rows if row["seconds"] > args.cold_start_target]
+    for row in slow:
+        print("SLOW START %-30s %.4f s, the target is %.4f s"
+              % (row["format"], row["seconds"], args.cold_start_target))
+    rows  += run(args.sizes, args.kmers, formats, args.seed, args.repeat,
+                 args.align_limit, report=report)
+    with open(args.outfile, "w") as outfile:
+        json.dump({"meta": describe(args), "results": rows}, outfile,
+                  indent=1)
+
+    if args.compare is None:
+        return 1 if slow else 0
+    with open(args.compare) as infile:
+        old = json.load(infile)["results"]
+    regressions = compare(old, rows, args.threshold)
+    for key, before, after, ratio in regressions:
+        name = " ".join(str(part) for part in key if part is not None)
+        print("REGRESSION %-30s %.4f s -> %.4f s (%.0f%% slower)"
+              % (name, before, after, (ratio - 1) * 100))
+    if not regressions:
+        print("no regressions over %.0f%%" % (args.threshold * 100))
+    return 1 if regressions or slow else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,209 @@
+#----------------------------------------------------------------------#
+#                      ASH alignment cache                             #
+#----------------------------------------------------------------------#
+# Aligning the two sequences is the slowest step of an ASH run, and    #
+# the same pair tends to be aligned over and over while the kmer size  #
+# and filters are tuned. This keeps alignments on disk, keyed by a     #
+# hash of both sequences and the alignment settings, so an unchanged   #
+# pair is only ever aligned once.                                      #
+#                                                                      #
+# The cache is a SQLite database, which takes care of locking when     #
+# several processes use the same cache at once. Every read stamps the  #
+# entry with the time, and when the cache grows past its size limit    #
+# the entries that were used least recently are dropped first.         #
+#----------------------------------------------------------------------#
+
+
+import hashlib
+import json
+import os
+import sqlite3
+import time
+import aligner
+
+# where run_ash.py keeps its cache unless told otherwise
+DEFAULT_DIRECTORY = os.path.join(os.path.expanduser("~"), ".cache", "ash")
+
+# 256 MB of aligned sequences
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+# how long to wait on another process holding the database
+TIMEOUT = 60
+
+
+#----------------------------------------------------------------------#
+#                        AlignmentCache(class)                         #
+#----------------------------------------------------------------------#
+# Takes the directory to keep the database in and the most bytes of    #
+# aligned sequence to keep. Pass one to Analysis as cache= to use it   #
+#----------------------------------------------------------------------#
+class AlignmentCache(object):
+
+    def __init__(self, directory=DEFAULT_DIRECTORY,
+                 max_bytes=DEFAULT_MAX_BYTES):
+        os.makedirs(directory, exist_ok=True)
+        self.path       = os.path.join(directory, "alignments.sqlite")
+        self.max_bytes  = max_bytes
+        # lookups made through this object
+        self.hits       = 0
+        self.misses     = 0
+        # opened on first use, once per process
+        self.connection = None
+        self.pid        = None
+        db = self.connect()
+        db.execute("CREATE TABLE IF NOT EXISTS alignments ("
+                   "key TEXT PRIMARY KEY, query TEXT, target TEXT, "
+                   "size INTEGER, atime REAL, start INTEGER)")
+        # caches made before the start was kept get the column, empty
+        names = [row[1] for row in
+                 db.execute("PRAGMA table_info(alignments)")]
+        if "start" not in names:
+            db.execute("ALTER TABLE alignments ADD COLUMN start INTEGER")
+        db.execute("CREATE INDEX IF NOT EXISTS by_atime "
+                   "ON alignments (atime)")
+        db.execute("CREATE TABLE IF NOT EXISTS counters ("
+                   "name TEXT PRIMARY KEY, value INTEGER)")
+
+    # connections can't be shared across processes, so drop it when the
+    # cache is pickled and a worker will open its own
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["connection"] = None
+        state["pid"]        = None
+        return state
+
+
+#----------------------------------------------------------------------#
+#                              connect                                 #
+#----------------------------------------------------------------------#
+# Returns this process's connection to the database, opening it in     #
+# WAL mode so readers don't block each other or the writer             #
+#----------------------------------------------------------------------#
+    def connect(self):
+        if self.connection is None or self.pid != os.getpid():
+            self.connection = sqlite3.connect(self.path, timeout=TIMEOUT,
+                                              isolation_level=None)
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.pid = os.getpid()
+        return self.connection
+
+
+#----------------------------------------------------------------------#
+#                              make_key                                #
+#----------------------------------------------------------------------#
+# Hashes both sequences and the alignment settings into a cache key.   #
+# Changing any of them, even an aligner parameter, gives a new key     #
+#----------------------------------------------------------------------#
+    def make_key(self, seq1, seq2, params):
+        data = json.dumps([seq1, seq2, sorted(params.items())])
+        return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+#----------------------------------------------------------------------#
+#                                get                                   #
+#----------------------------------------------------------------------#
+# Returns the cached aligner.Alignment [aligned query, aligned target] #
+# for a key, or None if it isn't cached, counting the hit or the miss  #
+#----------------------------------------------------------------------#
+    def get(self, key):
+        db  = self.connect()
+        row = db.execute("SELECT query, target, start FROM alignments "
+                         "WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            self.count("misses")
+            return None
+        # mark it as recently used
+        db.execute("UPDATE alignments SET atime = ? WHERE key = ?",
+                   (time.time(), key))
+        self.hits += 1
+        self.count("hits")
+        return aligner.Alignment(row[:2], row[2])
+
+
+#----------------------------------------------------------------------#
+#                                put                                   #
+#----------------------------------------------------------------------#
+# Stores an [aligned query, aligned target] pair under a key, with     #
+# its start if it is an aligner.Alignment, then drops the least        #
+# recently used entries until the cache fits again                     #
+#----------------------------------------------------------------------#
+    def put(self, key, aligned):
+        db   = self.connect()
+        size = len(aligned[0]) + len(aligned[1])
+        db.execute("INSERT OR REPLACE INTO alignments (key, query, target, "
+                   "size, atime, start) VALUES (?, ?, ?, ?, ?, ?)",
+                   (key, aligned[0], aligned[1], size, time.time(),
+                    getattr(aligned, "start", None)))
+        self.evict()
+
+
+#----------------------------------------------------------------------#
+#                               evict                                  #
+#----------------------------------------------------------------------#
+# Deletes the oldest entries until the total size is under max_bytes.  #
+# Runs in one write transaction so two processes don't both evict      #
+#----------------------------------------------------------------------#
+    def evict(self):
+        db = self.connect()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            total = db.execute("SELECT COALESCE(SUM(size), 0) "
+                               "FROM alignments").fetchone()[0]
+            if total > self.max_bytes:
+                rows = db.execute("SELECT key, size FROM alignments "
+                                  "ORDER BY atime").fetchall()
+                for key, size in rows:
+                    if total <= self.max_bytes:
+                        break
+                    db.execute("DELETE FROM alignments WHERE key = ?", (key,))
+                    total -= size
+            db.execute("COMMIT")
+        except Exception:
+            db.execute("ROLLBACK")
+            raise
+
+
+#----------------------------------------------------------------------#
+#                               count                                  #
+#----------------------------------------------------------------------#
+# Adds one to a counter kept in the database, so hits and misses       #
+# are totalled across every process and run that uses the cache        #
+#----------------------------------------------------------------------#
+    def count(self, name):
+        self.connect().execute(
+            "INSERT INTO counters VALUES (?, 1) ON CONFLICT(name) "
+            "DO UPDATE SET value = value + 1", (name,))
+
+
+#----------------------------------------------------------------------#
+#                               stats                                  #
+#----------------------------------------------------------------------#
+# Returns a dict of the cache's counters: hits and misses through this #
+# object, all-time totals from the database, and the entries and bytes #
+# currently stored                                                     #
+#----------------------------------------------------------------------#
+    def stats(self):
+        db     = self.connect()
+        totals = dict(db.execute("SELECT name, value FROM counters"))
+        entries, size = db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) "
+                                   "FROM alignments").fetchone()
+        return {"hits":         self.hits,
+                "misses":       self.misses,
+                "total_hits":   totals.get("hits", 0),
+                "total_misses": totals.get("misses", 0),
+                "entries":      entries,
+                "bytes":        size}
+
+
+#----------------------------------------------------------------------#
+#                               clear                                  #
+#----------------------------------------------------------------------#
+# Empties the cache and resets its counters                            #
+#----------------------------------------------------------------------#
+    def clear(self):
+        db = self.connect()
+        db.execute("DELETE FROM alignments")
+        db.execute("DELETE FROM counters")
+        self.hits   = 0
+        self.misses = 0
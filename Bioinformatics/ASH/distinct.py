@@ -0,0 +1,382 @@
+#----------------------------------------------------------------------#
+#                 ASH distinctness against a proteome                  #
+#----------------------------------------------------------------------#
+# ASH compares each kmer of the first protein with the kmer it is      #
+# aligned to in the second. To know whether a peptide is distinct from #
+# everything an antibody might also meet, each kmer of the query has   #
+# to be compared with every kmer of a whole set of off-target          #
+# proteins. This module indexes all the kmers of a target FASTA set    #
+# and finds, for each window of a query, the smallest hydro_mismatch   #
+# to any target window, without comparing every pair.                  #
+#                                                                      #
+# Two things keep the search small. A hashed seed index finds target   #
+# windows identical to the query window, which are at distance 0, with #
+# one binary search. Otherwise the targets are searched in order of a  #
+# lower bound: every pair of residues mismatches by at least the       #
+# difference of their hydro weights, so the distance between two       #
+# windows is at least the sum, over a few blocks of the window, of the #
+# differences of the blocks' weight totals. Target windows with the    #
+# same block totals are kept together in a bucket, the buckets are     #
+# searched from the lowest bound up, and the search stops as soon as   #
+# no bucket left can beat the best distance found so far. The query    #
+# windows are shared out among worker processes, each holding a copy   #
+# of the index.                                                        #
+#----------------------------------------------------------------------#
+
+
+import os
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import scoring
+import fastaio
+import seqstore
+
+# the nearest target window to each query window: the query position,
+# the distance, and which target record and position it was found at
+# (-1 if the query window can't be scored)
+Nearest = namedtuple("Nearest", ["pos", "distance", "target", "target_pos"])
+
+# target windows scored exactly at a time
+BATCH_SIZE = 4096
+
+# between the records, so no window spans two of them; the same as a
+# store's, so a store's residues can be indexed as they are
+SEPARATOR = seqstore.SEPARATOR
+
+# multiplier of the polynomial hash of a window
+HASH_BASE = np.uint64(1000003)
+
+# set up in each worker by init_worker
+_index = None
+
+
+#----------------------------------------------------------------------#
+#                          default_scorer                              #
+#----------------------------------------------------------------------#
+# An Analysis object to take the scale from when none is given. It is  #
+# imported here since ASH.py imports this module                       #
+#----------------------------------------------------------------------#
+def default_scorer():
+    from ASH import Analysis
+    return Analysis.__new__(Analysis)
+
+
+#----------------------------------------------------------------------#
+#                          KmerIndex(class)                            #
+#----------------------------------------------------------------------#
+# Takes (header, sequence, ...) records, the kmer size, the object to  #
+# score with (an Analysis, by default) and the number of blocks the    #
+# lower bound splits a window into. More blocks give a tighter bound   #
+# but cost more memory. Target windows with a residue that isn't on    #
+# the scale (X, U, *, ...) are left out of the index                   #
+#----------------------------------------------------------------------#
+class KmerIndex(object):
+
+    def __init__(self, records, length, scorer=None, blocks=6):
+        headers = []
+        parts   = []
+        for record in records:
+            headers.append(record[0])
+            parts.append(record[1].encode("ascii", "replace"))
+        # all the targets end to end, and where each one starts
+        joined  = SEPARATOR.join(parts)
+        sizes   = np.array([len(p) + 1 for p in parts], dtype=np.int64)
+        self.store = None
+        self.build(np.frombuffer(joined, dtype=np.uint8),
+                   np.concatenate(([0], np.cumsum(sizes)[:-1])), headers,
+                   length, scorer, blocks)
+
+    # number of target windows in the index
+    def __len__(self):
+        return len(self.starts)
+
+    # an index made from a store leaves the residues out when it is
+    # pickled, and the copy maps them from the store again
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        if self.store is not None:
+            del state["codes"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if self.store is not None:
+            self.codes = self.store.codes
+
+    # cumulative sum with a zero in front
+    def prefix_sum(self, values):
+        cum = np.zeros(len(values) + 1, dtype=values.dtype)
+        np.cumsum(values, out=cum[1:])
+        return cum
+
+
+#----------------------------------------------------------------------#
+#                              build                                   #
+#----------------------------------------------------------------------#
+# Indexes the targets given as codes, all of them end to end with a    #
+# separator between them, and offsets, where each one starts           #
+#----------------------------------------------------------------------#
+    def build(self, codes, offsets, headers, length, scorer, blocks):
+        if length < 1:
+            raise ValueError("kmer length must be at least 1")
+        if scorer is None:
+            scorer = default_scorer()
+        self.length   = length
+        self.headers  = headers
+        self.codes    = codes
+        self.offsets  = offsets
+        # the scale: per-residue weights and the per-pair mismatch
+        self.set_scale(scorer)
+        # the block boundaries within a window
+        self.blocks   = np.linspace(0, length, min(blocks, length) + 1)
+        self.blocks   = self.blocks.astype(np.int64)
+        # the block totals of every window that can be scored
+        count         = max(len(self.codes) - length + 1, 0)
+        starts        = np.arange(count, dtype=np.int64)
+        block_sums    = self.block_sums(self.codes, starts)
+        scored        = ~np.isnan(block_sums).any(axis=1)
+        starts        = starts[scored]
+        block_sums    = block_sums[scored]
+        if not self.bounded:
+            block_sums[:] = 0
+        # group the windows into buckets of equal block totals, which
+        # all have the same bound; on the ASH scale there are far
+        # fewer buckets than windows
+        order         = np.lexsort(block_sums.T[::-1])
+        block_sums    = block_sums[order]
+        self.starts   = starts[order]
+        new           = np.ones(len(block_sums), dtype=bool)
+        new[1:]       = (block_sums[1:] != block_sums[:-1]).any(axis=1)
+        # the block totals of each bucket and where its windows start
+        self.keys     = block_sums[new]
+        self.first    = np.append(np.flatnonzero(new), len(block_sums))
+        # the seed index: the windows in order of their hash
+        hashes        = self.hash_windows(self.codes, self.starts)
+        order         = np.argsort(hashes, kind="stable")
+        self.hashes   = hashes[order]
+        self.by_hash  = self.starts[order]
+
+
+#----------------------------------------------------------------------#
+#                           from_fasta                                 #
+#----------------------------------------------------------------------#
+# Alternate constructor that indexes every record of a FASTA file, or  #
+# of a store made by seqstore.py                                       #
+#----------------------------------------------------------------------#
+    @classmethod
+    def from_fasta(cls, filename, length, scorer=None, blocks=6):
+        if seqstore.is_store(filename):
+            return cls.from_store(seqstore.SequenceStore(filename), length,
+                                  scorer, blocks)
+        return cls(fastaio.read_fasta(filename), length, scorer, blocks)
+
+
+#----------------------------------------------------------------------#
+#                           from_store                                 #
+#----------------------------------------------------------------------#
+# Alternate constructor that indexes every record of a SequenceStore.  #
+# The store's residue buffer is used as it is, without copying it, and #
+# worker processes map it from the store rather than getting a copy    #
+#----------------------------------------------------------------------#
+    @classmethod
+    def from_store(cls, store, length, scorer=None, blocks=6):
+        index       = cls.__new__(cls)
+        index.store = store
+        index.build(store.codes, store.offsets[:-1], list(store.headers),
+                    length, scorer, blocks)
+        return index
+
+
+#----------------------------------------------------------------------#
+#                            set_scale                                 #
+#----------------------------------------------------------------------#
+# Takes the residue weights and the flattened 256x256 table of pair    #
+# mismatches from the scorer (see scoring.py). The bound only holds if #
+# every pair mismatches by at least its weight difference, which is    #
+# true of the ASH scale; for a scale where it isn't, the bound is      #
+# switched off and every window is scored                              #
+#----------------------------------------------------------------------#
+    def set_scale(self, scorer):
+        self.weights = np.full(scoring.TABLE_SIZE, np.nan)
+        for residue, weight in scorer.hydro_weight.items():
+            self.weights[ord(residue)] = weight
+        self.pairs   = scoring.get_tables(scorer).hydro
+        scored       = np.flatnonzero(~np.isnan(self.weights))
+        table        = self.pairs.reshape(scoring.TABLE_SIZE, -1)
+        table        = table[np.ix_(scored, scored)]
+        difference   = np.abs(self.weights[scored][:, None]
+                              - self.weights[scored][None, :])
+        self.bounded = bool(np.all(table >= difference))
+
+
+#----------------------------------------------------------------------#
+#                         block_sums                                   #
+#----------------------------------------------------------------------#
+# The total weight of each block of the windows of codes at the given  #
+# starts, one row per window. A window with a residue that isn't on    #
+# the scale gets a row of NaN                                          #
+#----------------------------------------------------------------------#
+    def block_sums(self, codes, starts):
+        weights = self.weights[codes]
+        bad     = np.isnan(weights)
+        cum     = self.prefix_sum(np.where(bad, 0.0, weights))
+        cum_bad = self.prefix_sum(bad.astype(np.int64))
+        sums    = np.empty((len(starts), len(self.blocks) - 1))
+        for b in range(len(self.blocks) - 1):
+            sums[:, b] = (cum[starts + self.blocks[b + 1]]
+                          - cum[starts + self.blocks[b]])
+        unscored = cum_bad[starts + self.length] != cum_bad[starts]
+        sums[unscored] = np.nan
+        return sums
+
+
+#----------------------------------------------------------------------#
+#                          hash_windows                                #
+#----------------------------------------------------------------------#
+# A 64-bit polynomial hash of the windows at the given starts. Equal   #
+# windows hash the same; the rare unequal ones that collide are        #
+# weeded out by scoring them                                           #
+#----------------------------------------------------------------------#
+    def hash_windows(self, codes, starts):
+        hashes = np.zeros(len(starts), dtype=np.uint64)
+        for i in range(self.length):
+            hashes = hashes * HASH_BASE + codes[starts + i]
+        return hashes
+
+
+#----------------------------------------------------------------------#
+#                             distances                                #
+#----------------------------------------------------------------------#
+# hydro_mismatch between one encoded query window and the target       #
+# windows at the given starts                                          #
+#----------------------------------------------------------------------#
+    def distances(self, query, starts):
+        windows = self.codes[starts[:, None] + np.arange(self.length)]
+        pairs   = query.astype(np.intp) * scoring.TABLE_SIZE + windows
+        return self.pairs[pairs].sum(axis=1)
+
+
+#----------------------------------------------------------------------#
+#                              locate                                  #
+#----------------------------------------------------------------------#
+# Turns a start in the joined targets into (record, position)          #
+#----------------------------------------------------------------------#
+    def locate(self, start):
+        record = int(np.searchsorted(self.offsets, start, side="right")) - 1
+        return record, int(start - self.offsets[record])
+
+
+#----------------------------------------------------------------------#
+#                            search                                    #
+#----------------------------------------------------------------------#
+# Finds the target window nearest to one encoded query window, given   #
+# its block totals. Returns (distance, start in the joined targets),   #
+# or (inf, -1) if the index is empty                                   #
+#----------------------------------------------------------------------#
+    def search(self, query, block):
+        # an identical window is as near as it gets
+        key   = self.hash_windows(query, np.zeros(1, dtype=np.int64))[0]
+        first = np.searchsorted(self.hashes, key, side="left")
+        last  = np.searchsorted(self.hashes, key, side="right")
+        if last > first:
+            starts = self.by_hash[first:last]
+            found  = self.distances(query, starts)
+            if found.min() == 0:
+                return 0.0, int(starts[np.argmin(found)])
+        best, where = np.inf, -1
+        # without a bound every block total counts as 0
+        if not self.bounded:
+            block = np.zeros_like(block)
+        # visit the buckets from the lowest bound up, until no bucket
+        # left could hold a nearer window
+        bounds = np.abs(self.keys - block).sum(axis=1)
+        for b in np.argsort(bounds, kind="stable").tolist():
+            if bounds[b] >= best:
+                break
+            for first in range(self.first[b], self.first[b + 1], BATCH_SIZE):
+                last  = min(first + BATCH_SIZE, self.first[b + 1])
+                found = self.distances(query, self.starts[first:last])
+                i     = int(np.argmin(found))
+                if found[i] < best:
+                    best, where = float(found[i]), int(self.starts[first + i])
+            if best == 0:
+                break
+        return best, where
+
+
+#----------------------------------------------------------------------#
+#                             nearest                                  #
+#----------------------------------------------------------------------#
+# Takes a query sequence (ungapped) and returns a Nearest tuple of     #
+# arrays for its windows from start to stop: the smallest              #
+# hydro_mismatch to any target window, and where that window is. A     #
+# query window with a residue that isn't on the scale gets a distance  #
+# of NaN, as does every window if the index is empty                   #
+#----------------------------------------------------------------------#
+    def nearest(self, seq, start=0, stop=None):
+        codes   = scoring.encode(seq)
+        count   = max(len(codes) - self.length + 1, 0)
+        if stop is None or stop > count:
+            stop = count
+        start   = min(max(start, 0), stop)
+        pos     = np.arange(start, stop)
+        blocks  = self.block_sums(codes, pos)
+        result  = Nearest(pos, np.full(len(pos), np.nan),
+                          np.full(len(pos), -1, dtype=np.int64),
+                          np.full(len(pos), -1, dtype=np.int64))
+        for i, p in enumerate(pos.tolist()):
+            # NaN blocks mean a residue off the scale
+            if np.isnan(blocks[i]).any():
+                continue
+            best, where = self.search(codes[p:p + self.length], blocks[i])
+            if where < 0:
+                continue
+            result.distance[i] = best
+            result.target[i], result.target_pos[i] = self.locate(where)
+        return result
+
+
+#----------------------------------------------------------------------#
+#                           init_worker                                #
+#----------------------------------------------------------------------#
+# Runs once in each worker process and keeps its copy of the index     #
+#----------------------------------------------------------------------#
+def init_worker(index):
+    global _index
+    _index = index
+
+
+#----------------------------------------------------------------------#
+#                           search_chunk                               #
+#----------------------------------------------------------------------#
+# Takes (seq, start, stop) and searches the worker's index for the     #
+# query windows from start to stop                                     #
+#----------------------------------------------------------------------#
+def search_chunk(task):
+    seq, start, stop = task
+    return _index.nearest(seq, start, stop)
+
+
+#----------------------------------------------------------------------#
+#                          min_distances                               #
+#----------------------------------------------------------------------#
+# Returns the Nearest tuple for every window of query_seq against a    #
+# KmerIndex. The windows are searched chunk_size at a time by a pool   #
+# of processes workers (all cores by default), and processes=1         #
+# searches in this process                                             #
+#----------------------------------------------------------------------#
+def min_distances(query_seq, index, processes=None, chunk_size=64):
+    count = max(len(query_seq) - index.length + 1, 0)
+    tasks = [(query_seq, start, start + chunk_size)
+             for start in range(0, count, chunk_size)]
+    if processes is None:
+        processes = os.cpu_count() or 1
+    if processes == 1 or len(tasks) <= 1:
+        parts = [index.nearest(query_seq)]
+    else:
+        with ProcessPoolExecutor(processes, initializer=init_worker,
+                                 initargs=(index,)) as pool:
+            parts = list(pool.map(search_chunk, tasks))
+    return Nearest(*[np.concatenate([part[c] for part in parts])
+                     for c in range(len(Nearest._fields))])
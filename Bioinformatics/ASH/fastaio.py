@@ -0,0 +1,392 @@
+#----------------------------------------------------------------------#
+#                     streaming FASTA reader                           #
+#----------------------------------------------------------------------#
+# A FASTA parser shared by ASH.py and fasta.py. It reads the file in   #
+# fixed-size chunks (or through mmap) and yields one Record per        #
+# sequence, so multi-record files are never loaded whole and records   #
+# are never merged together. Each sequence is built with a single      #
+# join of its bytes rather than by adding line after line. Gzipped     #
+# files are detected by their magic number and read transparently.     #
+# Every Record carries the byte offset of its ">" in the (unzipped)    #
+# file, and read_record_at can jump straight back to it. For files too #
+# big to scan, FastaIndex keeps a samtools-style .fai index next to    #
+# the file and reads single records, or parts of them, by id.          #
+#----------------------------------------------------------------------#
+
+
+import gzip
+import mmap
+import os
+from collections import namedtuple
+
+# one sequence from the file and where its header starts
+Record = namedtuple("Record", ["header", "sequence", "offset"])
+
+# how much of the file to read at a time
+CHUNK_SIZE = 1 << 16
+
+# the first two bytes of every gzip file
+GZIP_MAGIC = b"\x1f\x8b"
+
+# removed from sequence lines
+WHITESPACE = b" \t\r\n\v\f"
+
+
+#----------------------------------------------------------------------#
+#                            is_gzipped                                #
+#----------------------------------------------------------------------#
+# Checks the magic number at the start of the file                     #
+#----------------------------------------------------------------------#
+def is_gzipped(filename):
+    with open(filename, "rb") as handle:
+        return handle.read(2) == GZIP_MAGIC
+
+
+#----------------------------------------------------------------------#
+#                            open_fasta                                #
+#----------------------------------------------------------------------#
+# Opens a FASTA file for reading as bytes, unzipping it if need be     #
+#----------------------------------------------------------------------#
+def open_fasta(filename):
+    if is_gzipped(filename):
+        return gzip.open(filename, "rb")
+    return open(filename, "rb")
+
+
+#----------------------------------------------------------------------#
+#                            make_record                               #
+#----------------------------------------------------------------------#
+# Turns the bytes of one record (header line and sequence lines) into  #
+# a Record. Text before the first header in a file is returned as a    #
+# record with an empty header, and blank blocks give None              #
+#----------------------------------------------------------------------#
+def make_record(block, offset):
+    if block[:1] == b">":
+        newline = block.find(b"\n")
+        if newline < 0:
+            newline = len(block)
+        header = bytes(block[1:newline]).decode("utf-8", "replace").strip()
+        body   = block[newline:]
+    else:
+        # sequence with no header
+        if not bytes(block).strip():
+            return None
+        header = ""
+        body   = block
+    # every line of the sequence joined at once
+    sequence = bytes(body).translate(None, WHITESPACE)
+    return Record(header, sequence.decode("ascii", "replace"), offset)
+
+
+#----------------------------------------------------------------------#
+#                           parse_buffer                               #
+#----------------------------------------------------------------------#
+# Yields the Records in buf[start:end]. start must be the beginning of #
+# a record, and so must end unless it is the end of the file. base is  #
+# the file offset of buf[0]                                            #
+#----------------------------------------------------------------------#
+def parse_buffer(buf, base, start, end):
+    while start < end:
+        # a record runs until the next line that starts with ">"
+        boundary = buf.find(b"\n>", start, end)
+        stop     = end if boundary < 0 else boundary + 1
+        record   = make_record(buf[start:stop], base + start)
+        if record is not None:
+            yield record
+        start = stop
+
+
+#----------------------------------------------------------------------#
+#                            read_fasta                                #
+#----------------------------------------------------------------------#
+# Generator over the Records of a FASTA file, starting from the byte   #
+# offset given (the start of the file by default). The file is read    #
+# chunk_size bytes at a time; only the record being read is kept in    #
+# memory. With use_mmap the file is memory-mapped instead, which lets  #
+# the OS page it in as it is parsed (gzipped files are always read in  #
+# chunks since they can't be mapped)                                   #
+#----------------------------------------------------------------------#
+def read_fasta(filename, chunk_size=CHUNK_SIZE, use_mmap=False, offset=0):
+    with open_fasta(filename) as handle:
+
+        if use_mmap and not isinstance(handle, gzip.GzipFile):
+            # an empty file can't be mapped, and has no records anyway
+            if handle.seek(0, 2) == 0:
+                return
+            with mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+                for record in parse_buffer(buf, 0, offset, len(buf)):
+                    yield record
+            return
+
+        handle.seek(offset)
+        # bytes of the record(s) not yet parsed, and their file offset
+        pending = bytearray()
+        base    = offset
+        while True:
+            chunk = handle.read(chunk_size)
+            if not chunk:
+                break
+            # only the new bytes (and the newline before them) can hold a
+            # new record boundary, so don't search the old ones again
+            searched_from = max(len(pending) - 1, 0)
+            pending      += chunk
+            boundary      = pending.rfind(b"\n>", searched_from)
+            if boundary < 0:
+                continue
+            # everything before the last boundary is complete records
+            cut = boundary + 1
+            for record in parse_buffer(pending, base, 0, cut):
+                yield record
+            del pending[:cut]
+            base += cut
+        # the last record runs to the end of the file
+        for record in parse_buffer(pending, base, 0, len(pending)):
+            yield record
+
+
+#----------------------------------------------------------------------#
+#                          read_record_at                              #
+#----------------------------------------------------------------------#
+# Returns the Record whose header starts at the given byte offset, as  #
+# reported by the offset of a Record from read_fasta                   #
+#----------------------------------------------------------------------#
+def read_record_at(filename, offset):
+    for record in read_fasta(filename, offset=offset):
+        return record
+    raise ValueError("no FASTA record at offset %d of %s" % (offset, filename))
+
+
+#----------------------------------------------------------------------#
+#                           first_record                               #
+#----------------------------------------------------------------------#
+# Returns the first Record of a FASTA file, or an empty one if the     #
+# file has no sequence in it                                           #
+#----------------------------------------------------------------------#
+def first_record(filename):
+    for record in read_fasta(filename):
+        return record
+    return Record("", "", 0)
+
+
+#----------------------------------------------------------------------#
+#                          split_spec                                  #
+#----------------------------------------------------------------------#
+# Sequences can be named as "file.fasta" (the first record) or as      #
+# "file.fasta:RECORD_ID" (one record, looked up through the index).    #
+# Returns the (filename, record_id) pair, record_id being None for a   #
+# bare filename. A file whose own name has a colon in it wins          #
+#----------------------------------------------------------------------#
+def split_spec(spec):
+    if ":" in spec and not os.path.exists(spec):
+        filename, record_id = spec.rsplit(":", 1)
+        return filename, record_id
+    return spec, None
+
+
+#----------------------------------------------------------------------#
+#                          read_sequence                               #
+#----------------------------------------------------------------------#
+# Returns the sequence named by a spec as described in split_spec. The #
+# file can also be a binary store made by seqstore.py, which is mapped #
+# rather than parsed                                                   #
+#----------------------------------------------------------------------#
+def read_sequence(spec):
+    filename, record_id = split_spec(spec)
+    # seqstore imports this module, so it is imported here
+    import seqstore
+    if seqstore.is_store(filename):
+        with seqstore.SequenceStore(filename) as store:
+            return store.sequence(0 if record_id is None else record_id)
+    if record_id is None:
+        return first_record(filename).sequence
+    with FastaIndex(filename) as index:
+        return index.fetch(record_id)
+
+
+#----------------------------------------------------------------------#
+#                            IndexEntry                                #
+#----------------------------------------------------------------------#
+# One line of a .fai index: the record's id (first word of the         #
+# header), its number of residues, the byte offset of its first        #
+# residue, the residues per line and the bytes per line (newline       #
+# included). This is the same layout samtools faidx uses               #
+#----------------------------------------------------------------------#
+IndexEntry = namedtuple("IndexEntry", ["name", "length", "offset",
+                                       "line_bases", "line_width"])
+
+
+#----------------------------------------------------------------------#
+#                           build_index                                #
+#----------------------------------------------------------------------#
+# Reads a FASTA file once and returns a list of IndexEntry tuples. All #
+# the lines of a record must be the same length except its last one,   #
+# or there is no way to compute where a residue is, so a ValueError is #
+# raised for ragged files (and for gzipped ones, which can't be read   #
+# at an offset without unzipping everything before it)                 #
+#----------------------------------------------------------------------#
+def build_index(filename):
+    if is_gzipped(filename):
+        raise ValueError("can't index gzipped file %s, unzip it first"
+                         % filename)
+    entries = []
+    # the record being read
+    name = None
+    with open(filename, "rb") as handle:
+        offset = 0
+        for line in handle:
+            if line.startswith(b">"):
+                if name is not None:
+                    entries.append(IndexEntry(name, length, seq_offset,
+                                              line_bases, line_width))
+                words      = line[1:].split()
+                name       = words[0].decode("utf-8") if words else ""
+                length     = 0
+                seq_offset = offset + len(line)
+                line_bases = 0
+                line_width = 0
+                # once a short line is seen the record must be over
+                ended      = False
+            elif name is not None:
+                bases = len(line.rstrip(b"\r\n"))
+                if bases and ended:
+                    raise ValueError("record %s in %s has lines of "
+                                     "different lengths" % (name, filename))
+                if line_bases == 0:
+                    line_bases = bases
+                    line_width = len(line)
+                elif bases > line_bases:
+                    raise ValueError("record %s in %s has lines of "
+                                     "different lengths" % (name, filename))
+                if bases < line_bases or len(line) != line_width:
+                    ended = True
+                length += bases
+            offset += len(line)
+    if name is not None:
+        entries.append(IndexEntry(name, length, seq_offset,
+                                  line_bases, line_width))
+    return entries
+
+
+#----------------------------------------------------------------------#
+#                          FastaIndex(class)                           #
+#----------------------------------------------------------------------#
+# Random access into a large FASTA file. The index is built the first  #
+# time a file is opened and saved next to it as file.fasta.fai, then   #
+# loaded from there until the FASTA changes. Lookups work out where    #
+# the wanted residues are from the index and read just those bytes     #
+# through a memory map of the file                                     #
+#----------------------------------------------------------------------#
+class FastaIndex(object):
+
+    def __init__(self, filename):
+        self.filename   = filename
+        self.index_file = filename + ".fai"
+        self.entries    = {}
+        for entry in self.load():
+            # like samtools, the first of any duplicate ids wins
+            if entry.name not in self.entries:
+                self.entries[entry.name] = entry
+        # ids in file order
+        self.names = list(self.entries)
+        # mapped on first lookup
+        self.handle = None
+        self.map    = None
+
+    # with-statement support, so the map gets closed
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __contains__(self, name):
+        return name in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+
+#----------------------------------------------------------------------#
+#                               load                                   #
+#----------------------------------------------------------------------#
+# Reads the .fai file if it is newer than the FASTA, or builds it and  #
+# tries to save it. If the directory isn't writable the index is just  #
+# kept in memory. The index is written to a temporary file and moved   #
+# into place, so another process never reads half of one              #
+#----------------------------------------------------------------------#
+    def load(self):
+        if (os.path.exists(self.index_file) and
+                os.path.getmtime(self.index_file) >=
+                os.path.getmtime(self.filename)):
+            entries = []
+            with open(self.index_file, "r") as index:
+                for line in index:
+                    fields = line.rstrip("\n").split("\t")
+                    entries.append(IndexEntry(fields[0],
+                                              *map(int, fields[1:5])))
+            return entries
+        entries = build_index(self.filename)
+        temp    = "%s.%d.tmp" % (self.index_file, os.getpid())
+        try:
+            with open(temp, "w") as index:
+                for entry in entries:
+                    index.write("\t".join(map(str, entry)) + "\n")
+            os.replace(temp, self.index_file)
+        except OSError:
+            pass
+        finally:
+            if os.path.exists(temp):
+                os.remove(temp)
+        return entries
+
+
+#----------------------------------------------------------------------#
+#                              length                                  #
+#----------------------------------------------------------------------#
+# Number of residues in a record, without reading it                   #
+#----------------------------------------------------------------------#
+    def length(self, name):
+        return self.get_entry(name).length
+
+    # the IndexEntry for an id, with a useful error if it's missing
+    def get_entry(self, name):
+        if name not in self.entries:
+            raise KeyError("no record %s in %s" % (name, self.filename))
+        return self.entries[name]
+
+
+#----------------------------------------------------------------------#
+#                               fetch                                  #
+#----------------------------------------------------------------------#
+# Returns residues start to end (0-based, end excluded, like a python  #
+# slice) of a record, or all of it by default. Only the lines that     #
+# hold those residues are read                                         #
+#----------------------------------------------------------------------#
+    def fetch(self, name, start=0, end=None):
+        entry = self.get_entry(name)
+        if end is None or end > entry.length:
+            end = entry.length
+        start = max(start, 0)
+        if start >= end:
+            return ""
+        if self.map is None:
+            self.handle = open(self.filename, "rb")
+            self.map    = mmap.mmap(self.handle.fileno(), 0,
+                                    access=mmap.ACCESS_READ)
+        first = self.byte_offset(entry, start)
+        last  = self.byte_offset(entry, end - 1) + 1
+        return self.map[first:last].translate(None, WHITESPACE).decode(
+            "ascii", "replace")
+
+    # where residue pos of a record is in the file
+    def byte_offset(self, entry, pos):
+        return (entry.offset + (pos // entry.line_bases) * entry.line_width
+                + pos % entry.line_bases)
+
+    # let go of the memory map and the file
+    def close(self):
+        if self.map is not None:
+            self.map.close()
+            self.handle.close()
+            self.map    = None
+            self.handle = None
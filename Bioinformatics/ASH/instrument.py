@@ -0,0 +1,213 @@
+#----------------------------------------------------------------------#
+#                       ASH stage instrumentation                      #
+#----------------------------------------------------------------------#
+# Measures where an ASH run spends its time. An Analysis given an      #
+# Instrument records each of its stages (reading the FASTA files,      #
+# aligning, scoring the windows) with:                                 #
+#                                                                      #
+#   wall             seconds on the clock                              #
+#   cpu              seconds of CPU used by this process               #
+#   windows          kmers scored, for the stages that score them      #
+#   windows_per_sec  windows / wall                                    #
+#   peak_rss         the most memory the process has held so far, in   #
+#                    bytes (None where the resource module is missing) #
+#                                                                      #
+# Every record is passed to the callbacks as a dict as soon as the     #
+# stage ends, so the numbers can be sent on to a metrics system, and   #
+# report prints a summary by stage. Given a profile_file, the whole    #
+# run is also profiled with cProfile and the stats saved there for     #
+# python -m pstats. Without an Instrument, each stage costs one        #
+# attribute lookup and an empty with-block.                            #
+#----------------------------------------------------------------------#
+
+
+import cProfile
+import sys
+import time
+
+# not on every platform
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+#----------------------------------------------------------------------#
+#                             peak_rss                                 #
+#----------------------------------------------------------------------#
+# The peak resident set size of this process in bytes, or None if it   #
+# can't be found. Linux reports it in kilobytes, macOS in bytes        #
+#----------------------------------------------------------------------#
+def peak_rss():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        return peak
+    return peak * 1024
+
+
+#----------------------------------------------------------------------#
+#                          NullStage(class)                            #
+#----------------------------------------------------------------------#
+# What stage gives when there is no Instrument: does nothing, and      #
+# setting windows on it is harmless                                    #
+#----------------------------------------------------------------------#
+class NullStage(object):
+
+    windows = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+# one is enough for every stage
+NULL_STAGE = NullStage()
+
+
+#----------------------------------------------------------------------#
+#                               stage                                  #
+#----------------------------------------------------------------------#
+# Returns a with-block that times a stage on the given Instrument, or  #
+# the shared do-nothing one if it is None                              #
+#----------------------------------------------------------------------#
+def stage(instrument, name):
+    if instrument is None:
+        return NULL_STAGE
+    return Stage(instrument, name)
+
+
+#----------------------------------------------------------------------#
+#                            Stage(class)                              #
+#----------------------------------------------------------------------#
+# Times one stage. Set windows inside the with-block to the number of  #
+# kmers it scored to get the throughput                                #
+#----------------------------------------------------------------------#
+class Stage(object):
+
+    def __init__(self, instrument, name):
+        self.instrument = instrument
+        self.name       = name
+        self.windows    = None
+
+    def __enter__(self):
+        self.wall = time.perf_counter()
+        self.cpu  = time.process_time()
+        return self
+
+    def __exit__(self, *exc):
+        wall = time.perf_counter() - self.wall
+        cpu  = time.process_time() - self.cpu
+        rate = None
+        if self.windows is not None and wall > 0:
+            rate = self.windows / wall
+        self.instrument.record({"stage":           self.name,
+                                "wall":            wall,
+                                "cpu":             cpu,
+                                "windows":         self.windows,
+                                "windows_per_sec": rate,
+                                "peak_rss":        peak_rss()})
+        return False
+
+
+#----------------------------------------------------------------------#
+#                          Instrument(class)                           #
+#----------------------------------------------------------------------#
+# Collects the stage records of one or more Analysis objects. callback #
+# is a function (or list of them) called with each record. With a      #
+# profile_file, cProfile runs from start until finish                  #
+#----------------------------------------------------------------------#
+class Instrument(object):
+
+    def __init__(self, callback=None, profile_file=None):
+        self.records   = []
+        self.callbacks = []
+        if callable(callback):
+            self.callbacks.append(callback)
+        elif callback is not None:
+            self.callbacks.extend(callback)
+        self.profile_file = profile_file
+        self.profiler     = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.finish()
+        return False
+
+    def add_callback(self, callback):
+        self.callbacks.append(callback)
+
+    # keeps a finished stage and hands it to the callbacks
+    def record(self, record):
+        self.records.append(record)
+        for callback in self.callbacks:
+            callback(record)
+
+    # with a profile_file, starts profiling
+    def start(self):
+        if self.profile_file is not None and self.profiler is None:
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+
+    # stops profiling, if it was, and saves the stats
+    def finish(self):
+        if self.profiler is not None:
+            self.profiler.disable()
+            self.profiler.dump_stats(self.profile_file)
+            self.profiler = None
+
+
+#----------------------------------------------------------------------#
+#                              totals                                  #
+#----------------------------------------------------------------------#
+# The records added up by stage, in the order the stages first ran.    #
+# Times and windows are summed, peak_rss is the largest seen           #
+#----------------------------------------------------------------------#
+    def totals(self):
+        totals = {}
+        for record in self.records:
+            total = totals.setdefault(record["stage"],
+                                      {"stage": record["stage"], "calls": 0,
+                                       "wall": 0.0, "cpu": 0.0,
+                                       "windows": None, "peak_rss": None})
+            total["calls"] += 1
+            total["wall"]  += record["wall"]
+            total["cpu"]   += record["cpu"]
+            if record["windows"] is not None:
+                total["windows"] = (total["windows"] or 0) + record["windows"]
+            if record["peak_rss"] is not None:
+                total["peak_rss"] = max(total["peak_rss"] or 0,
+                                        record["peak_rss"])
+        for total in totals.values():
+            total["windows_per_sec"] = None
+            if total["windows"] is not None and total["wall"] > 0:
+                total["windows_per_sec"] = total["windows"] / total["wall"]
+        return list(totals.values())
+
+
+#----------------------------------------------------------------------#
+#                              report                                  #
+#----------------------------------------------------------------------#
+# Writes a table of the totals to stream (stderr by default)           #
+#----------------------------------------------------------------------#
+    def report(self, stream=None):
+        if stream is None:
+            stream = sys.stderr
+        stream.write("%-12s %6s %10s %10s %12s %14s %10s\n"
+                     % ("stage", "calls", "wall s", "cpu s", "windows",
+                        "windows/s", "peak MB"))
+        for total in self.totals():
+            windows = total["windows"]
+            rate    = total["windows_per_sec"]
+            rss     = total["peak_rss"]
+            stream.write("%-12s %6d %10.4f %10.4f %12s %14s %10s\n"
+                         % (total["stage"], total["calls"], total["wall"],
+                            total["cpu"],
+                            "-" if windows is None else windows,
+                            "-" if rate is None else "%.0f" % rate,
+                            "-" if rss is None else "%.1f" % (rss / 1e6)))
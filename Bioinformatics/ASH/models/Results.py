@@ -0,0 +1,250 @@
+#----------------------------------------------------------------------#
+#                          Results(class)                              #
+#----------------------------------------------------------------------#
+# Columnar storage for the results of an ASH scan. Rather than one     #
+# Entry object per kmer, each attribute is kept as one NumPy array     #
+# (pos, hy_score, str_score, hy_pct, str_pct), and the peptides aren't #
+# stored at all: a kmer's sequence and its analog are sliced out of    #
+# the two aligned sequences when they're asked for. A Results object   #
+# acts like the list of Entry objects it replaces: it has a length,    #
+# can be indexed and sliced, and iterating over it yields EntryView    #
+# objects with the same attributes as an Entry. Filters can be run on  #
+# the columns directly with where, which returns the indices of the    #
+# matching kmers without building any objects.                         #
+#----------------------------------------------------------------------#
+
+
+import operator
+import re
+from collections import namedtuple
+import numpy as np
+from models.Entry import Entry
+
+# comparisons allowed in a where expression
+OPERATORS = { "<=": operator.le, ">=": operator.ge, "==": operator.eq,
+              "!=": operator.ne, "<":  operator.lt, ">":  operator.gt }
+
+# one comparison, like "hy_score > 10"
+CLAUSE = re.compile(r"^\s*(\w+)\s*(<=|>=|==|!=|<|>)\s*"
+                    r"([-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)\s*$")
+
+
+# the rows of two Results that differ: before holds the old rows and
+# after the new ones (see Analysis.apply_mutations)
+Changes = namedtuple("Changes", ["before", "after"])
+
+
+class Results(object):
+
+    # the numeric columns, in the order they're stored
+    columns = ["pos", "hy_score", "str_score", "hy_pct", "str_pct"]
+
+    # takes the aligned sequences, the kmer length, and one array per
+    # column, all the same length
+    def __init__(self, seq1, seq2, length, pos, hy_score, str_score,
+                 hy_pct, str_pct):
+        self.seq1      = seq1
+        self.seq2      = seq2
+        self.length    = length
+        self.pos       = np.asarray(pos, dtype=np.int64)
+        self.hy_score  = np.asarray(hy_score, dtype=np.float64)
+        self.str_score = np.asarray(str_score, dtype=np.float64)
+        self.hy_pct    = np.asarray(hy_pct, dtype=np.float64)
+        self.str_pct   = np.asarray(str_pct, dtype=np.float64)
+
+    # builds a Results from a scoring.Windows tuple
+    @classmethod
+    def from_windows(cls, seq1, seq2, length, windows):
+        return cls(seq1, seq2, length, windows.pos, windows.hy_score,
+                   windows.str_score, windows.hy_pct, windows.str_pct)
+
+    def __len__(self):
+        return len(self.pos)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield EntryView(self, i)
+
+    # an int gives one EntryView, anything else numpy can index with
+    # (a slice, an array of indices, a boolean mask) gives a Results
+    def __getitem__(self, index):
+        if isinstance(index, (int, np.integer)):
+            if index < 0:
+                index += len(self)
+            if not 0 <= index < len(self):
+                raise IndexError("Results index out of range")
+            return EntryView(self, index)
+        return self.take(index)
+
+
+#----------------------------------------------------------------------#
+#                               take                                   #
+#----------------------------------------------------------------------#
+# Returns a new Results with only the given rows. The aligned          #
+# sequences are shared, not copied                                     #
+#----------------------------------------------------------------------#
+    def take(self, index):
+        return Results(self.seq1, self.seq2, self.length,
+                       self.pos[index], self.hy_score[index],
+                       self.str_score[index], self.hy_pct[index],
+                       self.str_pct[index])
+
+
+#----------------------------------------------------------------------#
+#                            seq / analog                              #
+#----------------------------------------------------------------------#
+# The peptide of row i in the first sequence, and the peptide it was   #
+# compared to in the second                                            #
+#----------------------------------------------------------------------#
+    def seq(self, i):
+        start = int(self.pos[i])
+        return self.seq1[start:start + self.length]
+
+    def analog(self, i):
+        start = int(self.pos[i])
+        return self.seq2[start:start + self.length]
+
+
+#----------------------------------------------------------------------#
+#                               mask                                   #
+#----------------------------------------------------------------------#
+# Takes an expression like "hy_score > 10 & str_score > 2" and returns #
+# a boolean array marking the rows it is true for. Comparisons are     #
+# between a column and a number, and can be joined with & (or "and")   #
+# and | (or "or"), & binding tighter, as in "a > 1 & b > 2 | c < 3".   #
+# Unlike numpy, no brackets are needed around the comparisons          #
+#----------------------------------------------------------------------#
+    def mask(self, expr):
+        result = np.zeros(len(self), dtype=bool)
+        for alternative in re.split(r"\||\bor\b", expr):
+            matched = np.ones(len(self), dtype=bool)
+            for clause in re.split(r"&|\band\b", alternative):
+                found = CLAUSE.match(clause)
+                if found is None or found.group(1) not in self.columns:
+                    raise ValueError("can't filter on %r" % clause.strip())
+                column  = getattr(self, found.group(1))
+                compare = OPERATORS[found.group(2)]
+                matched &= compare(column, float(found.group(3)))
+            result |= matched
+        return result
+
+
+#----------------------------------------------------------------------#
+#                               where                                  #
+#----------------------------------------------------------------------#
+# Returns an array of the indices of the rows that match a filter. The #
+# filter is either an expression for mask or a boolean array built     #
+# from the columns, e.g. (r.hy_score > 10) & (r.str_score > 2)         #
+#----------------------------------------------------------------------#
+    def where(self, condition):
+        if isinstance(condition, str):
+            condition = self.mask(condition)
+        return np.flatnonzero(condition)
+
+
+#----------------------------------------------------------------------#
+#                            same_rows                                 #
+#----------------------------------------------------------------------#
+# Compares row i of this Results with row i of another, for the rows   #
+# both have, and returns a boolean array that is True where the two    #
+# have the same position, scores, peptide and analog. The peptides are #
+# compared column by column of the aligned sequences, so nothing is    #
+# sliced out of them                                                   #
+#----------------------------------------------------------------------#
+    def same_rows(self, other):
+        count = min(len(self), len(other))
+        same  = np.full(count, self.length == other.length)
+        for name in self.columns:
+            mine   = getattr(self, name)[:count]
+            theirs = getattr(other, name)[:count]
+            same  &= (mine == theirs) | (np.isnan(mine) & np.isnan(theirs))
+        # where the aligned sequences differ, counted along them
+        width   = min(len(self.seq1), len(other.seq1),
+                      len(self.seq2), len(other.seq2))
+        differ  = np.zeros(width, dtype=bool)
+        for mine, theirs in ((self.seq1, other.seq1),
+                             (self.seq2, other.seq2)):
+            differ |= (self.codes(mine)[:width]
+                       != self.codes(theirs)[:width])
+        cum     = np.zeros(width + 1, dtype=np.int64)
+        np.cumsum(differ, out=cum[1:])
+        # the positions are the same wherever same is still True
+        start   = self.pos[:count]
+        end     = start + self.length
+        inside  = end <= width
+        clean   = np.zeros(count, dtype=bool)
+        clean[inside] = cum[end[inside]] == cum[start[inside]]
+        # windows that run past the shorter sequences are compared whole
+        for i in np.flatnonzero(same & ~inside).tolist():
+            clean[i] = (self.seq(i) == other.seq(i) and
+                        self.analog(i) == other.analog(i))
+        return same & clean
+
+    # the byte values of an aligned sequence
+    def codes(self, seq):
+        return np.frombuffer(seq.encode("ascii", "replace"), dtype=np.uint8)
+
+
+#----------------------------------------------------------------------#
+#                            to_entries                                #
+#----------------------------------------------------------------------#
+# Builds the old list of Entry objects, for code that needs real ones  #
+#----------------------------------------------------------------------#
+    def to_entries(self):
+        return [view.to_entry() for view in self]
+
+
+#----------------------------------------------------------------------#
+#                         EntryView(class)                             #
+#----------------------------------------------------------------------#
+# A window onto one row of a Results object, with the attributes of an #
+# Entry. Nothing is copied until an attribute is read, and the scores  #
+# come back as the same python values an Entry holds                   #
+#----------------------------------------------------------------------#
+class EntryView(object):
+
+    __slots__ = ["results", "index"]
+
+    def __init__(self, results, index):
+        self.results = results
+        self.index   = index
+
+    @property
+    def seq(self):
+        return self.results.seq(self.index)
+
+    @property
+    def analog(self):
+        return self.results.analog(self.index)
+
+    @property
+    def pos(self):
+        return int(self.results.pos[self.index])
+
+    # the mismatch scores are the integer 0 when nothing mismatched
+    @property
+    def hy_score(self):
+        return float(self.results.hy_score[self.index]) or 0
+
+    @property
+    def str_score(self):
+        return float(self.results.str_score[self.index]) or 0
+
+    @property
+    def hy_pct(self):
+        return float(self.results.hy_pct[self.index])
+
+    @property
+    def str_pct(self):
+        return float(self.results.str_pct[self.index])
+
+    # a real Entry with the same values
+    def to_entry(self):
+        return Entry(seq = self.seq, pos = self.pos,
+                     hy_score = self.hy_score, str_score = self.str_score,
+                     hy_pct = self.hy_pct, str_pct = self.str_pct,
+                     analog = self.analog)
+
+    def __repr__(self):
+        return "EntryView(seq=%r, pos=%d, hy_score=%r, str_score=%r)" % (
+            self.seq, self.pos, self.hy_score, self.str_score)
@@ -0,0 +1,251 @@
+#----------------------------------------------------------------------#
+#                  ASH over a multiple sequence alignment              #
+#----------------------------------------------------------------------#
+# Analysis compares two sequences. To compare a candidate with a whole #
+# clade of variants, this module takes an alignment that is already    #
+# made (aligned FASTA, every row the same length, gaps as "-") and     #
+# scores every window of one reference row against all the other rows  #
+# at once. For each window it gives the mean, the minimum and the      #
+# maximum hydro and structural mismatch over the other rows, and the   #
+# reference window's hydrophile and complex residue percentages as in  #
+# an ASH report. Positions are alignment columns.                      #
+#                                                                      #
+# The means come from the residue counts of each column: the mismatch  #
+# of the reference residue against every residue of the alphabet,      #
+# weighted by how many rows hold it, gives the column's mean, and the  #
+# window means are prefix sums of those, O(L*A) for L columns and an   #
+# alphabet of A residues. A minimum or maximum over rows doesn't split #
+# into columns like that (the row nearest in one column needn't be the #
+# nearest in the next), so those are taken from a prefix sum of each   #
+# row, O(L*N) for N rows, a block of rows at a time. Neither depends   #
+# on the kmer size.                                                    #
+#----------------------------------------------------------------------#
+
+
+from collections import namedtuple
+import numpy as np
+import scoring
+import fastaio
+
+# the windows of the reference row: the column, the mean, minimum and
+# maximum mismatch over the other rows on both scales, and the
+# reference's percentages
+MsaWindows = namedtuple("MsaWindows", ["pos", "hy_mean", "hy_min", "hy_max",
+                                       "str_mean", "str_min", "str_max",
+                                       "hy_pct", "str_pct"])
+
+# rows scored at a time for the minimum and maximum
+BLOCK_ROWS = 64
+
+
+#----------------------------------------------------------------------#
+#                       MultipleAlignment(class)                       #
+#----------------------------------------------------------------------#
+# Takes (header, sequence, ...) records of an alignment, the reference #
+# row as an index or as the id (first word of the header) of a record, #
+# the object to score with (an Analysis, by default) and the unknown   #
+# residue policy (see scoring.resolve). A scorer brings its own policy #
+# ("error" if it has none), so unknown can only be given with one if   #
+# the two agree                                                        #
+#----------------------------------------------------------------------#
+class MultipleAlignment(object):
+
+    def __init__(self, records, reference=0, scorer=None, unknown=None):
+        if unknown is not None and unknown not in scoring.UNKNOWN:
+            raise ValueError("unknown must be one of %s"
+                             % ", ".join(scoring.UNKNOWN))
+        if scorer is None:
+            import distinct
+            scorer = distinct.default_scorer()
+            scorer.unknown = unknown or "error"
+        elif unknown not in (None, getattr(scorer, "unknown", "error")):
+            raise ValueError("the scorer handles unknown residues with %r, "
+                             "not %r" % (getattr(scorer, "unknown", "error"),
+                                         unknown))
+        self.headers   = []
+        self.sequences = []
+        for record in records:
+            self.headers.append(record[0])
+            self.sequences.append(record[1])
+        if len(self.sequences) < 2:
+            raise ValueError("an alignment needs at least two rows")
+        lengths = set(len(seq) for seq in self.sequences)
+        if len(lengths) > 1:
+            raise ValueError("the rows of an alignment must all be the "
+                             "same length, found %s"
+                             % ", ".join(str(n) for n in sorted(lengths)))
+        self.reference = self.find_row(reference)
+        self.tables    = scoring.get_tables(scorer)
+        # one row of byte values per sequence
+        self.codes     = np.stack([scoring.encode(seq)
+                                   for seq in self.sequences])
+        self.ref_codes = self.codes[self.reference]
+        self.count_columns()
+
+    # number of columns
+    def __len__(self):
+        return self.codes.shape[1]
+
+    # cumulative sum along the last axis with a zero in front
+    def prefix_sum(self, values):
+        shape = values.shape[:-1] + (values.shape[-1] + 1,)
+        cum   = np.zeros(shape, dtype=values.dtype)
+        np.cumsum(values, axis=-1, out=cum[..., 1:])
+        return cum
+
+    # sums of the windows of a given length at positions start to stop,
+    # along the last axis
+    def window_sum(self, cum, length, start, stop):
+        return cum[..., start + length:stop + length] - cum[..., start:stop]
+
+
+#----------------------------------------------------------------------#
+#                           from_fasta                                 #
+#----------------------------------------------------------------------#
+# Alternate constructor that reads the alignment from an aligned FASTA #
+# file                                                                 #
+#----------------------------------------------------------------------#
+    @classmethod
+    def from_fasta(cls, filename, reference=0, scorer=None, unknown="error"):
+        return cls(fastaio.read_fasta(filename), reference, scorer, unknown)
+
+
+#----------------------------------------------------------------------#
+#                            find_row                                  #
+#----------------------------------------------------------------------#
+# The index of the reference row, given an index or a record id        #
+#----------------------------------------------------------------------#
+    def find_row(self, reference):
+        if isinstance(reference, int):
+            if not -len(self.headers) <= reference < len(self.headers):
+                raise ValueError("no row %d in an alignment of %d rows"
+                                 % (reference, len(self.headers)))
+            return reference % len(self.headers)
+        for row, header in enumerate(self.headers):
+            if header.split()[:1] == [reference]:
+                return row
+        raise ValueError("no record %r in the alignment" % reference)
+
+
+#----------------------------------------------------------------------#
+#                         count_columns                                #
+#----------------------------------------------------------------------#
+# Counts the residues of each column over the rows other than the      #
+# reference, and from the counts works out the mean mismatch of each   #
+# column on both scales and the prefix sums of the means               #
+#----------------------------------------------------------------------#
+    def count_columns(self):
+        size, columns  = self.codes.shape
+        # the residues that occur, and each one's place among them
+        self.alphabet  = np.unique(self.codes)
+        index          = np.searchsorted(self.alphabet, self.codes)
+        where          = np.arange(columns) * len(self.alphabet) + index
+        self.counts    = np.bincount(where.ravel(),
+                                     minlength=columns * len(self.alphabet))
+        self.counts    = self.counts.reshape(columns, len(self.alphabet))
+        self.counts[np.arange(columns), index[self.reference]] -= 1
+        # the mismatch of each column's reference residue against every
+        # residue of the alphabet
+        pairs          = (self.ref_codes.astype(np.intp)[:, None]
+                          * scoring.TABLE_SIZE + self.alphabet)
+        present        = self.counts > 0
+        hydro          = self.tables.hydro[pairs]
+        struct         = self.tables.struct[pairs]
+        # columns holding a pair the scale can't score
+        self.unscored  = np.flatnonzero(
+            (present & (np.isnan(hydro) | np.isnan(struct))).any(axis=1))
+        others         = size - 1
+        hydro          = np.where(present, hydro, 0.0) * self.counts
+        struct         = np.where(present, struct, 0.0) * self.counts
+        self.cum_hydro   = self.prefix_sum(hydro.sum(axis=1) / others)
+        self.cum_struct  = self.prefix_sum(struct.sum(axis=1) / others)
+        self.cum_philic  = self.prefix_sum(self.tables.philic[self.ref_codes])
+        self.cum_complex = self.prefix_sum(
+            self.tables.complex[self.ref_codes])
+
+
+#----------------------------------------------------------------------#
+#                          check_scored                                #
+#----------------------------------------------------------------------#
+# As in scoring.Profile, re-runs the scalar functions on the first     #
+# pair the scale can't score to raise the same KeyError                #
+#----------------------------------------------------------------------#
+    def check_scored(self):
+        if len(self.unscored) == 0:
+            return
+        column = self.unscored[0]
+        ref    = self.sequences[self.reference][column]
+        for row, seq in enumerate(self.sequences):
+            if row != self.reference:
+                self.tables.hydro_pair(ref, seq[column])
+                self.tables.struct_pair(ref, seq[column])
+
+
+#----------------------------------------------------------------------#
+#                            row_scores                                #
+#----------------------------------------------------------------------#
+# The window sums of the given rows on one flattened pair table, one   #
+# row of windows per sequence                                          #
+#----------------------------------------------------------------------#
+    def row_scores(self, table, rows, length, start, stop):
+        pairs = (self.ref_codes.astype(np.intp) * scoring.TABLE_SIZE
+                 + self.codes[rows])
+        return self.window_sum(self.prefix_sum(table[pairs]), length,
+                               start, stop)
+
+
+#----------------------------------------------------------------------#
+#                             windows                                  #
+#----------------------------------------------------------------------#
+# Takes a kmer size and returns an MsaWindows tuple of arrays for      #
+# every window of that size, or those from start to stop. A residue    #
+# the scale can't score raises a KeyError                              #
+#----------------------------------------------------------------------#
+    def windows(self, length, start=0, stop=None):
+        if length < 1:
+            raise ValueError("kmer length must be at least 1")
+        count = max(len(self) - length + 1, 0)
+        if count > 0:
+            self.check_scored()
+        if stop is None or stop > count:
+            stop = count
+        start  = min(max(start, 0), stop)
+        # the means, from the column counts
+        hy_mean  = self.window_sum(self.cum_hydro, length, start, stop)
+        str_mean = self.window_sum(self.cum_struct, length, start, stop)
+        # the extremes, from every other row a block at a time
+        others   = [row for row in range(len(self.sequences))
+                    if row != self.reference]
+        extremes = []
+        for table in (self.tables.hydro, self.tables.struct):
+            low  = np.full(stop - start, np.inf)
+            high = np.full(stop - start, -np.inf)
+            for first in range(0, len(others), BLOCK_ROWS):
+                scores = self.row_scores(table,
+                                         others[first:first + BLOCK_ROWS],
+                                         length, start, stop)
+                np.minimum(low, scores.min(axis=0), out=low)
+                np.maximum(high, scores.max(axis=0), out=high)
+            extremes.append((low, high))
+        philic  = self.window_sum(self.cum_philic, length, start, stop)
+        complex = self.window_sum(self.cum_complex, length, start, stop)
+        pct     = scoring.percent_table(length)
+        return MsaWindows(pos      = np.arange(start, stop),
+                          hy_mean  = hy_mean,
+                          hy_min   = extremes[0][0],
+                          hy_max   = extremes[0][1],
+                          str_mean = str_mean,
+                          str_min  = extremes[1][0],
+                          str_max  = extremes[1][1],
+                          hy_pct   = pct[philic],
+                          str_pct  = pct[complex])
+
+
+#----------------------------------------------------------------------#
+#                           peptides                                   #
+#----------------------------------------------------------------------#
+# The reference row's kmer at each position                            #
+#----------------------------------------------------------------------#
+    def peptides(self, positions, length):
+        seq = self.sequences[self.reference]
+        return [seq[p:p + length] for p in positions]
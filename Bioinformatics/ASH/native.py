@@ -0,0 +1,95 @@
+#----------------------------------------------------------------------#
+#                      ASH native scoring kernel                       #
+#----------------------------------------------------------------------#
+# Loads the compiled window scoring kernel from ASH++/ (built with     #
+# "make" in that directory) if it is there. scoring.py uses it when    #
+# available is True and falls back to NumPy when it isn't, and the two #
+# give identical results. The NumPy arrays are handed to the kernel    #
+# through their buffers, so nothing is copied. Set the environment     #
+# variable ASH_NO_NATIVE to use the NumPy path even if the kernel is   #
+# built.                                                               #
+#----------------------------------------------------------------------#
+
+
+import ctypes
+import os
+import sys
+import numpy as np
+from numpy.ctypeslib import ndpointer
+
+# where make puts the kernel
+DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "ASH++")
+if sys.platform == "darwin":
+    LIBRARY = "libash_kernel.dylib"
+elif sys.platform == "win32":
+    LIBRARY = "ash_kernel.dll"
+else:
+    LIBRARY = "libash_kernel.so"
+
+# argument types, contiguous arrays only
+BYTES   = ndpointer(np.uint8, flags="C_CONTIGUOUS")
+FLOATS  = ndpointer(np.float64, flags="C_CONTIGUOUS")
+INTS    = ndpointer(np.int64, flags="C_CONTIGUOUS")
+INT     = ctypes.c_int64
+
+
+#----------------------------------------------------------------------#
+#                              load                                    #
+#----------------------------------------------------------------------#
+# Returns the kernel library with its functions' argument types set,   #
+# or None if it hasn't been built or can't be loaded                   #
+#----------------------------------------------------------------------#
+def load(path=os.path.join(DIRECTORY, LIBRARY)):
+    if os.environ.get("ASH_NO_NATIVE"):
+        return None
+    try:
+        lib = ctypes.CDLL(path)
+    except OSError:
+        return None
+    lib.ash_profile.argtypes = [BYTES, BYTES, INT, FLOATS, FLOATS, INTS,
+                                INTS, FLOATS, FLOATS, INTS, INTS]
+    lib.ash_profile.restype  = INT
+    lib.ash_windows.argtypes = [FLOATS, FLOATS, INTS, INTS, INT, INT,
+                                INT, FLOATS, FLOATS, INTS, INTS]
+    lib.ash_windows.restype  = None
+    return lib
+
+_lib      = load()
+available = _lib is not None
+
+
+#----------------------------------------------------------------------#
+#                             profile                                  #
+#----------------------------------------------------------------------#
+# Takes the byte values of an aligned pair and its ScoreTables and     #
+# returns the four prefix sums Profile keeps (hydro, struct, philic,   #
+# complex), plus the first position the tables can't score, or -1      #
+#----------------------------------------------------------------------#
+def profile(codes1, codes2, tables):
+    size = len(codes1)
+    cum  = (np.empty(size + 1), np.empty(size + 1),
+            np.empty(size + 1, dtype=np.int64),
+            np.empty(size + 1, dtype=np.int64))
+    unscored = _lib.ash_profile(np.ascontiguousarray(codes1),
+                                np.ascontiguousarray(codes2), size,
+                                tables.hydro, tables.struct, tables.philic,
+                                tables.complex, *cum)
+    return cum + (unscored,)
+
+
+#----------------------------------------------------------------------#
+#                             windows                                  #
+#----------------------------------------------------------------------#
+# Scores the windows of a Profile of the given length from start to    #
+# stop. Returns the hydro and structural mismatches and the counts of  #
+# hydrophiles and complex residues in each window                      #
+#----------------------------------------------------------------------#
+def windows(profile, length, start, stop):
+    count  = stop - start
+    result = (np.empty(count), np.empty(count),
+              np.empty(count, dtype=np.int64),
+              np.empty(count, dtype=np.int64))
+    _lib.ash_windows(profile.cum_hydro, profile.cum_struct,
+                     profile.cum_philic, profile.cum_complex,
+                     length, start, stop, *result)
+    return result
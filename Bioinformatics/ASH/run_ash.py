@@ -1,7 +1,12 @@
 
 import argparse
+import os
 import sys
-import ASH
+import aligner
+import cache
+import fastaio
+import scoring
+import writers
 
 
 """   |get flagged commandline arguments|   """
@@ -9,9 +14,29 @@ import ASH
 parser = argparse.ArgumentParser()
 
 parser.add_argument("-f1", "--fasta1", required = True)
-parser.add_argument("-k, ", "--kmer", required = True)
-parser.add_argument("-f2", "--fasta2", required = True)
-parser.add_argument("-o, ", "--outfile", required = True)
+parser.add_argument("-k", "--kmer", required = True)
+# either one second sequence, or a multi-record file of targets
+second = parser.add_mutually_exclusive_group(required = True)
+second.add_argument("-f2", "--fasta2")
+second.add_argument("-t", "--targets")
+parser.add_argument("-o", "--outfile", required = True)
+parser.add_argument("--format", default = "tsv", choices = writers.FORMATS)
+parser.add_argument("-p", "--processes", type = int, default = None)
+# keep alignments between runs, in the default place or a given one
+parser.add_argument("-c", "--cache", nargs = "?", default = None,
+                    const = cache.DEFAULT_DIRECTORY)
+# how to align: scikit-bio, the built-in aligner, or a band around
+# shared seeds for long, nearly identical sequences
+parser.add_argument("--aligner", default = None,
+                    choices = sorted(aligner.BACKENDS))
+# what to do with residues that aren't on the scale
+parser.add_argument("--unknown", default = "error", choices = scoring.UNKNOWN)
+# scan very long alignments a chunk of kmers at a time in workers
+parser.add_argument("--workers", type = int, default = 1)
+parser.add_argument("--chunk-size", type = int, default = None)
+# time each stage, and optionally save a cProfile of the whole run
+parser.add_argument("--profile", action = "store_true")
+parser.add_argument("--profile-dump", metavar = "FILE")
 
 # parse them
 args = parser.parse_args()
@@ -19,36 +44,135 @@ args = parser.parse_args()
 
 """   |handle exceptions|   """
 
-# fileIO
-try:
-    test_file = open(args.fasta1, "r")
-except FileNotFoundError:
-    sys.exit("Cannont open file for --fasta1")
+# fileIO, the fasta files may be given as file.fasta:RECORD_ID. They're
+# only checked for here, and opened once when they're read
+def check_file(filename, option):
+    if not os.access(filename, os.R_OK) or os.path.isdir(filename):
+        sys.exit("Cannont open file for " + option)
 
-try:
-    test_file = open(args.fasta2, "r")
-except FileNotFoundError:
-    sys.exit("Cannont open file for --fasta2")
+check_file(fastaio.split_spec(args.fasta1)[0], "--fasta1")
+if args.fasta2 is not None:
+    check_file(fastaio.split_spec(args.fasta2)[0], "--fasta2")
+else:
+    check_file(args.targets, "--targets")
 
-# type error for kmer
+# type error for kmer, which is an integer or a range such as 8-25
 try:
-    args.kmer = int(args.kmer)
+    if "-" in args.kmer:
+        first, last = args.kmer.split("-")
+        kmers = list(range(int(first), int(last) + 1))
+    else:
+        kmers = [int(args.kmer)]
 except ValueError:
-    sys.exit("Please enter an integer for --kmer")
+    sys.exit("Please enter an integer or a range like 8-25 for --kmer")
+
+if len(kmers) == 0 or min(kmers) < 1:
+    sys.exit("Please enter positive kmer sizes for --kmer")
+
+if args.processes is not None and args.processes < 1:
+    sys.exit("Please enter a positive number for --processes")
+
+if args.workers < 1:
+    sys.exit("Please enter a positive number for --workers")
+
+if args.chunk_size is not None and args.chunk_size < 1:
+    sys.exit("Please enter a positive number for --chunk-size")
 
 
 """   |main|   """
 
+# imported once the arguments are known to be good, so --help and
+# mistakes in the arguments come back quickly
+import ASH
+import instrument
+
+# time the stages if asked to, profiling from here on with --profile-dump
+stages = None
+if args.profile or args.profile_dump is not None:
+    stages = instrument.Instrument(profile_file = args.profile_dump)
+    stages.start()
+
+# tell the user where the time went
+def report_stages():
+    if stages is not None:
+        stages.finish()
+        if args.profile:
+            stages.report()
+
+# open the alignment cache, if asked for
+alignment_cache = None
+if args.cache is not None:
+    alignment_cache = cache.AlignmentCache(args.cache)
+
+# tell the user how the cache did
+def report_cache():
+    if alignment_cache is not None:
+        stats = alignment_cache.stats()
+        sys.stderr.write("alignment cache: %d hits, %d misses\n"
+                         % (stats["hits"], stats["misses"]))
+
+# screen one query against every record in --targets
+if args.targets is not None:
+    if len(kmers) > 1:
+        sys.exit("Please enter a single kmer size with --targets")
+    # the targets are already shared out among --processes workers
+    if args.workers != 1 or args.chunk_size is not None:
+        sys.exit("Please use --processes, not --workers or --chunk-size, "
+                 "with --targets")
+    import batch
+    hits = batch.screen_file(args.fasta1, args.targets, kmers[0],
+                             processes = args.processes,
+                             cache = alignment_cache,
+                             unknown = args.unknown,
+                             align_backend = args.aligner)
+    # the workers' stages can't be seen from here, so the whole screen,
+    # writing included, is timed as one
+    with instrument.stage(stages, "screen") as stage, \
+         writers.open_writer(args.outfile, args.format,
+                             [("target", str)]) as outfile:
+        stage.windows = 0
+        # the target's id leads each row, write each target as soon as
+        # it is done
+        for hit in hits:
+            outfile.write(hit.entries, target = hit.header.split()[0])
+            stage.windows += len(hit.entries)
+    report_cache()
+    report_stages()
+    sys.exit()
+
+# a range of kmers shares one alignment and writes one long table
+if len(kmers) > 1:
+    # align once, skip the single kmer scan
+    ash_obj = ASH.Analysis(args.fasta1, args.fasta2, None,
+                           cache = alignment_cache, instrument = stages,
+                           unknown = args.unknown,
+                           align_backend = args.aligner,
+                           workers = args.workers,
+                           chunk_size = args.chunk_size)
+    # the kmer size leads each row
+    with writers.open_writer(args.outfile, args.format,
+                             [("k", int)]) as outfile:
+        for k, results in ash_obj.scan_kmers(kmers).items():
+            with instrument.stage(stages, "write") as stage:
+                outfile.write(results, k = k)
+                stage.windows = len(results)
+    report_cache()
+    report_stages()
+    sys.exit()
+
 # get Analysis object
-ash_obj = ASH.Analysis(args.fasta1, args.fasta2, args.kmer)
-
-# open outfile
-with open(args.outfile, "w") as outfile:
-    # write header
-    outfile.write("\t".join(["seq", "pos", "hy_score", "str_score", "analog", "hy_pct", "str_pct\n"]))
-    # iterate entries in ASH report
-    for e in ash_obj.get_entries():
-        # get entries attributes as strings, write them to csv
-        out_data = map(str, [e.seq, e.pos, e.hy_score, e.str_score, e.analog, e.hy_pct, e.str_pct, "\n"])
-        outfile.write("\t".join(out_data))
-    outfile.close()
+ash_obj = ASH.Analysis(args.fasta1, args.fasta2, kmers[0],
+                       cache = alignment_cache, instrument = stages,
+                       unknown = args.unknown,
+                       align_backend = args.aligner,
+                       workers = args.workers,
+                       chunk_size = args.chunk_size)
+
+# open outfile and write the ASH report to it
+with instrument.stage(stages, "write") as stage, \
+     writers.open_writer(args.outfile, args.format) as outfile:
+    outfile.write(ash_obj.get_entries())
+    stage.windows = len(ash_obj.get_entries())
+
+report_cache()
+report_stages()
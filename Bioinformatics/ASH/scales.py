@@ -0,0 +1,294 @@
+#----------------------------------------------------------------------#
+#                        ASH scale registry                            #
+#----------------------------------------------------------------------#
+# Residue scales other than the two ASH is built on, such as           #
+# Kyte-Doolittle hydropathy or Hopp-Woods hydrophilicity, kept by name #
+# in a registry. A scale is a weight per residue plus the rules that   #
+# turn two weights into a mismatch, the same rules the ASH scales use: #
+#                                                                      #
+#   - identical residues don't mismatch                                #
+#   - a residue against a gap scores gap                               #
+#   - otherwise the difference of the weights, or tie if that is 0     #
+#   - with weighted_only, pairs where neither residue has a weight     #
+#     other than 0 don't count (the structural scale works this way)   #
+#                                                                      #
+# Each scale is compiled once into a 256x256 table of the mismatch of  #
+# every pair of byte values and a 256 entry table of the residues with #
+# a positive weight, so scoring is a gather over the encoded sequence. #
+# Residues that aren't on a scale (X, B, Z, U, lowercase letters...)   #
+# are handled by its unknown policy, see scoring.resolve.              #
+#                                                                      #
+# ScaleProfile scores any number of scales over an aligned pair in one #
+# pass, gathering from all of their tables at once.                    #
+#                                                                      #
+# A scale file has "key = value" settings and one "residue weight"     #
+# line per residue; # starts a comment:                                #
+#                                                                      #
+#   # Kyte & Doolittle (1982)                                          #
+#   name    = kyte_doolittle                                           #
+#   unknown = gap                                                      #
+#   A  1.8                                                             #
+#   R -4.5                                                             #
+#   ...                                                                #
+#----------------------------------------------------------------------#
+
+
+import os
+from collections import namedtuple
+import numpy as np
+import scoring
+
+# the windows of several scales: the positions, and the mismatch and
+# positive-residue percentage of each scale, by name
+ScaleWindows = namedtuple("ScaleWindows", ["pos", "scores", "pcts"])
+
+# settings a scale file can give, and how to read them
+SETTINGS = { "name":          str,
+             "gap":           float,
+             "tie":           float,
+             "weighted_only": lambda value: value.lower() in ("yes", "true",
+                                                              "1"),
+             "unknown":       str }
+
+# the scales, by name
+_registry = {}
+
+
+#----------------------------------------------------------------------#
+#                             Scale(class)                             #
+#----------------------------------------------------------------------#
+# Takes a name, a dict of residue weights and the rules above. gap     #
+# defaults to the largest difference between two weights. The tables   #
+# are built when the scale is made                                     #
+#----------------------------------------------------------------------#
+class Scale(object):
+
+    def __init__(self, name, weights, gap=None, tie=0.25,
+                 weighted_only=False, unknown="error"):
+        self.name          = name
+        self.weights       = dict(weights)
+        values             = list(self.weights.values())
+        if gap is None:
+            gap = max(values) - min(values)
+        self.gap           = gap
+        self.tie           = tie
+        self.weighted_only = weighted_only
+        self.unknown       = unknown
+        self.table         = scoring.resolve(self.pair_table(),
+                                             list(self.weights),
+                                             unknown).ravel()
+        self.indicator     = scoring.resolve_indicator(
+            scoring.indicator_table(self.weights), list(self.weights),
+            unknown)
+
+    def __repr__(self):
+        return "Scale(%r, %d residues)" % (self.name, len(self.weights))
+
+
+#----------------------------------------------------------------------#
+#                            pair_table                                #
+#----------------------------------------------------------------------#
+# The 256x256 mismatch of every pair of byte values under the rules,   #
+# NaN where a residue isn't on the scale                               #
+#----------------------------------------------------------------------#
+    def pair_table(self):
+        size    = scoring.TABLE_SIZE
+        gap     = ord(scoring.GAP)
+        weights = np.full(size, np.nan)
+        for residue, weight in self.weights.items():
+            weights[ord(residue)] = weight
+        table   = np.abs(weights[:, None] - weights[None, :])
+        table[table == 0] = self.tie
+        # a residue against a gap
+        known   = ~np.isnan(weights)
+        table[gap, known] = self.gap
+        table[known, gap] = self.gap
+        if self.weighted_only:
+            # the gap has no weight either
+            unweighted      = known & (weights == 0)
+            unweighted[gap] = True
+            table[np.ix_(unweighted, unweighted)] = 0.0
+        # identical codes always match, even ones off the scale
+        np.fill_diagonal(table, 0.0)
+        return table
+
+
+#----------------------------------------------------------------------#
+#                            mismatch                                  #
+#----------------------------------------------------------------------#
+# The mismatch of two peptides, one residue at a time, from the table. #
+# Raises a KeyError for a residue the scale can't score                #
+#----------------------------------------------------------------------#
+    def mismatch(self, seq1, seq2):
+        score = 0
+        for residue1, residue2 in zip(seq1, seq2):
+            score += self.pair(residue1, residue2)
+        return score
+
+    def pair(self, residue1, residue2):
+        code1 = int(scoring.encode(residue1)[0])
+        code2 = int(scoring.encode(residue2)[0])
+        value = self.table[code1 * scoring.TABLE_SIZE + code2]
+        if np.isnan(value):
+            if residue1 in self.weights or residue1 == scoring.GAP:
+                raise KeyError(residue2)
+            raise KeyError(residue1)
+        return float(value)
+
+
+#----------------------------------------------------------------------#
+#                          register / get_scale                        #
+#----------------------------------------------------------------------#
+# register adds a Scale to the registry under its name, replacing any  #
+# scale of that name. get_scale takes a name or a Scale and returns    #
+# the Scale. scale_names lists what is registered                      #
+#----------------------------------------------------------------------#
+def register(scale):
+    _registry[scale.name] = scale
+    return scale
+
+def get_scale(scale):
+    if isinstance(scale, Scale):
+        return scale
+    if scale not in _registry:
+        raise ValueError("no scale named %r, the scales are %s"
+                         % (scale, ", ".join(scale_names())))
+    return _registry[scale]
+
+def scale_names():
+    return sorted(_registry)
+
+
+#----------------------------------------------------------------------#
+#                            load_scale                                #
+#----------------------------------------------------------------------#
+# Reads a scale file (see the top of this file), registers the scale   #
+# and returns it. The name defaults to the file name without its       #
+# extension                                                            #
+#----------------------------------------------------------------------#
+def load_scale(filename):
+    options = {"name": os.path.splitext(os.path.basename(filename))[0]}
+    weights = {}
+    with open(filename) as infile:
+        for number, line in enumerate(infile, 1):
+            line = line.split("#")[0].strip()
+            if not line:
+                continue
+            try:
+                if "=" in line:
+                    key, value = [part.strip() for part in line.split("=", 1)]
+                    if key not in SETTINGS:
+                        raise ValueError("unknown setting %r" % key)
+                    options[key] = SETTINGS[key](value)
+                else:
+                    residue, weight = line.split()
+                    if len(residue) != 1:
+                        raise ValueError("%r is not one residue" % residue)
+                    weights[residue.upper()] = float(weight)
+            except ValueError as error:
+                raise ValueError("%s line %d: %s" % (filename, number, error))
+    if not weights:
+        raise ValueError("%s has no residue weights" % filename)
+    name = options.pop("name")
+    return register(Scale(name, weights, **options))
+
+
+#----------------------------------------------------------------------#
+#                        ScaleProfile(class)                           #
+#----------------------------------------------------------------------#
+# The per-residue profile of an aligned pair on several scales at      #
+# once. The pair index of every position is worked out once and all    #
+# the scales' tables are gathered from with it in one go, then kept as #
+# prefix sums as in scoring.Profile                                    #
+#----------------------------------------------------------------------#
+class ScaleProfile(object):
+
+    def __init__(self, seq1, seq2, scales):
+        if len(seq1) != len(seq2):
+            raise ValueError("aligned sequences must be the same length")
+        self.seq1   = seq1
+        self.seq2   = seq2
+        self.scales = [get_scale(scale) for scale in scales]
+        codes1      = scoring.encode(seq1)
+        codes2      = scoring.encode(seq2)
+        pairs       = codes1.astype(np.intp) * scoring.TABLE_SIZE + codes2
+        # one row per scale
+        tables      = np.stack([scale.table for scale in self.scales])
+        counts      = np.stack([scale.indicator for scale in self.scales])
+        scores      = tables[:, pairs]
+        self.unscored   = np.flatnonzero(np.isnan(scores).any(axis=0))
+        self.cum_scores = self.prefix_sum(scores)
+        self.cum_counts = self.prefix_sum(counts[:, codes1])
+
+    def __len__(self):
+        return len(self.seq1)
+
+    # cumulative sums along each row, with a column of zeros in front
+    def prefix_sum(self, values):
+        cum = np.zeros((values.shape[0], values.shape[1] + 1),
+                       dtype=values.dtype)
+        np.cumsum(values, axis=1, out=cum[:, 1:])
+        return cum
+
+
+#----------------------------------------------------------------------#
+#                             windows                                  #
+#----------------------------------------------------------------------#
+# Scores every window of a kmer size, or those from start to stop, on  #
+# every scale. Returns a ScaleWindows. As with the ASH scales, a       #
+# residue a scale can't score raises a KeyError                        #
+#----------------------------------------------------------------------#
+    def windows(self, length, start=0, stop=None):
+        if length < 1:
+            raise ValueError("kmer length must be at least 1")
+        count = max(len(self) - length + 1, 0)
+        if count > 0 and len(self.unscored) > 0:
+            i = self.unscored[0]
+            for scale in self.scales:
+                scale.pair(self.seq1[i], self.seq2[i])
+        if stop is None or stop > count:
+            stop = count
+        start  = min(max(start, 0), stop)
+        scores = (self.cum_scores[:, start + length:stop + length]
+                  - self.cum_scores[:, start:stop])
+        counts = (self.cum_counts[:, start + length:stop + length]
+                  - self.cum_counts[:, start:stop])
+        pct    = scoring.percent_table(length)
+        names  = [scale.name for scale in self.scales]
+        return ScaleWindows(pos    = np.arange(start, stop),
+                            scores = dict(zip(names, scores)),
+                            pcts   = dict(zip(names, pct[counts])))
+
+
+#----------------------------------------------------------------------#
+#                          built-in scales                             #
+#----------------------------------------------------------------------#
+# The two ASH scales, and two classic ones from the literature         #
+#----------------------------------------------------------------------#
+register(Scale("ash_hydro",
+               { "L":-0.5, "A":-0.5, "F":-0.5, "Y":-0.5, "W":-0.5,
+                 "I":-0.5, "V":-0.5, "H":+0.0, "N":+0.0, "C":+0.0,
+                 "G":+0.0, "M":+0.0, "Q":+0.0, "P":+0.0, "S":+0.0,
+                 "T":+0.0, "D":+0.5, "E":+0.5, "R":+0.5, "K":+0.5 },
+               gap=2.0, tie=0.25))
+
+register(Scale("ash_struct",
+               { "L":+0.0, "A":+0.0, "F":+1.0, "Y":+1.0, "W":+1.0,
+                 "I":+0.0, "V":+0.0, "H":+1.0, "N":+0.0, "C":+0.0,
+                 "G":+0.0, "M":+0.0, "Q":+0.0, "P":+1.0, "S":+0.0,
+                 "T":+0.0, "D":+0.0, "E":+0.0, "R":+0.0, "K":+0.0 },
+               gap=2.0, tie=0.5, weighted_only=True))
+
+# hydropathy, Kyte & Doolittle (1982), hydrophobic is positive
+register(Scale("kyte_doolittle",
+               { "A":+1.8, "R":-4.5, "N":-3.5, "D":-3.5, "C":+2.5,
+                 "Q":-3.5, "E":-3.5, "G":-0.4, "H":-3.2, "I":+4.5,
+                 "L":+3.8, "K":-3.9, "M":+1.9, "F":+2.8, "P":-1.6,
+                 "S":-0.8, "T":-0.7, "W":-0.9, "Y":-1.3, "V":+4.2 }))
+
+# hydrophilicity, Hopp & Woods (1981), hydrophilic is positive
+register(Scale("hopp_woods",
+               { "A":-0.5, "R":+3.0, "N":+0.2, "D":+3.0, "C":-1.0,
+                 "Q":+0.2, "E":+3.0, "G":+0.0, "H":-0.5, "I":-1.8,
+                 "L":-1.8, "K":+3.0, "M":-1.3, "F":-2.5, "P":+0.0,
+                 "S":+0.3, "T":-0.4, "W":-3.4, "Y":-2.3, "V":-1.5 }))
@@ -0,0 +1,141 @@
+#----------------------------------------------------------------------#
+#                     ASH parallel chunked scan                        #
+#----------------------------------------------------------------------#
+# seq_to_seq scores every window of the alignment from one profile,    #
+# in one thread. For very long alignments (polyproteins, concatenated  #
+# constructs) this splits the windows into chunks, gives each chunk    #
+# the columns its windows cover (so neighbouring chunks overlap by     #
+# kmer - 1 columns), scores the chunks from profiles of just those     #
+# columns in a pool of worker processes or threads, and puts the       #
+# windows back together in position order.                             #
+#                                                                      #
+# A chunk's window sums come from its own prefix sums rather than the  #
+# whole alignment's. They are still exactly the serial ones as long as #
+# every sum is exact, which is so when the scale's scores are all      #
+# multiples of a small power of two (as ASH's are, in halves) and no   #
+# sum gets too big for a float to hold exactly. For any other scale    #
+# the windows are scored serially, so the output is always identical.  #
+#----------------------------------------------------------------------#
+
+
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import numpy as np
+import scoring
+
+# windows scored by one worker at a time
+CHUNK_SIZE = 1 << 16
+
+# the pools a scan can run in
+POOLS = ("process", "thread")
+
+# scores that are whole multiples of 2**-FRACTION_BITS add up exactly
+FRACTION_BITS = 16
+
+# the largest integer a float64 holds exactly
+EXACT_LIMIT = 2.0 ** 53
+
+# set up in each worker by init_worker
+_tables = None
+
+
+#----------------------------------------------------------------------#
+#                           init_worker                                #
+#----------------------------------------------------------------------#
+# Runs once in each worker process and keeps the scale's tables        #
+#----------------------------------------------------------------------#
+def init_worker(tables):
+    global _tables
+    _tables = tables
+
+
+#----------------------------------------------------------------------#
+#                           sums_are_exact                             #
+#----------------------------------------------------------------------#
+# True if every prefix sum over columns positions of the tables'       #
+# scores is exact, so where a chunk starts its sums can't change them  #
+#----------------------------------------------------------------------#
+def sums_are_exact(tables, columns):
+    for table in (tables.hydro, tables.struct, tables.philic,
+                  tables.complex):
+        values = table[np.isfinite(table)] * 2.0 ** FRACTION_BITS
+        if len(values) == 0:
+            continue
+        if not np.all(values == np.round(values)):
+            return False
+        if np.abs(values).max() * (columns + 1) >= EXACT_LIMIT:
+            return False
+    return True
+
+
+#----------------------------------------------------------------------#
+#                           score_chunk                                #
+#----------------------------------------------------------------------#
+# Takes (start, seq1, seq2, length), the columns covered by the        #
+# windows from start on, and scores all of their windows. Returns the  #
+# scoring.Windows at their positions in the whole alignment, or the    #
+# position of the first column the scale can't score (as an int) so    #
+# the error can be raised where the serial code would raise it         #
+#----------------------------------------------------------------------#
+def score_chunk(task, tables=None):
+    start, seq1, seq2, length = task
+    if tables is None:
+        tables = _tables
+    profile = scoring.Profile(seq1, seq2, tables)
+    if len(profile.unscored):
+        return start + int(profile.unscored[0])
+    windows = profile.windows(length)
+    return windows._replace(pos=windows.pos + start)
+
+
+#----------------------------------------------------------------------#
+#                           scan_windows                               #
+#----------------------------------------------------------------------#
+# Scores every window of length of the aligned pair seq1, seq2 with    #
+# the scoring.ScoreTables tables, chunk_size windows to a task, in a   #
+# pool of workers ("process" or "thread" pool; all cores by default).  #
+# Returns a scoring.Windows identical to Profile.windows on the whole  #
+# pair, which is what is used if the sums might not be exact or there  #
+# is only one chunk                                                    #
+#----------------------------------------------------------------------#
+def scan_windows(seq1, seq2, length, tables, workers=None,
+                 chunk_size=CHUNK_SIZE, pool="process"):
+    if pool not in POOLS:
+        raise ValueError("pool must be one of %s" % ", ".join(POOLS))
+    if length < 1:
+        raise ValueError("kmer length must be at least 1")
+    if len(seq1) != len(seq2):
+        raise ValueError("aligned sequences must be the same length")
+    if chunk_size < 1:
+        raise ValueError("chunk_size must be at least 1")
+    if workers is None:
+        workers = os.cpu_count() or 1
+    count = max(len(seq1) - length + 1, 0)
+    # each chunk's windows and the kmer - 1 columns after them
+    tasks = [(start, seq1[start:start + chunk_size + length - 1],
+              seq2[start:start + chunk_size + length - 1], length)
+             for start in range(0, count, chunk_size)]
+    if (workers == 1 or len(tasks) <= 1 or
+            not sums_are_exact(tables, len(seq1))):
+        return scoring.Profile(seq1, seq2, tables).windows(length)
+
+    if pool == "thread":
+        with ThreadPoolExecutor(workers) as executor:
+            parts = list(executor.map(score_chunk, tasks,
+                                      [tables] * len(tasks)))
+    else:
+        with ProcessPoolExecutor(workers, initializer=init_worker,
+                                 initargs=(tables,)) as executor:
+            parts = list(executor.map(score_chunk, tasks))
+
+    # a column off the scale raises the serial code's error, from the
+    # first such column
+    unscored = [part for part in parts if isinstance(part, int)]
+    if unscored:
+        column = min(unscored)
+        tables.hydro_pair(seq1[column], seq2[column])
+        tables.struct_pair(seq1[column], seq2[column])
+        # the scalar code scored it after all, so go the serial way
+        return scoring.Profile(seq1, seq2, tables).windows(length)
+    return scoring.Windows(*[np.concatenate([part[c] for part in parts])
+                             for c in range(len(scoring.Windows._fields))])
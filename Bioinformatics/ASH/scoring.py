@@ -0,0 +1,366 @@
+#----------------------------------------------------------------------#
+#                   ASH vectorized scoring engine                      #
+#----------------------------------------------------------------------#
+# The scoring functions in ASH.py work on one pair of residues at a    #
+# time, so scoring every kmer of a protein re-scores each residue once #
+# per window it falls in. This module scores each aligned position     #
+# exactly once and gets every window score from prefix sums, which is  #
+# O(L) for a protein of length L no matter what the kmer size is.      #
+#                                                                      #
+# The per-position scores come from lookup tables indexed by the byte  #
+# value of the residues. The tables are filled in by calling the       #
+# scalar methods of the Analysis object on every pair of printable     #
+# characters, so the engine can never drift from the scale itself.     #
+# Every value on the ASH scale is a multiple of 0.25, which floats     #
+# represent exactly, so the prefix sums give the same numbers as       #
+# adding the window up residue by residue.                             #
+#                                                                      #
+# When the compiled kernel in ASH++/ has been built (see native.py),   #
+# the prefix sums and window scores come from it instead, from the     #
+# same tables and added up in the same order, so the results are       #
+# identical either way.                                                #
+#----------------------------------------------------------------------#
+
+
+from collections import namedtuple
+import numpy as np
+import native
+
+# residues are looked up by their byte value
+TABLE_SIZE = 256
+
+# the printable ascii range, anything else can't be on the scale
+PRINTABLE = range(32, 127)
+
+# the window scores for one kmer size, one array per Entry attribute
+Windows = namedtuple("Windows", ["pos", "hy_score", "str_score",
+                                 "hy_pct", "str_pct"])
+
+# tables are expensive-ish to build, so keep one set per scale
+_table_cache = {}
+
+# what to do with residues that aren't on the scale: raise a KeyError
+# as the scalar code does, score them as gaps, or score them as 0
+UNKNOWN = ["error", "gap", "ignore"]
+
+# IUPAC codes for residues that could be one of two
+AMBIGUOUS = { "B": "DN", "Z": "EQ", "J": "IL" }
+
+# the gap character of the alignment
+GAP = "-"
+
+
+#----------------------------------------------------------------------#
+#                              encode                                  #
+#----------------------------------------------------------------------#
+# Turns a sequence string into an array of its byte values. Anything   #
+# that isn't ascii can't be on the scale, so it is replaced by a "?",  #
+# which the scale doesn't know either                                  #
+#----------------------------------------------------------------------#
+def encode(seq):
+    return np.frombuffer(seq.encode("ascii", "replace"), dtype=np.uint8)
+
+
+#----------------------------------------------------------------------#
+#                           pair_table                                 #
+#----------------------------------------------------------------------#
+# Builds a 256x256 table of score_pair(residue1, residue2) for every   #
+# pair of printable characters. Pairs the scale can't score (the       #
+# scalar function raises a KeyError) are marked with NaN so that the   #
+# engine can raise the same error the scalar code would have           #
+#----------------------------------------------------------------------#
+def pair_table(score_pair):
+    table = np.full((TABLE_SIZE, TABLE_SIZE), np.nan)
+    for a in PRINTABLE:
+        for b in PRINTABLE:
+            try:
+                table[a, b] = score_pair(chr(a), chr(b))
+            except KeyError:
+                pass
+    return table
+
+
+#----------------------------------------------------------------------#
+#                          indicator_table                             #
+#----------------------------------------------------------------------#
+# Builds a 256 entry table that is 1 for every residue whose weight is #
+# positive on the given scale and 0 for everything else                #
+#----------------------------------------------------------------------#
+def indicator_table(weights):
+    table = np.zeros(TABLE_SIZE, dtype=np.int64)
+    for residue, weight in weights.items():
+        if weight > 0:
+            table[ord(residue)] = 1
+    return table
+
+
+#----------------------------------------------------------------------#
+#                           expansions                                 #
+#----------------------------------------------------------------------#
+# Takes the residues on a scale and returns, for every byte value that #
+# can stand for them, the byte values it stands for: each residue (and #
+# the gap) itself, lowercase letters their uppercase residue, and the  #
+# ambiguity codes each residue they could be                           #
+#----------------------------------------------------------------------#
+def expansions(residues):
+    known  = set(residues) | set([GAP])
+    expand = dict((ord(r), [ord(r)]) for r in known)
+    for code, options in AMBIGUOUS.items():
+        if code not in known and all(r in known for r in options):
+            expand[ord(code)] = [ord(r) for r in options]
+    for residue, codes in list(expand.items()):
+        lower = ord(chr(residue).lower())
+        if lower not in expand:
+            expand[lower] = codes
+    return expand
+
+
+#----------------------------------------------------------------------#
+#                            resolve                                   #
+#----------------------------------------------------------------------#
+# Fills in the NaN cells of a 256x256 pair table for residues that     #
+# aren't on the scale, following an unknown policy (see UNKNOWN). With #
+# "error" the table is left alone. Otherwise lowercase residues score  #
+# as uppercase ones, an ambiguity code scores as the mean over the     #
+# residues it could be, identical codes score 0, and anything else is  #
+# scored as a gap ("gap") or as 0 ("ignore")                           #
+#----------------------------------------------------------------------#
+def resolve(table, residues, unknown="error"):
+    if unknown not in UNKNOWN:
+        raise ValueError("unknown residues can be handled with %s, not %r"
+                         % (", ".join(UNKNOWN), unknown))
+    if unknown == "error":
+        return table
+    # row c spreads code c evenly over the codes it stands for; codes
+    # that stand for nothing are gaps, or rows of 0 that score nothing
+    expand = expansions(residues)
+    spread = np.zeros((TABLE_SIZE, TABLE_SIZE))
+    for code in range(TABLE_SIZE):
+        options = expand.get(code)
+        if options is None:
+            if unknown == "ignore":
+                continue
+            options = [ord(GAP)]
+        spread[code, options] = 1.0 / len(options)
+    # the mean over every pair the two codes could be
+    scored = np.where(np.isnan(table), 0.0, table)
+    mean   = spread.dot(scored).dot(spread.T)
+    result = np.where(np.isnan(table), mean, table)
+    # a code against itself is a match, as in the scalar code
+    np.fill_diagonal(result, np.where(np.isnan(np.diag(table)), 0.0,
+                                      np.diag(table)))
+    return result
+
+
+#----------------------------------------------------------------------#
+#                         resolve_indicator                            #
+#----------------------------------------------------------------------#
+# The same for a 256 entry indicator table: lowercase residues count   #
+# as their uppercase ones, an ambiguity code counts only if every      #
+# residue it could be does, and anything else doesn't count            #
+#----------------------------------------------------------------------#
+def resolve_indicator(table, residues, unknown="error"):
+    if unknown == "error":
+        return table
+    result = table.copy()
+    for code, options in expansions(residues).items():
+        result[code] = min(table[c] for c in options)
+    return result
+
+
+#----------------------------------------------------------------------#
+#                          percent_table                               #
+#----------------------------------------------------------------------#
+# Every percentage a window of the given length can have, indexed by   #
+# the count, rounded with python's round so it matches the scalar code #
+#----------------------------------------------------------------------#
+def percent_table(length):
+    return np.array([round(c / length, 2) for c in range(length + 1)])
+
+
+#----------------------------------------------------------------------#
+#                          ScoreTables(class)                          #
+#----------------------------------------------------------------------#
+# Holds the lookup tables for one scale. hydro and struct hold the     #
+# per-position mismatch of every residue pair, philic and complex mark #
+# the hydrophiles and structurally complex residues counted by the     #
+# percentages. The scalar functions are kept so errors can be raised   #
+# exactly the way the scalar code raises them. They are bound to a     #
+# copy of the scorer that holds only its weights (see scale_only), so  #
+# the cached tables never keep an Analysis, with its sequences and     #
+# results, alive. unknown is the policy for residues that aren't on    #
+# the scale (see resolve)                                              #
+#----------------------------------------------------------------------#
+class ScoreTables(object):
+
+    def __init__(self, scorer, unknown="error"):
+        scorer           = scale_only(scorer)
+        hydro_residues   = list(scorer.hydro_weight)
+        struct_residues  = list(scorer.struct_weight)
+        # per-position mismatch, a window of one residue is one position
+        self.hydro_pair  = scorer.hydro_mismatch
+        self.struct_pair = scorer.structural_mismatch
+        self.hydro       = resolve(pair_table(self.hydro_pair),
+                                   hydro_residues, unknown).ravel()
+        self.struct      = resolve(pair_table(self.struct_pair),
+                                   struct_residues, unknown).ravel()
+        # hydrophiles are positive on the hydro scale, complex residues
+        # are positive on the structural scale
+        self.philic      = resolve_indicator(
+            indicator_table(scorer.hydro_weight), hydro_residues, unknown)
+        self.complex     = resolve_indicator(
+            indicator_table(scorer.struct_weight), struct_residues, unknown)
+
+    # the scalar functions stay behind when the tables go to a worker
+    # process (see scan.py); workers only look the scores up
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["hydro_pair"]  = None
+        state["struct_pair"] = None
+        return state
+
+
+#----------------------------------------------------------------------#
+#                            scale_only                                #
+#----------------------------------------------------------------------#
+# A new, empty object of the scorer's class with nothing but copies of #
+# its hydro and struct weights, which is all its scoring methods use   #
+#----------------------------------------------------------------------#
+def scale_only(scorer):
+    kind  = type(scorer)
+    scale = kind.__new__(kind)
+    scale.hydro_weight  = dict(scorer.hydro_weight)
+    scale.struct_weight = dict(scorer.struct_weight)
+    return scale
+
+
+#----------------------------------------------------------------------#
+#                            get_tables                                #
+#----------------------------------------------------------------------#
+# Returns the ScoreTables for an Analysis object (or anything with the #
+# same scoring methods and weights), building them the first time a    #
+# given scale is seen. The unknown policy is the scorer's, if it has   #
+# one                                                                  #
+#----------------------------------------------------------------------#
+def get_tables(scorer):
+    unknown = getattr(scorer, "unknown", "error")
+    key = (type(scorer),
+           tuple(sorted(scorer.hydro_weight.items())),
+           tuple(sorted(scorer.struct_weight.items())),
+           unknown)
+    if key not in _table_cache:
+        _table_cache[key] = ScoreTables(scorer, unknown)
+    return _table_cache[key]
+
+
+#----------------------------------------------------------------------#
+#                          Profile(class)                              #
+#----------------------------------------------------------------------#
+# The per-residue profile of an aligned pair of sequences. Each        #
+# position is scored once and the scores are kept as prefix sums, so   #
+# the sum over any window is the difference of two entries. Windows    #
+# of any kmer size can be pulled from the same profile                 #
+#----------------------------------------------------------------------#
+class Profile(object):
+
+    def __init__(self, seq1, seq2, tables):
+        # the alignment pads both sequences to the same length
+        if len(seq1) != len(seq2):
+            raise ValueError("aligned sequences must be the same length")
+        self.seq1   = seq1
+        self.seq2   = seq2
+        self.tables = tables
+        # byte values of both sequences
+        codes1 = encode(seq1)
+        codes2 = encode(seq2)
+        if native.available:
+            (self.cum_hydro, self.cum_struct, self.cum_philic,
+             self.cum_complex, first) = native.profile(codes1, codes2, tables)
+            # only the first position the scale can't score is needed
+            self.unscored = np.array([first] if first >= 0 else [],
+                                     dtype=np.int64)
+            return
+        # index into the flattened 256x256 pair tables
+        pairs  = codes1.astype(np.intp) * TABLE_SIZE + codes2
+        # per-position scores
+        hydro  = tables.hydro[pairs]
+        struct = tables.struct[pairs]
+        # positions the scale can't score
+        self.unscored = np.flatnonzero(np.isnan(hydro) | np.isnan(struct))
+        # prefix sums, with a leading zero so window i is cum[i+k] - cum[i]
+        self.cum_hydro   = self.prefix_sum(hydro)
+        self.cum_struct  = self.prefix_sum(struct)
+        self.cum_philic  = self.prefix_sum(tables.philic[codes1])
+        self.cum_complex = self.prefix_sum(tables.complex[codes1])
+
+    # number of aligned positions
+    def __len__(self):
+        return len(self.seq1)
+
+    # cumulative sum with a zero in front
+    def prefix_sum(self, values):
+        cum = np.zeros(len(values) + 1, dtype=values.dtype)
+        np.cumsum(values, out=cum[1:])
+        return cum
+
+
+#----------------------------------------------------------------------#
+#                          check_scored                                #
+#----------------------------------------------------------------------#
+# The scalar code raises a KeyError on the first residue that isn't on #
+# the scale. Any window covers every position, so if there is at least #
+# one window re-run the scalar functions on the first bad pair to      #
+# raise the very same error                                            #
+#----------------------------------------------------------------------#
+    def check_scored(self):
+        if len(self.unscored) == 0:
+            return
+        i = self.unscored[0]
+        self.tables.hydro_pair(self.seq1[i], self.seq2[i])
+        self.tables.struct_pair(self.seq1[i], self.seq2[i])
+
+
+#----------------------------------------------------------------------#
+#                             windows                                  #
+#----------------------------------------------------------------------#
+# Takes a kmer size and returns a Windows tuple of arrays with the     #
+# scores of every window of that size. The percentages are rounded to  #
+# two places with python's round, through a table of every possible    #
+# count, so they match the scalar percentages exactly. start and stop  #
+# limit it to the windows at those positions, so a long sequence can   #
+# be scored a chunk at a time                                          #
+#----------------------------------------------------------------------#
+    def windows(self, length, start=0, stop=None):
+        if length < 1:
+            raise ValueError("kmer length must be at least 1")
+        # number of windows that fit in the sequence
+        count = self.window_count(length)
+        if count > 0:
+            self.check_scored()
+        if stop is None or stop > count:
+            stop = count
+        start = min(max(start, 0), stop)
+        # window sums are differences of the prefix sums
+        if native.available:
+            hydro, struct, philic, complex = native.windows(self, length,
+                                                            start, stop)
+        else:
+            hydro   = self.window_sum(self.cum_hydro, length, start, stop)
+            struct  = self.window_sum(self.cum_struct, length, start, stop)
+            philic  = self.window_sum(self.cum_philic, length, start, stop)
+            complex = self.window_sum(self.cum_complex, length, start, stop)
+        # every percentage a window of this length can have
+        pct = percent_table(length)
+        return Windows(pos       = np.arange(start, stop),
+                       hy_score  = hydro,
+                       str_score = struct,
+                       hy_pct    = pct[philic],
+                       str_pct   = pct[complex])
+
+    # number of windows of a given length that fit in the sequence
+    def window_count(self, length):
+        return max(len(self) - length + 1, 0)
+
+    # sums of the windows of a given length at positions start to stop
+    def window_sum(self, cum, length, start, stop):
+        return cum[start + length:stop + length] - cum[start:stop]
@@ -0,0 +1,178 @@
+#----------------------------------------------------------------------#
+#                  non-overlapping epitope selection                   #
+#----------------------------------------------------------------------#
+# Picks the set of kmers with the highest total score such that no two #
+# of them overlap (or, with a gap, come closer than gap residues).     #
+# This is weighted interval scheduling: with the windows sorted by     #
+# position, the best total using the first i windows is either the     #
+# best without window i, or window i plus the best of the windows that #
+# end far enough before it starts. Finding that last compatible window #
+# is a binary search, so the whole selection is O(L log L).            #
+#                                                                      #
+# The chosen windows are kept in an interval index so you can ask      #
+# which of them cover a residue of the first protein, by its position  #
+# in the original ungapped sequence.                                   #
+#----------------------------------------------------------------------#
+
+
+import numpy as np
+
+
+#----------------------------------------------------------------------#
+#                           get_weights                                #
+#----------------------------------------------------------------------#
+# The score of each window: a column of the Results by name, or a      #
+# function from the Results to an array of scores                      #
+#----------------------------------------------------------------------#
+def get_weights(results, score):
+    if callable(score):
+        return np.asarray(score(results), dtype=np.float64)
+    if score not in results.columns:
+        raise ValueError("can't score windows by %r" % score)
+    return getattr(results, score).astype(np.float64)
+
+
+#----------------------------------------------------------------------#
+#                          best_schedule                               #
+#----------------------------------------------------------------------#
+# Takes the sorted start positions of windows that are all length      #
+# long, their weights, and the smallest number of residues allowed     #
+# between two chosen windows. Returns the indices of the compatible    #
+# windows with the largest total weight, in position order. Windows    #
+# with a weight of zero or less are never worth choosing               #
+#----------------------------------------------------------------------#
+def best_schedule(starts, weights, length, gap=0):
+    count = len(starts)
+    # the last window that ends, plus the gap, at or before each start
+    previous = np.searchsorted(starts, starts - length - gap,
+                               side="right") - 1
+    # best[i + 1] is the best total using only the first i + 1 windows
+    best = np.zeros(count + 1)
+    weights_list  = weights.tolist()
+    previous_list = previous.tolist()
+    for i in range(count):
+        take = weights_list[i] + best[previous_list[i] + 1]
+        best[i + 1] = take if take > best[i] else best[i]
+    # walk back through the table to find the windows that were taken
+    chosen = []
+    i = count - 1
+    while i >= 0:
+        if best[i + 1] != best[i]:
+            chosen.append(i)
+            i = previous_list[i]
+        else:
+            i -= 1
+    return np.array(chosen[::-1], dtype=np.int64)
+
+
+#----------------------------------------------------------------------#
+#                       IntervalIndex(class)                           #
+#----------------------------------------------------------------------#
+# An index over windows that all have the same length. Since the       #
+# windows are sorted by start, the ones covering a column are exactly  #
+# those starting in (column - length, column], found by two binary     #
+# searches                                                             #
+#----------------------------------------------------------------------#
+class IntervalIndex(object):
+
+    def __init__(self, starts, length):
+        self.starts = np.asarray(starts, dtype=np.int64)
+        self.length = length
+
+    # indices of the windows that cover an aligned column
+    def covering(self, column):
+        first = np.searchsorted(self.starts, column - self.length + 1,
+                                side="left")
+        last  = np.searchsorted(self.starts, column, side="right")
+        return np.arange(first, last)
+
+
+#----------------------------------------------------------------------#
+#                         Selection(class)                             #
+#----------------------------------------------------------------------#
+# The chosen windows (a Results, in position order) and the total      #
+# score, plus what's needed to go between columns of the alignment     #
+# and residues of the original first sequence. offset is where the     #
+# aligned part starts in the original (Analysis.offset); without it    #
+# the first place the aligned residues turn up is used                 #
+#----------------------------------------------------------------------#
+class Selection(object):
+
+    def __init__(self, windows, total, aligned_seq, original_seq,
+                 offset=None):
+        self.windows = windows
+        self.total   = total
+        self.index   = IntervalIndex(windows.pos, windows.length)
+        # column of each residue of the aligned part of the first protein
+        codes        = np.frombuffer(aligned_seq.encode("ascii", "replace"),
+                                     dtype=np.uint8)
+        self.columns = np.flatnonzero(codes != ord("-"))
+        # where the (local) alignment starts in the original sequence
+        if offset is None:
+            offset = max(original_seq.find(aligned_seq.replace("-", "")), 0)
+        self.offset  = offset
+
+    def __len__(self):
+        return len(self.windows)
+
+    def __iter__(self):
+        return iter(self.windows)
+
+
+#----------------------------------------------------------------------#
+#                             column                                   #
+#----------------------------------------------------------------------#
+# The aligned column of a residue of the original first sequence, or   #
+# None if the residue is outside the aligned region                    #
+#----------------------------------------------------------------------#
+    def column(self, residue):
+        aligned = residue - self.offset
+        if aligned < 0 or aligned >= len(self.columns):
+            return None
+        return int(self.columns[aligned])
+
+
+#----------------------------------------------------------------------#
+#                            covering                                  #
+#----------------------------------------------------------------------#
+# Returns the chosen windows (a Results) that cover a residue, given   #
+# by its 0-based position in the original, ungapped first sequence     #
+#----------------------------------------------------------------------#
+    def covering(self, residue):
+        column = self.column(residue)
+        if column is None:
+            return self.windows[0:0]
+        return self.windows[self.index.covering(column)]
+
+
+#----------------------------------------------------------------------#
+#                            residues                                  #
+#----------------------------------------------------------------------#
+# The (start, end) residues of the original first sequence that a      #
+# chosen window spans, end excluded, skipping gap columns              #
+#----------------------------------------------------------------------#
+    def residues(self, i):
+        start = int(self.windows.pos[i])
+        first = np.searchsorted(self.columns, start, side="left")
+        last  = np.searchsorted(self.columns, start + self.windows.length,
+                                side="left")
+        return (int(first) + self.offset, int(last) + self.offset)
+
+
+#----------------------------------------------------------------------#
+#                          select_windows                              #
+#----------------------------------------------------------------------#
+# Chooses the best set of non-overlapping windows from a Results. See  #
+# Analysis.select_epitopes for the arguments, and Selection for offset #
+#----------------------------------------------------------------------#
+def select_windows(results, original_seq, score="hy_score", gap=0,
+                   where=None, offset=None):
+    if gap < 0:
+        raise ValueError("the gap between windows can't be negative")
+    # only the windows that pass the filter are candidates
+    if where is not None:
+        results = results[results.where(where)]
+    weights = get_weights(results, score)
+    chosen  = best_schedule(results.pos, weights, results.length, gap)
+    return Selection(results[chosen], float(weights[chosen].sum()),
+                     results.seq1, original_seq, offset)
@@ -0,0 +1,281 @@
+#----------------------------------------------------------------------#
+#                      ASH binary sequence store                       #
+#----------------------------------------------------------------------#
+# Reading a proteome means parsing its text FASTA and building a       #
+# string for every record, and every process that reads it does this   #
+# again and keeps its own copy. A store is the same records converted  #
+# once into a binary file: the residues one byte each (their ASCII     #
+# codes, which are what scoring.py's tables are indexed by) in one     #
+# buffer, an array of where each record starts, and the headers.       #
+# SequenceStore opens it through mmap, so a record is a zero-copy      #
+# NumPy array or memoryview of the mapped file, and every process      #
+# that opens the same store shares one copy of it in the page cache.   #
+#                                                                      #
+# The file is laid out as:                                             #
+#   a 48-byte header: the magic number, the number of records, the     #
+#       size of the residue buffer, and the file offsets and size of   #
+#       the offset array and the header table                          #
+#   the residues, each record followed by a "*" separator (the one     #
+#       distinct.KmerIndex puts between records, so it can index the   #
+#       buffer as it is)                                               #
+#   the offset array: one int64 start per record, and the end          #
+#   the headers, utf-8, one per line                                   #
+#----------------------------------------------------------------------#
+
+
+import mmap
+import os
+import struct
+import numpy as np
+import fastaio
+
+# the first bytes of every store
+MAGIC = b"ASHSEQ01"
+
+# magic, records, residue bytes, offsets at, headers at, header bytes
+HEADER = struct.Struct("<8sQQQQQ")
+
+# after every record in the residue buffer
+SEPARATOR = b"*"
+
+# what a store made by open_store is called, next to its FASTA
+EXTENSION = ".ash"
+
+
+#----------------------------------------------------------------------#
+#                             is_store                                 #
+#----------------------------------------------------------------------#
+# Checks the magic number at the start of the file                     #
+#----------------------------------------------------------------------#
+def is_store(filename):
+    try:
+        with open(filename, "rb") as handle:
+            return handle.read(len(MAGIC)) == MAGIC
+    except OSError:
+        return False
+
+
+#----------------------------------------------------------------------#
+#                           build_store                                #
+#----------------------------------------------------------------------#
+# Converts every record of a FASTA file (gzipped or not) into a store  #
+# at path, file.fasta.ash by default, and returns the path. The        #
+# records are streamed through, so only the headers and offsets are    #
+# held in memory. The store is written to a temporary file and moved   #
+# into place, so a reader never sees half of one                       #
+#----------------------------------------------------------------------#
+def build_store(fasta, path=None):
+    if path is None:
+        path = fasta + EXTENSION
+    temp    = "%s.%d.tmp" % (path, os.getpid())
+    headers = []
+    offsets = [0]
+    try:
+        with open(temp, "wb") as out:
+            out.write(b"\0" * HEADER.size)
+            for record in fastaio.read_fasta(fasta):
+                residues = record.sequence.encode("ascii", "replace")
+                out.write(residues + SEPARATOR)
+                headers.append(record.header)
+                offsets.append(offsets[-1] + len(residues) + 1)
+            # pad so the offsets can be mapped as int64
+            out.write(b"\0" * (-out.tell() % 8))
+            offsets_at = out.tell()
+            out.write(np.array(offsets, dtype="<i8").tobytes())
+            headers_at = out.tell()
+            table      = "\n".join(headers).encode("utf-8")
+            out.write(table)
+            out.seek(0)
+            out.write(HEADER.pack(MAGIC, len(headers), offsets[-1],
+                                  offsets_at, headers_at, len(table)))
+        os.replace(temp, path)
+    finally:
+        if os.path.exists(temp):
+            os.remove(temp)
+    return path
+
+
+#----------------------------------------------------------------------#
+#                            open_store                                #
+#----------------------------------------------------------------------#
+# Returns a SequenceStore for a FASTA file, building file.fasta.ash    #
+# the first time and again whenever the FASTA is newer than it. A      #
+# store itself can be passed too                                       #
+#----------------------------------------------------------------------#
+def open_store(filename):
+    if is_store(filename):
+        return SequenceStore(filename)
+    path = filename + EXTENSION
+    if (not os.path.exists(path) or
+            os.path.getmtime(path) < os.path.getmtime(filename)):
+        build_store(filename, path)
+    return SequenceStore(path)
+
+
+#----------------------------------------------------------------------#
+#                       SequenceStore(class)                           #
+#----------------------------------------------------------------------#
+# A store opened through mmap. Records are looked up by their position #
+# in the file or by id (the first word of the header; the first of any #
+# duplicates wins). codes is the whole residue buffer as a uint8 array #
+# and offsets where each record starts in it, both views of the map.   #
+# Pickling a store sends only its path, and the copy maps the file     #
+# again, so worker processes share the pages rather than copying them  #
+#----------------------------------------------------------------------#
+class SequenceStore(object):
+
+    def __init__(self, path):
+        self.path = path
+        self.open()
+
+    # with-statement support, so the map gets closed
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return len(self.headers)
+
+    def __contains__(self, name):
+        return name in self.ids
+
+    # only the path goes to another process
+    def __getstate__(self):
+        return {"path": self.path}
+
+    def __setstate__(self, state):
+        self.path = state["path"]
+        self.open()
+
+
+#----------------------------------------------------------------------#
+#                               open                                   #
+#----------------------------------------------------------------------#
+# Maps the file and checks its header. Only the headers are read into  #
+# memory; the residues and offsets stay in the map                     #
+#----------------------------------------------------------------------#
+    def open(self):
+        with open(self.path, "rb") as handle:
+            if handle.seek(0, 2) < HEADER.size:
+                raise ValueError("%s is not a sequence store" % self.path)
+            self.map = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, count, size, offsets_at,
+         headers_at, table_size) = HEADER.unpack_from(self.map)
+        if magic != MAGIC:
+            self.map.close()
+            raise ValueError("%s is not a sequence store" % self.path)
+        self.codes   = np.frombuffer(self.map, dtype=np.uint8, count=size,
+                                     offset=HEADER.size)
+        self.offsets = np.frombuffer(self.map, dtype="<i8", count=count + 1,
+                                     offset=offsets_at)
+        table        = self.map[headers_at:headers_at + table_size]
+        self.headers = table.decode("utf-8").split("\n") if count else []
+        self.ids     = {}
+        for i, header in enumerate(self.headers):
+            words = header.split()
+            name  = words[0] if words else ""
+            if name not in self.ids:
+                self.ids[name] = i
+
+
+#----------------------------------------------------------------------#
+#                               find                                   #
+#----------------------------------------------------------------------#
+# The position of a record given its position or its id                #
+#----------------------------------------------------------------------#
+    def find(self, record):
+        if isinstance(record, str):
+            if record not in self.ids:
+                raise KeyError("no record %s in %s" % (record, self.path))
+            return self.ids[record]
+        if not -len(self) <= record < len(self):
+            raise IndexError("no record %d in %s" % (record, self.path))
+        return record % len(self)
+
+    # where a record's residues start and end in codes
+    def bounds(self, record):
+        i = self.find(record)
+        return int(self.offsets[i]), int(self.offsets[i + 1]) - 1
+
+    # the number of residues in a record
+    def length(self, record):
+        start, end = self.bounds(record)
+        return end - start
+
+    def header(self, record):
+        return self.headers[self.find(record)]
+
+
+#----------------------------------------------------------------------#
+#                           array, view                                #
+#----------------------------------------------------------------------#
+# A record's residues as a uint8 NumPy array or as a memoryview of     #
+# bytes. Neither copies anything: both read straight from the map      #
+#----------------------------------------------------------------------#
+    def array(self, record):
+        start, end = self.bounds(record)
+        return self.codes[start:end]
+
+    def view(self, record):
+        start, end = self.bounds(record)
+        return memoryview(self.map)[HEADER.size + start:HEADER.size + end]
+
+
+#----------------------------------------------------------------------#
+#                             sequence                                 #
+#----------------------------------------------------------------------#
+# A record's residues start to end (all of them by default) as a       #
+# string, for the code that needs one, such as the aligners            #
+#----------------------------------------------------------------------#
+    def sequence(self, record, start=0, end=None):
+        return self.array(record)[start:end].tobytes().decode("ascii",
+                                                             "replace")
+
+
+#----------------------------------------------------------------------#
+#                              records                                 #
+#----------------------------------------------------------------------#
+# Generator over the records as fastaio Records, so a store can go     #
+# wherever read_fasta does. The offset of each one is its position in  #
+# the store                                                            #
+#----------------------------------------------------------------------#
+    def records(self):
+        for i, header in enumerate(self.headers):
+            yield fastaio.Record(header, self.sequence(i), i)
+
+
+#----------------------------------------------------------------------#
+#                              close                                   #
+#----------------------------------------------------------------------#
+# Lets go of the map. Arrays and views handed out keep it open until   #
+# they are gone too                                                    #
+#----------------------------------------------------------------------#
+    def close(self):
+        if self.map is None:
+            return
+        self.codes   = None
+        self.offsets = None
+        try:
+            self.map.close()
+        except BufferError:
+            pass
+        self.map = None
+
+
+#----------------------------------------------------------------------#
+#                               main                                   #
+#----------------------------------------------------------------------#
+# python3 seqstore.py proteome.fasta [proteome.ash] converts a FASTA   #
+# file to a store                                                      #
+#----------------------------------------------------------------------#
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="convert a FASTA file to "
+                                     "a binary sequence store")
+    parser.add_argument("fasta")
+    parser.add_argument("store", nargs="?", default=None,
+                        help="the store to write (FASTA" + EXTENSION + ")")
+    args = parser.parse_args()
+    print(build_store(args.fasta, args.store))
@@ -0,0 +1,459 @@
+#----------------------------------------------------------------------#
+#                          ASH job server                              #
+#----------------------------------------------------------------------#
+# A long-running local service for ASH jobs, so that a notebook        #
+# sending many small jobs doesn't pay for starting Python, importing   #
+# scikit-bio and reading the same FASTA files every time. The server   #
+# listens on a Unix socket (or a local TCP port) and keeps warm:       #
+#                                                                      #
+#   - a pool of worker processes that have imported ASH and the        #
+#     aligner the server was started with (see aligner.py)             #
+#   - the alignment cache, if one is given (see cache.py)              #
+#   - the sequences of the FASTA files it has read, until they change  #
+#                                                                      #
+# Alignment and scoring run in the worker pool, never in the event     #
+# loop. Requests that arrive within batch_delay seconds of each other  #
+# and share a query sequence, kmer size and unknown policy are sent to #
+# a worker together, which builds the query's alignment profile once   #
+# for all of them, as batch.py does for a panel of targets.            #
+#                                                                      #
+# The protocol is one JSON object per line. A request gives the query  #
+# and the target either as sequences or as FASTA files (file.fasta or  #
+# file.fasta:RECORD_ID), and the kmer size:                            #
+#                                                                      #
+#   {"query": "MKV...", "fasta2": "panel.fasta:B2", "kmer": 12}        #
+#                                                                      #
+# and may also give "unknown" (see scoring.resolve). The reply is a    #
+# line with the aligned pair, then the results a chunk of rows at a    #
+# time, one column per key, so a large scan is never held in one       #
+# message, then a last line that ends it:                              #
+#                                                                      #
+#   {"status": "ok", "seq1": ..., "seq2": ..., "length": 12, ...}      #
+#   {"rows": {"pos": [...], "hy_score": [...], ...}}                   #
+#   {"done": true}                                                     #
+#                                                                      #
+# or {"status": "error", "error": ...} if the job failed. A connection #
+# can send any number of requests, one after the other. Client is a    #
+# small blocking client that turns the replies back into Results.      #
+#----------------------------------------------------------------------#
+
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import stat
+import sys
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import numpy as np
+import aligner
+import batch
+import cache
+import fastaio
+import scoring
+from models.Results import Results
+
+# where the server listens unless told otherwise
+DEFAULT_SOCKET = os.path.join(cache.DEFAULT_DIRECTORY, "ash.sock")
+
+# how long a batch waits for more requests with the same query
+BATCH_DELAY = 0.01
+
+# the most targets sent to a worker in one batch
+MAX_BATCH = 32
+
+# rows sent in one message
+CHUNK_ROWS = 4096
+
+# the columns sent for each chunk of rows
+COLUMNS = Results.columns
+
+# asyncio's default line limit is too small for long sequences
+LINE_LIMIT = 1 << 26
+
+
+#----------------------------------------------------------------------#
+#                             warm                                     #
+#----------------------------------------------------------------------#
+# Run once in each worker when the server starts, so the workers are   #
+# up, with ASH and the aligner backend (scikit-bio for ssw) imported,  #
+# before the first job comes in. Returns the worker's pid and backend  #
+#----------------------------------------------------------------------#
+def warm(align_backend=None):
+    return os.getpid(), aligner.load_backend(align_backend)
+
+
+#----------------------------------------------------------------------#
+#                           score_batch                                #
+#----------------------------------------------------------------------#
+# Runs in a worker. Aligns and scores one query against a list of      #
+# targets with the aligner align_backend, sharing the query's          #
+# alignment profile between them. Returns one (Hit, None) or (None,    #
+# error message) per target, so one bad target doesn't fail the rest   #
+# of the batch                                                         #
+#----------------------------------------------------------------------#
+def score_batch(query_seq, kmer, unknown, alignment_cache, targets,
+                align_backend=None):
+    batch.init_worker(query_seq, kmer, alignment_cache, unknown,
+                      align_backend)
+    outcomes = []
+    for index, target in enumerate(targets):
+        try:
+            outcomes.append((batch.score_targets([(index, target)])[0],
+                             None))
+        except Exception as error:
+            outcomes.append((None, "%s: %s" % (type(error).__name__, error)))
+    return outcomes
+
+
+#----------------------------------------------------------------------#
+#                           JobServer(class)                           #
+#----------------------------------------------------------------------#
+# Takes the number of worker processes (all cores by default, 1 runs   #
+# the jobs in a thread of this process), an AlignmentCache or None,    #
+# the batching and chunking settings above, and the aligner backend    #
+# every job uses (aligner.get_backend's default if None). start opens  #
+# the socket, and the server then runs until close                     #
+#----------------------------------------------------------------------#
+class JobServer(object):
+
+    def __init__(self, processes=None, alignment_cache=None,
+                 batch_delay=BATCH_DELAY, max_batch=MAX_BATCH,
+                 chunk_rows=CHUNK_ROWS, align_backend=None):
+        if processes is None:
+            processes = os.cpu_count() or 1
+        self.processes       = processes
+        self.alignment_cache = alignment_cache
+        self.align_backend   = aligner.get_backend(align_backend)
+        self.batch_delay     = batch_delay
+        self.max_batch       = max_batch
+        self.chunk_rows      = chunk_rows
+        self.pool            = None
+        self.server          = None
+        # requests waiting to be sent, by (query, kmer, unknown)
+        self.pending         = {}
+        # sequences read from files, by spec, with the file's mtime
+        self.sequences       = {}
+        # what the server has done so far
+        self.stats           = {"requests": 0, "batches": 0, "errors": 0}
+
+
+#----------------------------------------------------------------------#
+#                           start / close                              #
+#----------------------------------------------------------------------#
+# start warms up the workers (with one, this process) and listens on   #
+# the Unix socket at path, or on host:port if path is None (port 0     #
+# picks a free port, see address). A socket left at path by an earlier #
+# server is replaced, but anything else there is left alone and the    #
+# server refuses to start. close stops listening and shuts the workers #
+# down                                                                 #
+#----------------------------------------------------------------------#
+    async def start(self, path=None, host="127.0.0.1", port=0):
+        if path is not None and os.path.lexists(path):
+            if not stat.S_ISSOCK(os.lstat(path).st_mode):
+                raise FileExistsError("%s exists and isn't a socket" % path)
+            os.unlink(path)
+        loop = asyncio.get_running_loop()
+        if self.processes == 1:
+            self.pool = ThreadPoolExecutor(1)
+        else:
+            self.pool = ProcessPoolExecutor(self.processes)
+        await asyncio.gather(*[loop.run_in_executor(self.pool, warm,
+                                                    self.align_backend)
+                               for i in range(self.processes)])
+        if path is not None:
+            self.server = await asyncio.start_unix_server(
+                self.handle, path, limit=LINE_LIMIT)
+        else:
+            self.server = await asyncio.start_server(
+                self.handle, host, port, limit=LINE_LIMIT)
+        return self
+
+    def address(self):
+        return self.server.sockets[0].getsockname()
+
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+            self.server = None
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+
+    async def serve_forever(self):
+        await self.server.serve_forever()
+
+
+#----------------------------------------------------------------------#
+#                           read_spec                                  #
+#----------------------------------------------------------------------#
+# The sequence of a FASTA spec (file.fasta or file.fasta:RECORD_ID).   #
+# Each spec is read once, in a thread, and again only if the file's    #
+# modification time changes                                            #
+#----------------------------------------------------------------------#
+    async def read_spec(self, spec):
+        mtime = os.stat(fastaio.split_spec(spec)[0]).st_mtime_ns
+        if spec in self.sequences and self.sequences[spec][0] == mtime:
+            return self.sequences[spec][1]
+        loop     = asyncio.get_running_loop()
+        sequence = await loop.run_in_executor(None, fastaio.read_sequence,
+                                              spec)
+        self.sequences[spec] = (mtime, sequence)
+        return sequence
+
+
+#----------------------------------------------------------------------#
+#                             submit                                   #
+#----------------------------------------------------------------------#
+# Queues one query/target pair and returns the batch.Hit for it once   #
+# it has been scored. The first request of a batch sends it after      #
+# batch_delay, or as soon as max_batch requests have joined it         #
+#----------------------------------------------------------------------#
+    async def submit(self, query_seq, target_seq, kmer, unknown="error",
+                     header=""):
+        if unknown not in scoring.UNKNOWN:
+            raise ValueError("unknown must be one of %s"
+                             % ", ".join(scoring.UNKNOWN))
+        if not isinstance(kmer, int) or kmer < 1:
+            raise ValueError("kmer must be a positive integer")
+        loop   = asyncio.get_running_loop()
+        future = loop.create_future()
+        key    = (query_seq, kmer, unknown)
+        self.stats["requests"] += 1
+        if key not in self.pending:
+            self.pending[key] = []
+            loop.call_later(self.batch_delay, self.flush, key)
+        self.pending[key].append(((header, target_seq), future))
+        if len(self.pending[key]) >= self.max_batch:
+            self.flush(key)
+        return await future
+
+
+#----------------------------------------------------------------------#
+#                              flush                                   #
+#----------------------------------------------------------------------#
+# Sends the requests waiting under key to a worker as one batch, and   #
+# hands each request its own result when the batch comes back          #
+#----------------------------------------------------------------------#
+    def flush(self, key):
+        waiting = self.pending.pop(key, None)
+        if not waiting:
+            return
+        self.stats["batches"] += 1
+        query_seq, kmer, unknown = key
+        loop = asyncio.get_running_loop()
+        job  = loop.run_in_executor(self.pool, score_batch, query_seq, kmer,
+                                    unknown, self.alignment_cache,
+                                    [target for target, future in waiting],
+                                    self.align_backend)
+
+        def finished(job):
+            error = job.exception()
+            if error is not None:
+                # the worker itself failed, so every request did
+                message  = "%s: %s" % (type(error).__name__, error)
+                outcomes = [(None, message)] * len(waiting)
+            else:
+                outcomes = job.result()
+            for (target, future), (hit, error) in zip(waiting, outcomes):
+                if future.cancelled():
+                    continue
+                if error is not None:
+                    future.set_exception(RuntimeError(error))
+                else:
+                    future.set_result(hit)
+
+        job.add_done_callback(finished)
+
+
+#----------------------------------------------------------------------#
+#                             handle                                   #
+#----------------------------------------------------------------------#
+# Serves one connection: reads requests a line at a time and streams   #
+# the reply to each back before reading the next                       #
+#----------------------------------------------------------------------#
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                await self.answer(line, writer)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    # runs one request and writes its reply
+    async def answer(self, line, writer):
+        try:
+            request = json.loads(line)
+            query   = await self.get_sequence(request, "query", "fasta1")
+            target  = await self.get_sequence(request, "target", "fasta2")
+            hit     = await self.submit(query, target, request.get("kmer"),
+                                        request.get("unknown", "error"),
+                                        request.get("header", ""))
+        except Exception as error:
+            self.stats["errors"] += 1
+            message = str(error)
+            if not isinstance(error, RuntimeError):
+                message = "%s: %s" % (type(error).__name__, error)
+            await self.send(writer, {"status": "error", "error": message})
+            return
+        results = hit.entries
+        await self.send(writer, {"status":  "ok",
+                                 "seq1":    results.seq1,
+                                 "seq2":    results.seq2,
+                                 "length":  results.length,
+                                 "windows": len(results)})
+        # at least one chunk, if only an empty one
+        for start in range(0, max(len(results), 1), self.chunk_rows):
+            rows = results[start:start + self.chunk_rows]
+            await self.send(writer, {"rows": dict(
+                (name, getattr(rows, name).tolist()) for name in COLUMNS)})
+        await self.send(writer, {"done": True})
+
+    # a sequence given inline or as a FASTA spec
+    async def get_sequence(self, request, inline, spec):
+        if inline in request:
+            return request[inline]
+        if spec in request:
+            return await self.read_spec(request[spec])
+        raise ValueError("the request needs %r or %r" % (inline, spec))
+
+    # writes one message and waits for the socket to take it
+    async def send(self, writer, message):
+        writer.write(json.dumps(message).encode("utf-8") + b"\n")
+        await writer.drain()
+
+
+#----------------------------------------------------------------------#
+#                           Client(class)                              #
+#----------------------------------------------------------------------#
+# A blocking client for the server, usable from a notebook or a test.  #
+# Connects to the Unix socket at path, or to host:port                 #
+#----------------------------------------------------------------------#
+class Client(object):
+
+    def __init__(self, path=DEFAULT_SOCKET, host=None, port=None):
+        if host is not None:
+            self.socket = socket.create_connection((host, port))
+        else:
+            self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.socket.connect(path)
+        self.file   = self.socket.makefile("rwb")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.file.close()
+        self.socket.close()
+
+    # one reply line
+    def receive(self):
+        line = self.file.readline()
+        if not line:
+            raise ConnectionError("the ASH server closed the connection")
+        return json.loads(line)
+
+
+#----------------------------------------------------------------------#
+#                          stream / analyze                            #
+#----------------------------------------------------------------------#
+# stream sends a job and yields its Results a chunk at a time as they  #
+# arrive; analyze returns them all as one Results. Give query and      #
+# target as sequences, or fasta1 and fasta2 as FASTA specs the server  #
+# can read. A failed job raises a RuntimeError with the server's       #
+# message                                                              #
+#----------------------------------------------------------------------#
+    def stream(self, kmer, query=None, target=None, fasta1=None,
+               fasta2=None, unknown="error"):
+        request = {"kmer": kmer, "unknown": unknown}
+        for name, value in (("query", query), ("target", target),
+                            ("fasta1", fasta1), ("fasta2", fasta2)):
+            if value is not None:
+                request[name] = value
+        self.file.write(json.dumps(request).encode("utf-8") + b"\n")
+        self.file.flush()
+        reply = self.receive()
+        if reply["status"] != "ok":
+            raise RuntimeError(reply["error"])
+        while True:
+            message = self.receive()
+            if message.get("done"):
+                return
+            rows = message["rows"]
+            yield Results(reply["seq1"], reply["seq2"], reply["length"],
+                          *[rows[name] for name in COLUMNS])
+
+    def analyze(self, kmer, **job):
+        chunks = list(self.stream(kmer, **job))
+        first  = chunks[0]
+        return Results(first.seq1, first.seq2, first.length,
+                       *[np.concatenate([getattr(chunk, name)
+                                         for chunk in chunks])
+                         for name in COLUMNS])
+
+
+#----------------------------------------------------------------------#
+#                              main                                    #
+#----------------------------------------------------------------------#
+# Runs the server until it is interrupted                              #
+#----------------------------------------------------------------------#
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve ASH jobs")
+    parser.add_argument("-s", "--socket", default=DEFAULT_SOCKET)
+    parser.add_argument("--port", type=int,
+                        help="listen on this local TCP port instead")
+    parser.add_argument("-p", "--processes", type=int, default=None)
+    parser.add_argument("-c", "--cache", nargs="?", default=None,
+                        const=cache.DEFAULT_DIRECTORY)
+    parser.add_argument("--batch-delay", type=float, default=BATCH_DELAY)
+    parser.add_argument("--max-batch", type=int, default=MAX_BATCH)
+    parser.add_argument("--aligner", default=None,
+                        choices=sorted(aligner.BACKENDS))
+    args = parser.parse_args(argv)
+
+    if args.processes is not None and args.processes < 1:
+        parser.error("--processes must be at least 1")
+    alignment_cache = None
+    if args.cache is not None:
+        alignment_cache = cache.AlignmentCache(args.cache)
+
+    async def serve():
+        server = JobServer(args.processes, alignment_cache,
+                           args.batch_delay, args.max_batch,
+                           align_backend=args.aligner)
+        if args.port is not None:
+            await server.start(port=args.port)
+        else:
+            os.makedirs(os.path.dirname(os.path.abspath(args.socket)),
+                        exist_ok=True)
+            await server.start(args.socket)
+        sys.stderr.write("ASH server listening on %s\n"
+                         % (server.address(),))
+        try:
+            await server.serve_forever()
+        finally:
+            await server.close()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+    except FileExistsError as e:
+        sys.stderr.write("%s\n" % e)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -113,3 +113,127 @@ def test_struct_score_hit_match():
 # does a similar residue get less weight?
 def test_struct_score_non_match():
     assert(test_obj.structural_mismatch("F", "H") == 0.5)
+
+
+
+""" seq_to_seq """
+
+# every window should match the scalar functions exactly
+def test_seq_to_seq_matches_scalar_scoring():
+    for e in test_obj.get_entries():
+        assert(e.seq == test_obj.sequence1[e.pos:e.pos+15])
+        assert(e.analog == test_obj.sequence2[e.pos:e.pos+15])
+        assert(e.hy_score == test_obj.hydro_mismatch(e.seq, e.analog))
+        assert(e.str_score == test_obj.structural_mismatch(e.seq, e.analog))
+        assert(e.hy_pct == test_obj.hydro_percent(e.seq))
+        assert(e.str_pct == test_obj.struct_percent(e.seq))
+
+# one entry per window that fits
+def test_seq_to_seq_window_count():
+    assert(len(test_obj.seq_to_seq("PEPTIDE", "PEPTYDE", 3)) == 5)
+    assert(len(test_obj.seq_to_seq("PEPTIDE", "PEPTYDE", 8)) == 0)
+
+# identical windows score the integer 0, like the scalar functions
+def test_seq_to_seq_zero_scores():
+    entry = test_obj.seq_to_seq("PEPTIDE", "PEPTIDE", 7)[0]
+    assert(str(entry.hy_score) == "0" and str(entry.str_score) == "0")
+
+# residues that aren't on the scale still raise a KeyError
+def test_seq_to_seq_unknown_residue():
+    try:
+        test_obj.seq_to_seq("PEPXIDE", "PEPTIDE", 3)
+        assert(False)
+    except KeyError:
+        pass
+
+
+
+""" scan_kmers """
+
+# every kmer size should match a separate seq_to_seq run
+def test_scan_kmers_matches_seq_to_seq():
+    scans = test_obj.scan_kmers(range(5, 9))
+    assert(sorted(scans) == [5, 6, 7, 8])
+    for k, entries in scans.items():
+        single = test_obj.seq_to_seq(test_obj.sequence1, test_obj.sequence2, k)
+        assert([(e.pos, e.hy_score, e.str_score, e.hy_pct) for e in entries] ==
+               [(e.pos, e.hy_score, e.str_score, e.hy_pct) for e in single])
+
+
+
+""" record ids """
+
+# a record can be picked out of a file by id
+def test_record_id_spec():
+    spec_obj = Analysis("test/test1.fasta", "test/test2.fasta:sp|Q9QSQ7|ENV_HV1VI", 15)
+    assert(spec_obj.second_fasta == test_obj.second_fasta)
+
+
+
+""" Results """
+
+# the columns line up with the Entry-like views
+def test_results_columns():
+    results = test_obj.get_entries()
+    assert(len(results) == len(results.pos) == len(results.hy_score))
+    for i, e in enumerate(results):
+        assert(e.pos == results.pos[i])
+        assert(e.hy_score == results.hy_score[i])
+        assert(e.seq == results.seq(i))
+
+# indexing and slicing work like a list
+def test_results_indexing():
+    results = test_obj.get_entries()
+    assert(results[-1].pos == len(results) - 1)
+    assert([e.pos for e in results[:5]] == [0, 1, 2, 3, 4])
+    assert(results[3].to_entry().seq == results[3].seq)
+
+# where matches the same rows as a loop over the entries
+def test_results_where():
+    results = test_obj.get_entries()
+    looped = [e.pos for e in results if e.hy_score > 3 and e.str_score > 2]
+    assert(list(results.where("hy_score > 3 & str_score > 2")) == looped)
+    assert(list(results.where((results.hy_score > 3) &
+                              (results.str_score > 2))) == looped)
+    either = [e.pos for e in results if e.hy_score > 5 or e.hy_pct <= 0.1]
+    assert(list(results.where("hy_score > 5 | hy_pct <= 0.1")) == either)
+
+# anything that isn't a column comparison is refused
+def test_results_where_bad_expression():
+    try:
+        test_obj.get_entries().where("seq > 3")
+        assert(False)
+    except ValueError:
+        pass
+
+
+
+""" iter_windows """
+
+lazy_obj = Analysis("test/test1.fasta", "test/test2.fasta", 15, lazy=True)
+
+# nothing is scanned until it's asked for
+def test_lazy_no_results():
+    lazy = Analysis("test/test1.fasta", "test/test2.fasta", 15, lazy=True)
+    assert(lazy.results is None)
+    assert(len(lazy.get_entries()) == len(test_obj.get_entries()))
+
+# thresholds give the same windows as filtering everything
+def test_iter_windows_where():
+    expected = [e.pos for e in test_obj.get_entries() if e.str_score > 2]
+    for chunk_size in [1, 7, 1000]:
+        found = lazy_obj.iter_windows(where="str_score > 2",
+                                      chunk_size=chunk_size)
+        assert([e.pos for e in found] == expected)
+    found = lazy_obj.iter_windows(where=lambda r: r.str_score > 2)
+    assert([e.pos for e in found] == expected)
+
+# top N is the best N by the key, ties broken by position
+def test_iter_windows_top():
+    entries = [e for e in test_obj.get_entries() if e.str_score > 1]
+    entries.sort(key=lambda e: (-e.hy_score, e.pos))
+    for chunk_size in [3, 1000]:
+        found = list(lazy_obj.iter_windows(where="str_score > 1", top=5,
+                                           chunk_size=chunk_size))
+        assert([(e.pos, e.hy_score, e.seq) for e in found] ==
+               [(e.pos, e.hy_score, e.seq) for e in entries[:5]])
@@ -0,0 +1,172 @@
+import sys
+import random
+import pytest
+
+# add to path so tests can be run from home directory
+sys.path.append(".")
+from ASH import Analysis
+import aligner
+import fastaio
+
+SEQ1 = fastaio.read_sequence("sample_data/ENV_HV1MN.fasta")
+SEQ2 = fastaio.read_sequence("sample_data/ENV_HV1VI.fasta")
+
+needs_skbio = pytest.mark.skipif(not aligner.have_skbio(),
+                                 reason="scikit-bio is not installed")
+
+
+# the score of an alignment under StripedSmithWaterman's defaults
+def alignment_score(aligned1, aligned2):
+    score, in_gap = 0, False
+    for a, b in zip(aligned1, aligned2):
+        if a == "-" or b == "-":
+            score -= aligner.GAP_EXTEND if in_gap else aligner.GAP_OPEN
+            in_gap = True
+            continue
+        in_gap = False
+        if a in aligner.NUCLEOTIDES and b in aligner.NUCLEOTIDES:
+            score += aligner.MATCH if a == b else aligner.MISMATCH
+    return score
+
+def random_pairs(count):
+    rng = random.Random(4)
+    for i in range(count):
+        letters = rng.choice(["ACGT", "ACGTLK", "LAFYWIVHNCGMQPSTDERK"])
+        yield ("".join(rng.choice(letters)
+                       for j in range(rng.randint(1, 40))),
+               "".join(rng.choice(letters)
+                       for j in range(rng.randint(1, 40))))
+
+
+
+""" smith_waterman """
+
+# the alignment is of parts of the two sequences and has the score
+def test_alignment_is_consistent():
+    for seq1, seq2 in random_pairs(200):
+        aligned1, aligned2, score = aligner.smith_waterman(seq1, seq2)
+        assert(len(aligned1) == len(aligned2))
+        assert(aligned1.replace("-", "") in seq1)
+        assert(aligned2.replace("-", "") in seq2)
+        if score > 0:
+            assert(alignment_score(aligned1, aligned2) == score)
+
+# a known alignment with a gap
+def test_affine_gap():
+    aligned1, aligned2, score = aligner.smith_waterman("AAAACCCC",
+                                                       "AAAATTCCCC")
+    assert((aligned1, aligned2) == ("AAAA--CCCC", "AAAATTCCCC"))
+    assert(score == 16 - aligner.GAP_OPEN - aligner.GAP_EXTEND)
+
+# nothing that scores gives an empty alignment
+def test_no_alignment():
+    assert(aligner.smith_waterman("LLLL", "KKKK") == ("", "", 0))
+
+# the fallback finds what StripedSmithWaterman finds
+@needs_skbio
+def test_matches_ssw():
+    for seq1, seq2 in list(random_pairs(200)) + [(SEQ1, SEQ2)]:
+        ssw    = aligner.align_pair(seq1, seq2, "ssw")
+        python = aligner.align_pair(seq1, seq2, "python")
+        if alignment_score(*ssw) > 0:
+            assert(python == ssw)
+
+
+
+""" backends """
+
+# the backend comes from the argument, then the environment
+def test_get_backend(monkeypatch):
+    monkeypatch.setenv("ASH_ALIGNER", "python")
+    assert(aligner.get_backend() == "python")
+    assert(aligner.get_backend("ssw") == "ssw")
+    assert(aligner.align_params() == {"aligner": "smith_waterman"})
+    monkeypatch.setenv("ASH_ALIGNER", "nope")
+    with pytest.raises(ValueError):
+        aligner.get_backend()
+
+# Analysis runs the same on either backend
+@needs_skbio
+def test_analysis_backends(monkeypatch):
+    expected = Analysis.from_sequences(SEQ1, SEQ2, 10).get_entries()
+    monkeypatch.setenv("ASH_ALIGNER", "python")
+    found    = Analysis.from_sequences(SEQ1, SEQ2, 10).get_entries()
+    assert(found.seq1 == expected.seq1 and found.seq2 == expected.seq2)
+    assert(list(found.hy_score) == list(expected.hy_score))
+
+
+
+""" banded """
+
+# a random protein and a copy with substitutions and indels
+def mutated_pair(rng, length, substitutions=0.05, indels=0.01):
+    letters  = "LAFYWIVHNCGMQPSTDERK"
+    original = "".join(rng.choice(letters) for i in range(length))
+    copy     = []
+    for residue in original:
+        roll = rng.random()
+        if roll < indels / 2:
+            continue
+        if roll < indels:
+            copy.append(rng.choice(letters))
+        copy.append(rng.choice(letters) if rng.random() < substitutions
+                    else residue)
+    return original, "".join(copy)
+
+# the band gives the same alignment as the whole matrix
+def test_banded_matches_full():
+    rng = random.Random(8)
+    for i in range(40):
+        seq1, seq2 = mutated_pair(rng, rng.randint(50, 600))
+        # short pairs are aligned whole, a band would save little
+        if len(seq1) > 300:
+            assert(aligner.find_band(seq1, seq2) is not None)
+        assert(aligner.banded_smith_waterman(seq1, seq2)
+               == aligner.smith_waterman(seq1, seq2))
+    assert(aligner.banded_smith_waterman(SEQ1, SEQ2)
+           == aligner.smith_waterman(SEQ1, SEQ2))
+
+# every backend says where in seq1 its alignment starts
+def test_start():
+    rng = random.Random(4)
+    seq1, seq2 = mutated_pair(rng, 400)
+    seq1 = "".join(rng.choice("LAFYWIVHNCGMQPSTDERK") for i in range(30)) \
+           + seq1
+    backends = ["python", "banded"] + (["ssw"] if aligner.have_skbio() else [])
+    for backend in backends:
+        aligned = aligner.align_pair(seq1, seq2, backend)
+        assert(isinstance(aligned, aligner.Alignment))
+        assert(seq1[aligned.start:].startswith(aligned[0].replace("-", "")))
+    assert(aligner.align_pair("LLLL", "KKKK", "python").start == 0)
+
+# the band follows the seeds, and there is none without them
+def test_find_band():
+    seq = mutated_pair(random.Random(1), 100)[0]
+    assert(aligner.find_band(seq, "MQPSTDERK" + seq, margin=4) == (5, 13))
+    assert(aligner.find_band(seq, seq[20:], margin=4) == (-24, -16))
+    assert(aligner.find_band("LLLLLLLLLL", "KKKKKKKKKK") is None)
+    assert(aligner.find_band("LAF", "LAF") is None)
+
+# an alignment cut off by the band is noticed, and the banded backend
+# then aligns the whole matrix
+def test_band_edge():
+    seq1, seq2 = "AAAACCCCGGGG", "AAAATTCCCCGGGG"
+    assert(aligner.local_align(seq1, seq2, band=(0, 0))[3])
+    assert(aligner.local_align(seq1, seq2, band=(0, 2))[3])
+    assert(not aligner.local_align(seq1, seq2, band=(-1, 3))[3])
+    assert(aligner.local_align(seq1, seq2, band=(-1, 3))[:3]
+           == aligner.smith_waterman(seq1, seq2))
+
+# the backend can be chosen for each Analysis, and is part of the
+# cache key
+def test_backend_per_call(tmpdir):
+    import cache
+    alignment_cache = cache.AlignmentCache(str(tmpdir))
+    full   = Analysis.from_sequences(SEQ1, SEQ2, 10, align_backend="python",
+                                     cache=alignment_cache)
+    banded = Analysis.from_sequences(SEQ1, SEQ2, 10, align_backend="banded",
+                                     cache=alignment_cache)
+    assert(banded.aligned == full.aligned)
+    assert(alignment_cache.stats()["misses"] == 2)
+    with pytest.raises(ValueError):
+        Analysis.from_sequences(SEQ1, SEQ2, 10, align_backend="nope")
@@ -0,0 +1,103 @@
+import sys
+import random
+import numpy as np
+import pytest
+
+# add to path so tests can be run from home directory
+sys.path.append(".")
+from ASH import Analysis
+import background
+import scoring
+
+scorer = Analysis.__new__(Analysis)
+
+# a short aligned pair with gaps in both rows
+SEQ1 = "MKTAYIAKQR-QISFVKSHFSRQLEERLGLIEVQ"
+SEQ2 = "MKSA-IAKDRRQLSFIKTHFDR--EERMGLLEVK"
+
+
+def same_background(found, expected):
+    for column in range(len(background.Background._fields)):
+        assert(np.array_equal(found[column], expected[column],
+                              equal_nan=True))
+
+# the statistics the slow way, scoring each decoy with Analysis
+def brute_force(seq1, seq2, length, decoys):
+    observed = Analysis.from_sequences(seq1, seq2, length,
+                                       aligned=[seq1, seq2]).get_entries()
+    scores   = np.array([Analysis.from_sequences(seq1, decoy, length,
+                                                 aligned=[seq1, decoy])
+                         .get_entries().hy_score for decoy in decoys])
+    higher   = (scores >= observed.hy_score).sum(axis=0)
+    return scores.mean(axis=0), (1 + higher) / (1 + len(decoys))
+
+
+
+""" score_background """
+
+# the totals are those of scoring each decoy on its own
+def test_matches_brute_force():
+    tables = scoring.get_tables(scorer)
+    found  = background.score_background(SEQ1, SEQ2, 5, tables, 300,
+                                         seed=4, processes=1,
+                                         chunk_size=300)
+    # the same decoys, made the same way
+    rng     = np.random.default_rng(np.random.SeedSequence(4).spawn(1)[0])
+    codes2  = scoring.encode(SEQ2)
+    columns = np.flatnonzero(codes2 != ord("-"))
+    decoys  = [row.tobytes().decode("ascii")
+               for row in background.make_decoys(rng, codes2, columns, 300,
+                                                 "shuffle")]
+    mean, p = brute_force(SEQ1, SEQ2, 5, decoys)
+    assert(found.hy_mean == pytest.approx(mean))
+    assert(list(found.hy_p) == pytest.approx(list(p)))
+    assert(list(found.pos) == list(range(len(SEQ1) - 5 + 1)))
+
+# decoys keep the gaps and, shuffled, the composition of the sequence
+def test_decoys():
+    rng     = np.random.default_rng(1)
+    codes2  = scoring.encode(SEQ2)
+    columns = np.flatnonzero(codes2 != ord("-"))
+    for method in background.METHODS:
+        decoys = background.make_decoys(rng, codes2, columns, 50, method)
+        assert(decoys.shape == (50, len(SEQ2)))
+        assert(np.all((decoys == ord("-")) == (codes2 == ord("-"))))
+        assert(set(decoys.ravel()) <= set(codes2))
+    for row in background.make_decoys(rng, codes2, columns, 20, "shuffle"):
+        assert(sorted(row) == sorted(codes2))
+
+# the same seed gives the same answer in any number of processes
+def test_seeds_and_processes():
+    analysis = Analysis.from_sequences(SEQ1, SEQ2, 6, aligned=[SEQ1, SEQ2])
+    one      = analysis.score_background(1000, seed=7, processes=1,
+                                         chunk_size=150)
+    many     = analysis.score_background(1000, seed=7, processes=2,
+                                         chunk_size=150)
+    other    = analysis.score_background(1000, seed=8, processes=1,
+                                         chunk_size=150)
+    same_background(many, one)
+    assert(not np.array_equal(other.hy_mean, one.hy_mean))
+    assert(np.all((one.hy_p > 0) & (one.hy_p <= 1)))
+    # a higher score than the decoys' mean gives a positive z-score
+    scored = ~np.isnan(one.hy_z)
+    above  = analysis.get_entries().hy_score > one.hy_mean
+    assert(np.array_equal((one.hy_z > 0)[scored], above[scored]))
+
+# a window every decoy scores the same in has no z-score
+def test_constant_background():
+    found = background.score_background("AAAA", "LLLL", 2,
+                                        scoring.get_tables(scorer), 20,
+                                        seed=0, processes=1)
+    assert(np.all(found.hy_std == 0) and np.all(np.isnan(found.hy_z)))
+    assert(np.all(found.hy_p == 1))
+
+# bad arguments and unscorable residues raise
+def test_errors():
+    tables = scoring.get_tables(scorer)
+    with pytest.raises(ValueError):
+        background.score_background(SEQ1, SEQ2, 5, tables, method="nope")
+    with pytest.raises(ValueError):
+        background.score_background(SEQ1, SEQ2, 5, tables, permutations=0)
+    with pytest.raises(KeyError):
+        background.score_background("MKXA", "MKTA", 2, tables, 10,
+                                    processes=1)
@@ -0,0 +1,54 @@
+import sys
+
+# add to path so tests can be run from home directory
+sys.path.append(".")
+from ASH import Analysis
+import batch
+
+test_obj = Analysis("test/test1.fasta", "test/test2.fasta", 15)
+
+# a small panel: the second test sequence twice and the first once
+panel = [("target1", test_obj.second_fasta),
+         ("target2", test_obj.first_fasta),
+         ("target3", test_obj.second_fasta)]
+
+
+# helper to compare Entry lists by value
+def values(entries):
+    return [(e.seq, e.pos, e.hy_score, e.str_score, e.analog,
+             e.hy_pct, e.str_pct) for e in entries]
+
+
+
+""" screen """
+
+# in-process screening should match a pairwise Analysis for each target
+def test_screen_single_process():
+    hits = list(batch.screen(test_obj.first_fasta, panel, 15, processes=1))
+    assert([hit.header for hit in hits] == ["target1", "target2", "target3"])
+    assert(values(hits[0].entries) == values(test_obj.get_entries()))
+    assert(values(hits[2].entries) == values(test_obj.get_entries()))
+
+# the pool returns the same hits, in whatever order they finish
+def test_screen_process_pool():
+    hits = list(batch.screen(test_obj.first_fasta, panel, 15, processes=2,
+                             chunk_size=1, max_pending=2))
+    hits.sort(key=lambda hit: hit.index)
+    assert([hit.index for hit in hits] == [0, 1, 2])
+    assert(values(hits[0].entries) == values(test_obj.get_entries()))
+    assert(hits[1].aligned[0] == hits[1].aligned[1])
+
+# run_ash.py refuses the scan options with --targets, and reports the
+# cache after a screen
+def test_run_ash_targets(tmp_path):
+    import subprocess
+    command = [sys.executable, "run_ash.py", "-f1", "test/test1.fasta",
+               "-t", "test/test2.fasta", "-k", "15",
+               "-o", str(tmp_path / "out.tsv"), "-p", "1"]
+    for extra in (["--workers", "2"], ["--chunk-size", "100"]):
+        found = subprocess.run(command + extra, capture_output=True,
+                               text=True)
+        assert(found.returncode != 0 and "--targets" in found.stderr)
+    found = subprocess.run(command + ["--cache", str(tmp_path / "cache")],
+                           capture_output=True, text=True, check=True)
+    assert("alignment cache: 0 hits, 1 misses" in found.stderr)
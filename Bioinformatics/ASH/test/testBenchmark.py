@@ -0,0 +1,64 @@
+import sys
+import subprocess
+import numpy as np
+
+# add to path so tests can be run from home directory
+sys.path.append(".")
+import benchmark
+
+
+
+""" synthetic data """
+
+# the same seed gives the same pair, and the pair is aligned
+def test_make_pair_seeded():
+    first  = benchmark.make_pair(np.random.default_rng(3), 500)
+    second = benchmark.make_pair(np.random.default_rng(3), 500)
+    assert(first == second)
+    assert(len(first[0]) == len(first[1]) == 500)
+    assert(set(first[0] + first[1]) <= set("LAFYWIVHNCGMQPSTDERK-"))
+
+# panels add up to the size asked for
+def test_make_panel():
+    panel = benchmark.make_panel(np.random.default_rng(0), 1234)
+    assert(sum(len(seq) for header, seq in panel) == 1234)
+
+
+
+""" run / compare """
+
+# every stage is measured, align only up to the limit
+def test_run_stages():
+    rows   = benchmark.run(sizes=[300, 600], kmers=[5, 9], formats=["tsv"],
+                           repeat=1, align_limit=300)
+    stages = [benchmark.row_key(row) for row in rows]
+    assert(("align", 300, None, None) in stages)
+    assert(("align", 600, None, None) not in stages)
+    assert(("seq_to_seq", 600, 9, None) in stages)
+    assert(("write", 600, 9, "tsv") in stages)
+    assert(all(row["seconds"] >= 0 and row["peak_bytes"] > 0
+               for row in rows))
+
+# only slowdowns past the threshold are flagged
+def test_compare():
+    old = [{"stage": "align", "size": 10, "k": None, "format": None,
+            "seconds": 1.0},
+           {"stage": "get_seq", "size": 10, "k": None, "format": None,
+            "seconds": 1.0}]
+    new = [dict(old[0], seconds=1.5), dict(old[1], seconds=1.1)]
+    regressions = benchmark.compare(old, new, threshold=0.2)
+    assert(len(regressions) == 1)
+    assert(regressions[0][0] == ("align", 10, None, None))
+    assert(regressions[0][3] == 1.5)
+
+# a cold start is timed for each command, and ASH starts without
+# importing scikit-bio
+def test_cold_start():
+    rows = benchmark.cold_start(repeat=1)
+    assert(sorted(row["format"] for row in rows) == ["help", "import"])
+    assert(all(row["seconds"] > 0 for row in rows))
+    assert("- residues" in benchmark.format_row(rows[0]))
+    loaded = subprocess.run([sys.executable, "-c", "import sys, ASH; "
+                             "print('skbio' in sys.modules)"],
+                            cwd=benchmark.HERE, stdout=subprocess.PIPE)
+    assert(loaded.stdout.strip() == b"False")
@@ -0,0 +1,72 @@
+import pickle
+import sys
+
+# add to path so tests can be run from home directory
+sys.path.append(".")
+from ASH import Analysis
+from cache import AlignmentCache
+
+test_obj = Analysis("test/test1.fasta", "test/test2.fasta", 15)
+
+
+
+""" AlignmentCache """
+
+# the second run on the same pair reads the alignment back
+def test_cache_hit(tmp_path):
+    cache = AlignmentCache(str(tmp_path))
+    first = Analysis("test/test1.fasta", "test/test2.fasta", 15, cache=cache)
+    second = Analysis("test/test1.fasta", "test/test2.fasta", 15, cache=cache)
+    assert((cache.hits, cache.misses) == (1, 1))
+    assert(first.aligned == second.aligned == test_obj.aligned)
+    # with where the aligned part starts
+    assert(second.aligned.start == first.aligned.start == first.offset)
+
+# counters are kept across cache objects, as they would be across runs
+def test_cache_totals(tmp_path):
+    for i in range(3):
+        cache = AlignmentCache(str(tmp_path))
+        Analysis("test/test1.fasta", "test/test2.fasta", 15, cache=cache)
+    stats = cache.stats()
+    assert(stats["total_hits"] == 2 and stats["total_misses"] == 1)
+    assert(stats["entries"] == 1)
+
+# different settings are a different key
+def test_cache_key_params(tmp_path):
+    cache = AlignmentCache(str(tmp_path))
+    assert(cache.make_key("AA", "AA", {"aligner": "a"}) !=
+           cache.make_key("AA", "AA", {"aligner": "b"}))
+    assert(cache.make_key("AA", "AB", {}) != cache.make_key("AAA", "B", {}))
+
+# the least recently used entries go first when the cache is full
+def test_cache_eviction(tmp_path):
+    cache = AlignmentCache(str(tmp_path), max_bytes=12)
+    cache.put("old", ["AAA", "AAA"])
+    cache.put("new", ["BBB", "BBB"])
+    cache.get("old")
+    cache.put("newest", ["CC", "CC"])
+    assert(cache.get("new") is None)
+    assert(cache.get("old") == ["AAA", "AAA"])
+    assert(cache.stats()["bytes"] <= 12)
+
+# caches can be sent to worker processes
+def test_cache_pickle(tmp_path):
+    cache = AlignmentCache(str(tmp_path))
+    cache.put("key", ["AA", "A-"])
+    copy = pickle.loads(pickle.dumps(cache))
+    assert(copy.get("key") == ["AA", "A-"])
+
+# a cache made before starts were kept still works, without them
+def test_old_cache(tmp_path):
+    import sqlite3
+    db = sqlite3.connect(str(tmp_path / "alignments.sqlite"))
+    db.execute("CREATE TABLE alignments (key TEXT PRIMARY KEY, query TEXT, "
+               "target TEXT, size INTEGER, atime REAL)")
+    db.execute("INSERT INTO alignments VALUES ('old', 'AK', 'AR', 4, 0)")
+    db.commit()
+    db.close()
+    cache = AlignmentCache(str(tmp_path))
+    assert(cache.get("old") == ["AK", "AR"])
+    assert(cache.get("old").start is None)
+    cache.put("new", test_obj.aligned)
+    assert(cache.get("new").start == test_obj.aligned.start)
@@ -0,0 +1,110 @@
+import sys
+import random
+import numpy as np
+
+# add to path so tests can be run from home directory
+sys.path.append(".")
+from ASH import Analysis
+import distinct
+import fastaio
+
+scorer = Analysis.__new__(Analysis)
+RESIDUES = "LAFYWIVHNCGMQPSTDERK"
+
+
+# the smallest distance by comparing every window with every other one
+def brute_force(query, targets, k):
+    best = []
+    for p in range(len(query) - k + 1):
+        window = query[p:p + k]
+        scores = [scorer.hydro_mismatch(window, seq[q:q + k])
+                  for header, seq in targets
+                  for q in range(len(seq) - k + 1)
+                  if all(r in scorer.hydro_weight for r in seq[q:q + k])]
+        best.append(min(scores) if scores else np.nan)
+    return best
+
+def random_seq(rng, length):
+    return "".join(rng.choice(RESIDUES) for i in range(length))
+
+
+
+""" KmerIndex """
+
+# the pruned search finds the same minimum as comparing everything
+def test_matches_brute_force():
+    rng     = random.Random(11)
+    targets = [("t%d" % i, random_seq(rng, rng.randint(5, 60)))
+               for i in range(8)]
+    query   = random_seq(rng, 40)
+    for k in (1, 3, 7):
+        index = distinct.KmerIndex(targets, k, scorer)
+        found = index.nearest(query)
+        assert(list(found.distance) == brute_force(query, targets, k))
+        # the reported window really is at that distance
+        for i, p in enumerate(found.pos):
+            seq = targets[found.target[i]][1]
+            q   = found.target_pos[i]
+            assert(scorer.hydro_mismatch(query[p:p + k], seq[q:q + k])
+                   == found.distance[i])
+
+# a peptide present in the targets is at distance 0
+def test_exact_seed():
+    targets = [("a", "MKTAYIAKQR"), ("b", "GSHMDERK")]
+    index   = distinct.KmerIndex(targets, 4, scorer)
+    found   = index.nearest("SHMD")
+    assert(found.distance[0] == 0)
+    assert((found.target[0], found.target_pos[0]) == (1, 1))
+
+# windows with residues off the scale are skipped or NaN
+def test_unscored_residues():
+    targets = [("a", "MKXTAYIA")]
+    index   = distinct.KmerIndex(targets, 3, scorer)
+    assert(len(index) == 3)
+    found   = index.nearest("KXTAY")
+    assert(np.isnan(found.distance[0]) and found.target[0] == -1)
+    assert(found.distance[2] == 0)
+
+# a scale the bound doesn't hold for still gets exact answers
+class FlatScale(Analysis):
+    def hydro_score(self, residue1, residue2):
+        return 0 if residue1 == residue2 else 0.1
+
+def test_unbounded_scale():
+    flat    = FlatScale.__new__(FlatScale)
+    targets = [("a", "MKTAYIAKQRDE"), ("b", "GSHMDERKLLAF")]
+    index   = distinct.KmerIndex(targets, 4, flat)
+    assert(not index.bounded)
+    found   = index.nearest("WWDEWW")
+    best    = min(flat.hydro_mismatch(w, seq[q:q + 4])
+                  for w in ["WWDE"] for h, seq in targets
+                  for q in range(len(seq) - 3))
+    assert(found.distance[0] == best)
+
+# windows never span two records
+def test_no_window_across_records():
+    index = distinct.KmerIndex([("a", "AAK"), ("b", "DDE")], 3, scorer)
+    assert(len(index) == 2)
+
+
+
+""" min_distances """
+
+# several processes give the same answer as one
+def test_processes_agree():
+    targets = (list(fastaio.read_fasta("test/test2.fasta"))
+               + list(fastaio.read_fasta("sample_data/ENV_HV1VI.fasta")))
+    query   = fastaio.read_sequence("test/test1.fasta")
+    index   = distinct.KmerIndex(targets, 9, scorer)
+    one     = distinct.min_distances(query, index, processes=1)
+    many    = distinct.min_distances(query, index, processes=2,
+                                     chunk_size=16)
+    for column in range(len(one)):
+        assert(np.array_equal(one[column], many[column], equal_nan=True))
+
+# the Analysis method indexes a file
+def test_proteome_distance():
+    analysis = Analysis("test/test1.fasta", "test/test2.fasta", 9)
+    found    = analysis.proteome_distance("test/test2.fasta", processes=1)
+    assert(len(found.pos) == len(analysis.first_fasta) - 9 + 1)
+    assert(np.nanmin(found.distance) >= 0)
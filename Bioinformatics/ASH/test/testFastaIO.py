@@ -0,0 +1,117 @@
+import gzip
+import sys
+
+# add to path so tests can be run from home directory
+sys.path.append(".")
+import fastaio
+
+# a multi-record file with wrapped lines, a blank line and a CRLF ending
+MULTI = (b">first record\nMRVKGIRRNY\nQHWWGWG\n\n"
+         b">second\r\nMRVRGMQRNW\r\n"
+         b">third\nPEPTIDE")
+
+
+# write the test data to a temporary file
+def write_multi(tmp_path, name="multi.fasta", data=MULTI):
+    path = tmp_path / name
+    path.write_bytes(data)
+    return str(path)
+
+
+
+""" read_fasta """
+
+# records are kept apart, and lines joined without whitespace
+def test_read_fasta_records(tmp_path):
+    records = list(fastaio.read_fasta(write_multi(tmp_path)))
+    assert([r.header for r in records] == ["first record", "second", "third"])
+    assert([r.sequence for r in records] ==
+           ["MRVKGIRRNYQHWWGWG", "MRVRGMQRNW", "PEPTIDE"])
+
+# tiny chunks split records and lines in every possible place
+def test_read_fasta_chunk_sizes(tmp_path):
+    path = write_multi(tmp_path)
+    expected = list(fastaio.read_fasta(path))
+    for size in range(1, 12):
+        assert(list(fastaio.read_fasta(path, chunk_size=size)) == expected)
+
+# memory-mapping gives the same records
+def test_read_fasta_mmap(tmp_path):
+    path = write_multi(tmp_path)
+    assert(list(fastaio.read_fasta(path, use_mmap=True)) ==
+           list(fastaio.read_fasta(path)))
+
+# gzipped files are read transparently
+def test_read_fasta_gzip(tmp_path):
+    plain = write_multi(tmp_path)
+    zipped = write_multi(tmp_path, "multi.fasta.gz", gzip.compress(MULTI))
+    assert(list(fastaio.read_fasta(zipped)) == list(fastaio.read_fasta(plain)))
+
+# offsets point at the ">" of each header
+def test_read_fasta_offsets(tmp_path):
+    path = write_multi(tmp_path)
+    for record in fastaio.read_fasta(path):
+        assert(MULTI[record.offset:record.offset + 1] == b">")
+        assert(fastaio.read_record_at(path, record.offset) == record)
+
+
+
+""" first_record """
+
+def test_first_record_single_file():
+    record = fastaio.first_record("test/test1.fasta")
+    assert(record.header.startswith("sp|P05877|ENV_HV1MN"))
+    assert(record.sequence ==
+           "MRVKGIRRNYQHWWGWGTMLLGLLMICSATEKLWVTVYYGVPVWKEATTTLFCASDAKAY")
+
+# a file with no header is still one sequence
+def test_first_record_no_header(tmp_path):
+    path = write_multi(tmp_path, data=b"PEPT\nIDE\n")
+    assert(fastaio.first_record(path).sequence == "PEPTIDE")
+
+
+
+""" FastaIndex """
+
+# a panel with evenly wrapped lines, as written by most tools
+PANEL = (b">alpha first\nMRVKG\nIRRNY\nQH\n"
+         b">beta\nPEPTI\nDE\n"
+         b">gamma\nMRVRG\n")
+
+# every record, and every range of every record, matches the parser
+def test_index_fetch(tmp_path):
+    path = write_multi(tmp_path, "panel.fasta", PANEL)
+    with fastaio.FastaIndex(path) as index:
+        assert(index.names == ["alpha", "beta", "gamma"])
+        for record in fastaio.read_fasta(path):
+            name = record.header.split()[0]
+            assert(index.length(name) == len(record.sequence))
+            assert(index.fetch(name) == record.sequence)
+            for start in range(len(record.sequence)):
+                for end in range(start, len(record.sequence) + 1):
+                    assert(index.fetch(name, start, end) ==
+                           record.sequence[start:end])
+
+# the index is saved next to the file and reused
+def test_index_saved(tmp_path):
+    path = write_multi(tmp_path, "panel.fasta", PANEL)
+    fastaio.FastaIndex(path).close()
+    assert((tmp_path / "panel.fasta.fai").read_text().startswith("alpha\t12\t"))
+    assert(sorted(p.name for p in tmp_path.iterdir()) ==
+           ["panel.fasta", "panel.fasta.fai"])
+    assert(fastaio.FastaIndex(path).fetch("beta", 2, 5) == "PTI")
+
+# lines of different lengths can't be indexed
+def test_index_ragged(tmp_path):
+    path = write_multi(tmp_path, "ragged.fasta", b">a\nPEP\nTIDES\n")
+    try:
+        fastaio.FastaIndex(path)
+        assert(False)
+    except ValueError:
+        pass
+
+# file.fasta:RECORD_ID names one record
+def test_read_sequence_spec(tmp_path):
+    path = write_multi(tmp_path, "panel.fasta", PANEL)
+    assert(fastaio.read_sequence(path + ":beta") == "PEPTIDE")
+    assert(fastaio.read_sequence(path) == "MRVKGIRRNYQH")
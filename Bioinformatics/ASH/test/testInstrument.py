@@ -0,0 +1,51 @@
+import sys
+import pstats
+
+# add to path so tests can be run from home directory
+sys.path.append(".")
+from ASH import Analysis
+import instrument
+
+
+
+""" Instrument """
+
+# each stage is recorded and handed to the callback
+def test_stages_recorded():
+    seen   = []
+    stages = instrument.Instrument(callback=seen.append)
+    test_obj = Analysis("test/test1.fasta", "test/test2.fasta", 15,
+                        instrument=stages)
+    names = [record["stage"] for record in stages.records]
+    assert(names == ["get_seq", "get_seq", "align", "seq_to_seq"])
+    assert(seen == stages.records)
+    scan = stages.records[-1]
+    assert(scan["windows"] == len(test_obj.get_entries()))
+    assert(scan["wall"] >= 0 and scan["cpu"] >= 0)
+    assert(scan["windows_per_sec"] is None or scan["windows_per_sec"] > 0)
+
+# totals add the calls of a stage together
+def test_totals():
+    stages   = instrument.Instrument()
+    test_obj = Analysis("test/test1.fasta", "test/test2.fasta", None,
+                        instrument=stages)
+    results  = test_obj.scan_kmers([5, 6, 7])
+    totals   = dict((total["stage"], total) for total in stages.totals())
+    assert(totals["get_seq"]["calls"] == 2)
+    assert(totals["seq_to_seq"]["calls"] == 3)
+    assert(totals["seq_to_seq"]["windows"]
+           == sum(len(r) for r in results.values()))
+
+# the stage helper does nothing without an Instrument
+def test_no_instrument():
+    with instrument.stage(None, "align") as stage:
+        stage.windows = 10
+    assert(instrument.stage(None, "write") is instrument.NULL_STAGE)
+
+# a profile_file gets a cProfile dump pstats can read
+def test_profile_dump(tmp_path):
+    path = str(tmp_path / "ash.prof")
+    with instrument.Instrument(profile_file=path) as stages:
+        Analysis("test/test1.fasta", "test/test2.fasta", 15,
+                 instrument=stages)
+    assert(pstats.Stats(path).total_calls > 0)
@@ -0,0 +1,125 @@
+import sys
+import random
+import numpy as np
+import pytest
+
+# add to path so tests can be run from home directory
+sys.path.append(".")
+from ASH import Analysis
+import msa
+
+scorer = Analysis.__new__(Analysis)
+RESIDUES = "LAFYWIVHNCGMQPSTDERK-"
+
+
+# a random alignment of a sequence and rows - 1 variants of it
+def random_alignment(rng, rows, length):
+    first   = [rng.choice(RESIDUES) for i in range(length)]
+    records = [("seq0 reference", "".join(first))]
+    for r in range(1, rows):
+        row = [rng.choice(RESIDUES) if rng.random() < 0.3 else residue
+               for residue in first]
+        records.append(("seq%d" % r, "".join(row)))
+    return records
+
+# every window of the reference against every other row, pair by pair
+def brute_force(records, reference, k):
+    ref    = records[reference][1]
+    others = [seq for i, (h, seq) in enumerate(records) if i != reference]
+    hydro, struct = [], []
+    for p in range(len(ref) - k + 1):
+        hydro.append([scorer.hydro_mismatch(ref[p:p + k], seq[p:p + k])
+                      for seq in others])
+        struct.append([scorer.structural_mismatch(ref[p:p + k], seq[p:p + k])
+                       for seq in others])
+    return np.array(hydro), np.array(struct)
+
+
+
+""" MultipleAlignment """
+
+# the mean, minimum and maximum match scoring every pair
+def test_matches_pairwise():
+    rng     = random.Random(5)
+    records = random_alignment(rng, 12, 50)
+    for reference in (0, 7):
+        alignment = msa.MultipleAlignment(records, reference, scorer)
+        for k in (1, 4, 9):
+            found         = alignment.windows(k)
+            hydro, struct = brute_force(records, reference, k)
+            assert(list(found.pos) == list(range(50 - k + 1)))
+            assert(found.hy_mean == pytest.approx(hydro.mean(axis=1)))
+            assert(found.str_mean == pytest.approx(struct.mean(axis=1)))
+            assert(list(found.hy_min) == pytest.approx(hydro.min(axis=1)))
+            assert(list(found.hy_max) == pytest.approx(hydro.max(axis=1)))
+            assert(list(found.str_min) == pytest.approx(struct.min(axis=1)))
+            assert(list(found.str_max) == pytest.approx(struct.max(axis=1)))
+
+# the percentages are those of the reference window
+def test_percentages():
+    records   = random_alignment(random.Random(2), 4, 30)
+    alignment = msa.MultipleAlignment(records, 0, scorer)
+    found     = alignment.windows(6)
+    ref       = records[0][1]
+    for i, p in enumerate(found.pos):
+        assert(found.hy_pct[i] == scorer.hydro_percent(ref[p:p + 6]))
+        assert(found.str_pct[i] == scorer.struct_percent(ref[p:p + 6]))
+    assert(alignment.peptides([0, 2], 3) == [ref[0:3], ref[2:5]])
+
+# more rows than a block still gives the same extremes
+def test_row_blocks(monkeypatch):
+    records   = random_alignment(random.Random(9), 20, 25)
+    whole     = msa.MultipleAlignment(records, 0, scorer).windows(5)
+    monkeypatch.setattr(msa, "BLOCK_ROWS", 3)
+    blocks    = msa.MultipleAlignment(records, 0, scorer).windows(5)
+    assert(list(blocks.hy_min) == list(whole.hy_min))
+    assert(list(blocks.str_max) == list(whole.str_max))
+
+# start and stop give part of the windows
+def test_start_stop():
+    alignment = msa.MultipleAlignment(
+        random_alignment(random.Random(3), 5, 40), 0, scorer)
+    whole     = alignment.windows(8)
+    part      = alignment.windows(8, 10, 20)
+    assert(list(part.pos) == list(range(10, 20)))
+    assert(list(part.hy_max) == list(whole.hy_max[10:20]))
+    assert(list(part.str_mean) == list(whole.str_mean[10:20]))
+
+# the reference can be picked by id, and the input is checked
+def test_reference_and_errors(tmpdir):
+    records = [("a first", "LA-K"), ("b", "LAFK"), ("c", "IA-R")]
+    path    = str(tmpdir.join("clade.fasta"))
+    with open(path, "w") as outfile:
+        for header, seq in records:
+            outfile.write(">%s\n%s\n" % (header, seq))
+    alignment = msa.MultipleAlignment.from_fasta(path, "b")
+    assert(alignment.reference == 1)
+    assert(msa.MultipleAlignment(records, -1).reference == 2)
+    with pytest.raises(ValueError):
+        msa.MultipleAlignment(records, "d")
+    with pytest.raises(ValueError):
+        msa.MultipleAlignment(records[:1])
+    with pytest.raises(ValueError):
+        msa.MultipleAlignment(records + [("d", "LAK")])
+
+# residues off the scale raise as in Analysis, unless a policy is given
+def test_unknown_residues():
+    records = [("a", "LAXK"), ("b", "LAFK")]
+    with pytest.raises(KeyError):
+        msa.MultipleAlignment(records).windows(2)
+    found = msa.MultipleAlignment(records, unknown="ignore").windows(2)
+    assert(len(found.pos) == 3)
+
+# a scorer's own policy is used, and a different one is refused
+def test_unknown_with_scorer():
+    records = [("a", "LAXK"), ("b", "LAFK")]
+    scorer  = Analysis.from_sequences("LAFK", "LAFK", 2)
+    scorer.unknown = "ignore"
+    found   = msa.MultipleAlignment(records, 0, scorer).windows(2)
+    assert(len(found.pos) == 3)
+    assert(len(msa.MultipleAlignment(records, 0, scorer,
+                                     unknown="ignore").windows(2).pos) == 3)
+    with pytest.raises(ValueError):
+        msa.MultipleAlignment(records, 0, scorer, unknown="error")
+    with pytest.raises(ValueError):
+        msa.MultipleAlignment(records, unknown="guess")
@@ -0,0 +1,140 @@
+import sys
+import random
+import pytest
+
+# add to path so tests can be run from home directory
+sys.path.append(".")
+from ASH import Analysis
+import aligner
+import fastaio
+
+SEQ1 = fastaio.read_sequence("sample_data/ENV_HV1MN.fasta")
+SEQ2 = fastaio.read_sequence("sample_data/ENV_HV1VI.fasta")
+RESIDUES = "LAFYWIVHNCGMQPSTDERK"
+
+
+def same_results(found, expected):
+    assert(found.seq1 == expected.seq1 and found.seq2 == expected.seq2)
+    for name in ("pos", "hy_score", "str_score", "hy_pct", "str_pct"):
+        assert(list(getattr(found, name)) == list(getattr(expected, name)))
+
+# the first sequence with the edits made, all at the old positions
+def edited(seq, edits):
+    letters = list(seq)
+    for pos, new in edits:
+        letters[pos] = new
+    return "".join(letters)
+
+
+
+""" apply_mutations """
+
+# substitutions rescore the windows over them, in the same alignment,
+# and the result is what scoring the edited alignment from scratch gives
+def test_substitutions():
+    rng      = random.Random(6)
+    analysis = Analysis.from_sequences(SEQ1, SEQ2, 12)
+    aligned  = analysis.aligned
+    for attempt in range(5):
+        edits    = [(pos, rng.choice(RESIDUES))
+                    for pos in rng.sample(range(len(SEQ1)), 4)]
+        old      = analysis.get_entries()
+        seq      = edited(analysis.first_fasta, edits)
+        changes  = analysis.apply_mutations(edits)
+        assert(analysis.first_fasta == seq)
+        # the alignment keeps its columns
+        assert(analysis.sequence2 == aligned[1])
+        assert(len(analysis.sequence1) == len(aligned[0]))
+        expected = Analysis.from_sequences(seq, SEQ2, 12,
+                                           aligned=analysis.aligned)
+        same_results(analysis.get_entries(), expected.get_entries())
+        # the diff holds just the rows that changed
+        changed  = [i for i in range(len(old))
+                    if (old[i].seq, old[i].hy_score, old[i].hy_pct) !=
+                       (expected.get_entries()[i].seq,
+                        expected.get_entries()[i].hy_score,
+                        expected.get_entries()[i].hy_pct)]
+        assert(list(changes.after.pos) == changed)
+        assert(list(changes.before.pos) == changed)
+        assert([e.seq for e in changes.before] ==
+               [old[i].seq for i in changed])
+
+# an insertion or a deletion realigns the pair
+def test_indels():
+    analysis = Analysis.from_sequences(SEQ1, SEQ2, 10)
+    edits    = [(40, ""), (300, SEQ1[300] + "GG")]
+    seq      = edited(SEQ1, edits)
+    changes  = analysis.apply_mutations(edits)
+    expected = Analysis.from_sequences(seq, SEQ2, 10)
+    assert(analysis.first_fasta == seq)
+    assert(analysis.aligned == expected.aligned)
+    same_results(analysis.get_entries(), expected.get_entries())
+    assert(len(changes.after) > 0)
+
+# an edit that changes nothing gives no rows, and one outside the
+# aligned region changes the sequence but not the windows
+def test_no_change():
+    analysis = Analysis.from_sequences("MKVL" + SEQ1[:200] + "QQQQQQ",
+                                       SEQ2, 8)
+    aligned  = list(analysis.aligned)
+    results  = analysis.get_entries()
+    changes  = analysis.apply_mutations([(30, analysis.first_fasta[30])])
+    assert(len(changes.before) == 0 and len(changes.after) == 0)
+    # the local alignment leaves out the Qs at the end
+    changes  = analysis.apply_mutations([(0, "W"), (209, "W")])
+    assert(analysis.first_fasta == "WKVL" + SEQ1[:200] + "QQQQQW")
+    assert(analysis.aligned == aligned)
+    assert(len(changes.after) == 0)
+    same_results(analysis.get_entries(), results)
+
+# the edits land in the copy of a repeated region that was aligned
+def test_repeated_region():
+    region   = SEQ1[:250]
+    first    = region + "GGGGG" + region
+    pair     = Analysis.from_sequences(region, SEQ2, 12).aligned
+    start    = len(region) + 5 + pair.start
+    analysis = Analysis.from_sequences(first, SEQ2, 12,
+                                       aligned=aligner.Alignment(pair, start))
+    assert(analysis.offset == start)
+    # a residue of the second copy, and the same one in the first
+    pos      = start + 20
+    edits    = [(pos, "W" if first[pos] != "W" else "K")]
+    changes  = analysis.apply_mutations(edits)
+    expected = Analysis.from_sequences(edited(first, edits), SEQ2, 12,
+                                       aligned=analysis.aligned)
+    same_results(analysis.get_entries(), expected.get_entries())
+    assert(len(changes.after) > 0)
+    assert(analysis.aligned.start == start)
+    changes  = analysis.apply_mutations([(pos - len(region) - 5, "W")])
+    assert(len(changes.after) == 0)
+
+# a scale whose sums aren't exact is rescanned in full
+def test_inexact_scale():
+    class Tenths(Analysis):
+        hydro_weight = dict((residue, weight / 5) for residue, weight
+                            in Analysis.hydro_weight.items())
+    rng      = random.Random(2)
+    analysis = Tenths.from_sequences(SEQ1, SEQ2, 12)
+    edits    = [(pos, rng.choice(RESIDUES))
+                for pos in rng.sample(range(len(SEQ1)), 6)]
+    analysis.apply_mutations(edits)
+    expected = Tenths.from_sequences(edited(SEQ1, edits), SEQ2, 12,
+                                     aligned=analysis.aligned)
+    same_results(analysis.get_entries(), expected.get_entries())
+
+# bad edits raise and leave everything as it was
+def test_errors():
+    analysis = Analysis.from_sequences(SEQ1, SEQ2, 12)
+    results  = analysis.get_entries()
+    with pytest.raises(IndexError):
+        analysis.apply_mutations([(len(SEQ1), "A")])
+    with pytest.raises(ValueError):
+        analysis.apply_mutations([(3, "A"), (3, "K")])
+    with pytest.raises(ValueError):
+        analysis.apply_mutations([(3, "-")])
+    with pytest.raises(KeyError):
+        analysis.apply_mutations([(analysis.offset + 20, "X")])
+    assert(analysis.first_fasta == SEQ1)
+    assert(analysis.get_entries() is results)
+    with pytest.raises(ValueError):
+        Analysis.from_sequences(SEQ1, SEQ2, None).apply_mutations([(0, "A")])
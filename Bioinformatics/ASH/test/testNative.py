@@ -0,0 +1,77 @@
+import os
+import shutil
+import subprocess
+import sys
+import numpy as np
+import pytest
+
+# add to path so tests can be run from home directory
+sys.path.append(".")
+from ASH import Analysis
+import native
+import scoring
+
+# the kernel is built in ASH++ for the tests if it isn't there, the way
+# "make kernel" builds it, and loaded even if ASH_NO_NATIVE is set
+@pytest.fixture(scope="module", autouse=True)
+def kernel():
+    path = os.path.join(native.DIRECTORY, native.LIBRARY)
+    with pytest.MonkeyPatch.context() as patch:
+        patch.delenv("ASH_NO_NATIVE", raising=False)
+        lib = native.load(path)
+        if lib is None:
+            if shutil.which("g++") is None:
+                pytest.skip("no C++ compiler to build the kernel")
+            subprocess.run(["g++", "-O3", "-std=c++11", "-fPIC", "-shared",
+                            "-o", path,
+                            os.path.join(native.DIRECTORY, "ash_kernel.cpp")],
+                           check=True)
+            lib = native.load(path)
+        patch.setattr(native, "_lib", lib)
+        patch.setattr(native, "available", True)
+        yield lib
+
+test_obj = Analysis("sample_data/ENV_HV1MN.fasta",
+                    "sample_data/ENV_HV1VI.fasta", 15)
+
+
+# the windows of an aligned pair with and without the kernel
+def both_paths(seq1, seq2, length, monkeypatch):
+    tables = scoring.get_tables(test_obj)
+    fast   = scoring.Profile(seq1, seq2, tables).windows(length)
+    monkeypatch.setattr(native, "available", False)
+    slow   = scoring.Profile(seq1, seq2, tables).windows(length)
+    monkeypatch.setattr(native, "available", True)
+    return fast, slow
+
+
+
+""" parity """
+
+# identical scores on the sample data at every kmer size
+def test_parity_sample_data(monkeypatch):
+    for length in [1, 5, 15, 40, len(test_obj.sequence1)]:
+        fast, slow = both_paths(test_obj.sequence1, test_obj.sequence2,
+                                length, monkeypatch)
+        for a, b in zip(fast, slow):
+            assert(a.dtype == b.dtype)
+            assert(np.array_equal(a, b))
+
+# a chunk of windows matches the same rows of the whole scan
+def test_parity_chunk(monkeypatch):
+    profile = scoring.Profile(test_obj.sequence1, test_obj.sequence2,
+                              scoring.get_tables(test_obj))
+    whole   = profile.windows(12)
+    chunk   = profile.windows(12, 100, 250)
+    for a, b in zip(whole, chunk):
+        assert(np.array_equal(a[100:250], b))
+
+# residues off the scale raise the same KeyError either way
+def test_parity_unscored(monkeypatch):
+    tables = scoring.get_tables(test_obj)
+    with pytest.raises(KeyError) as fast:
+        scoring.Profile("ACDXF", "ACDEF", tables).windows(3)
+    monkeypatch.setattr(native, "available", False)
+    with pytest.raises(KeyError) as slow:
+        scoring.Profile("ACDXF", "ACDEF", tables).windows(3)
+    assert(str(fast.value) == str(slow.value))
@@ -0,0 +1,42 @@
+import os
+import shutil
+import subprocess
+import sys
+import pytest
+
+# add to path so tests can be run from home directory
+sys.path.append(".")
+from ASH import Analysis
+import fastaio
+
+# the stand-alone C++ port is built from ASH++ for the test
+pytestmark = pytest.mark.skipif(shutil.which("g++") is None,
+                                reason="no C++ compiler")
+
+
+def build(tmp_path):
+    program = str(tmp_path / "ash")
+    subprocess.run(["g++", "-std=c++11", "-O2", "-o", program,
+                    os.path.join("ASH++", "ash.cpp")], check=True)
+    return program
+
+
+
+""" ASH++ """
+
+# the port gives the Python hydro and structural scores for every kmer
+def test_matches_python(tmp_path):
+    program  = build(tmp_path)
+    analysis = Analysis.from_sequences(
+        fastaio.read_sequence("sample_data/ENV_HV1MN.fasta"),
+        fastaio.read_sequence("sample_data/ENV_HV1VI.fasta"), 12)
+    output   = subprocess.run([program, analysis.sequence1,
+                               analysis.sequence2, "12"], check=True,
+                              capture_output=True, text=True).stdout
+    rows     = [line.split("\t") for line in output.splitlines()]
+    results  = analysis.get_entries()
+    assert(len(rows) == len(results))
+    for row, e in zip(rows, results):
+        assert(int(row[0]) == e.pos and row[1] == e.seq and row[4] == e.analog)
+        assert(float(row[2]) == e.hy_score)
+        assert(float(row[3]) == e.str_score)
@@ -0,0 +1,112 @@
+import sys
+import numpy as np
+import pytest
+
+# add to path so tests can be run from home directory
+sys.path.append(".")
+from ASH import Analysis
+import scales
+import scoring
+
+test_obj = Analysis("sample_data/ENV_HV1MN.fasta",
+                    "sample_data/ENV_HV1VI.fasta", 15)
+RESIDUES = list(test_obj.hydro_weight) + ["-"]
+
+
+
+""" Scale """
+
+# the built-in ASH scales match the scalar methods
+def test_ash_scales_match_scalar():
+    hydro  = scales.get_scale("ash_hydro")
+    struct = scales.get_scale("ash_struct")
+    for a in RESIDUES:
+        for b in RESIDUES:
+            assert(hydro.pair(a, b) == test_obj.hydro_mismatch(a, b))
+            assert(struct.pair(a, b) == test_obj.structural_mismatch(a, b))
+
+# the classic scales score by the difference of their weights
+def test_kyte_doolittle():
+    kd = scales.get_scale("kyte_doolittle")
+    assert(kd.mismatch("IR", "IK") == pytest.approx(0.6))
+    assert(kd.mismatch("ND", "NE") == 0.25)
+    assert(kd.pair("A", "-") == 9.0)
+    with pytest.raises(KeyError):
+        kd.pair("A", "X")
+
+# unknown policies fill in residues off the scale
+def test_unknown_policies():
+    gap = scales.Scale("test_gap", {"A": 0.0, "D": 1.0, "N": 0.0},
+                       gap=2.0, unknown="gap")
+    assert(gap.pair("a", "A") == 0)
+    assert(gap.pair("B", "D") == 0.5)
+    assert(gap.pair("X", "A") == 2.0)
+    ignore = scales.Scale("test_ignore", {"A": 0.0, "D": 1.0},
+                          unknown="ignore")
+    assert(ignore.pair("X", "A") == 0)
+    with pytest.raises(ValueError):
+        scales.Scale("test_bad", {"A": 0.0}, unknown="guess")
+
+# scales can be read from a file and are registered
+def test_load_scale(tmp_path):
+    path = tmp_path / "tiny.scale"
+    path.write_text("# a test scale\nunknown = ignore\ntie = 0.5\n"
+                    "A 1.0\nd -1\nN 1.0\n")
+    scale = scales.load_scale(str(path))
+    assert(scale.name == "tiny")
+    assert(scales.get_scale("tiny") is scale)
+    assert(scale.pair("A", "D") == 2.0)
+    assert(scale.pair("A", "N") == 0.5)
+    assert(scale.pair("A", "W") == 0)
+
+def test_load_scale_errors(tmp_path):
+    path = tmp_path / "bad.scale"
+    path.write_text("A 1.0\nspeed = 3\n")
+    with pytest.raises(ValueError) as error:
+        scales.load_scale(str(path))
+    assert("line 2" in str(error.value))
+
+
+
+""" ScaleProfile """
+
+# one pass over several scales gives each scale's window scores
+def test_score_scales():
+    names  = ["kyte_doolittle", "hopp_woods", "ash_hydro"]
+    found  = test_obj.score_scales(names)
+    seq1   = test_obj.sequence1
+    seq2   = test_obj.sequence2
+    assert(len(found.pos) == len(test_obj.get_entries()))
+    for name in names:
+        scale = scales.get_scale(name)
+        for p in [0, 7, len(found.pos) - 1]:
+            expected = scale.mismatch(seq1[p:p + 15], seq2[p:p + 15])
+            assert(found.scores[name][p] == pytest.approx(expected))
+    # ASH's own scale agrees with the main scan
+    assert(np.array_equal(found.scores["ash_hydro"],
+                          test_obj.get_entries().hy_score))
+
+# a residue off a scale raises a KeyError, as the ASH scales do
+def test_score_scales_unknown():
+    profile = scales.ScaleProfile("AXD", "ACD", ["kyte_doolittle"])
+    with pytest.raises(KeyError):
+        profile.windows(2)
+
+
+
+""" Analysis unknown policy """
+
+# lowercase residues score like uppercase ones, X like a gap
+def test_analysis_unknown_gap():
+    upper = Analysis.from_sequences("", "", 3, aligned=["MKTAYD", "MKSAYE"])
+    lower = Analysis.from_sequences("", "", 3, aligned=["mktayd", "MKSAYE"],
+                                    unknown="gap")
+    assert(np.array_equal(upper.get_entries().hy_score,
+                          lower.get_entries().hy_score))
+    gapped = Analysis.from_sequences("", "", 3, aligned=["MK-AYD", "MKSAYE"])
+    masked = Analysis.from_sequences("", "", 3, aligned=["MKXAYD", "MKSAYE"],
+                                     unknown="gap")
+    assert(np.array_equal(gapped.get_entries().hy_score,
+                          masked.get_entries().hy_score))
+    with pytest.raises(KeyError):
+        Analysis.from_sequences("", "", 3, aligned=["MKXAYD", "MKSAYE"])
@@ -0,0 +1,118 @@
+import sys
+import random
+import numpy as np
+import pytest
+
+# add to path so tests can be run from home directory
+sys.path.append(".")
+from ASH import Analysis
+import fastaio
+import scan
+import scoring
+
+scorer = Analysis.__new__(Analysis)
+SEQ1 = fastaio.read_sequence("sample_data/ENV_HV1MN.fasta")
+SEQ2 = fastaio.read_sequence("sample_data/ENV_HV1VI.fasta")
+RESIDUES = "LAFYWIVHNCGMQPSTDERK-"
+
+
+# an aligned pair of random residues and gaps
+def random_pair(rng, length):
+    return ("".join(rng.choice(RESIDUES) for i in range(length)),
+            "".join(rng.choice(RESIDUES) for i in range(length)))
+
+def same_windows(found, expected):
+    for column in range(len(scoring.Windows._fields)):
+        assert(np.array_equal(found[column], expected[column]))
+
+# a scale whose scores don't add up exactly in floating point
+class Tenths(Analysis):
+    hydro_weight = dict((residue, weight / 5)
+                        for residue, weight in Analysis.hydro_weight.items())
+
+
+
+""" scan_windows """
+
+# chunked scans give exactly the serial windows, in either pool
+def test_matches_serial():
+    rng    = random.Random(3)
+    tables = scoring.get_tables(scorer)
+    seq1, seq2 = random_pair(rng, 500)
+    for length in (1, 4, 13):
+        expected = scoring.Profile(seq1, seq2, tables).windows(length)
+        for chunk_size in (1, 7, 100):
+            same_windows(scan.scan_windows(seq1, seq2, length, tables, 3,
+                                           chunk_size, "thread"), expected)
+        same_windows(scan.scan_windows(seq1, seq2, length, tables, 2, 64),
+                     expected)
+
+# fewer columns than a kmer gives no windows
+def test_short():
+    tables = scoring.get_tables(scorer)
+    found  = scan.scan_windows("LAF", "LAK", 5, tables, 2, 1, "thread")
+    assert(len(found.pos) == 0)
+
+# only scales whose sums are exact are chunked
+def test_sums_are_exact():
+    assert(scan.sums_are_exact(scoring.get_tables(scorer), 10 ** 6))
+    tables     = scoring.get_tables(Tenths.__new__(Tenths))
+    assert(not scan.sums_are_exact(tables, 100))
+    # the other scale is scored serially, and so exactly the same
+    seq1, seq2 = random_pair(random.Random(5), 300)
+    same_windows(scan.scan_windows(seq1, seq2, 9, tables, 2, 10, "thread"),
+                 scoring.Profile(seq1, seq2, tables).windows(9))
+
+# a residue off the scale raises the serial code's error
+def test_unscored():
+    tables = scoring.get_tables(scorer)
+    seq1   = "LAFK" * 40 + "X" + "LAFK" * 40
+    seq2   = "KFAL" * 40 + "B" + "KFAL" * 40
+    with pytest.raises(KeyError) as found:
+        scan.scan_windows(seq1, seq2, 6, tables, 2, 8, "thread")
+    with pytest.raises(KeyError) as expected:
+        scoring.Profile(seq1, seq2, tables).windows(6)
+    assert(str(found.value) == str(expected.value))
+    with pytest.raises(ValueError):
+        scan.scan_windows(seq1, seq2, 6, tables, pool="nope")
+
+
+
+""" Analysis """
+
+# workers give the same Results as the serial scan
+def test_analysis_workers():
+    expected = Analysis.from_sequences(SEQ1, SEQ2, 12).get_entries()
+    for pool in scan.POOLS:
+        found = Analysis.from_sequences(SEQ1, SEQ2, 12, workers=2,
+                                        chunk_size=100,
+                                        pool=pool).get_entries()
+        for name in ("pos", "hy_score", "str_score", "hy_pct", "str_pct"):
+            assert(list(getattr(found, name))
+                   == list(getattr(expected, name)))
+    with pytest.raises(ValueError):
+        Analysis.from_sequences(SEQ1, SEQ2, 12, workers=0)
+    with pytest.raises(ValueError):
+        Analysis.from_sequences(SEQ1, SEQ2, 12, pool="nope")
+
+
+
+""" ScoreTables """
+
+# the cached tables don't keep the Analysis they were built from alive
+def test_tables_hold_no_analysis():
+    import gc
+    import weakref
+    class Triples(Analysis):
+        hydro_weight = dict((residue, weight * 3) for residue, weight
+                            in Analysis.hydro_weight.items())
+    analysis = Triples.from_sequences(SEQ1, SEQ2, 12)
+    tables   = scoring.get_tables(analysis)
+    alive    = weakref.ref(analysis)
+    del analysis
+    gc.collect()
+    assert(alive() is None)
+    # the scalar functions still score, and raise, as the scale does
+    assert(tables.hydro_pair("D", "L") == 3.0)
+    with pytest.raises(KeyError):
+        tables.hydro_pair("X", "L")
@@ -0,0 +1,85 @@
+import sys
+import numpy as np
+
+# add to path so tests can be run from home directory
+sys.path.append(".")
+from ASH import Analysis
+import aligner
+import fastaio
+import selection
+
+test_obj = Analysis("sample_data/ENV_HV1MN.fasta", "sample_data/ENV_HV1VI.fasta", 15)
+
+
+
+""" best_schedule """
+
+# the heavy middle window beats the two it overlaps
+def test_schedule_simple():
+    chosen = selection.best_schedule(np.array([0, 2, 4]),
+                                     np.array([1.0, 5.0, 1.0]), 3)
+    assert(list(chosen) == [1])
+
+# two light windows that fit together beat one heavier one
+def test_schedule_pair():
+    chosen = selection.best_schedule(np.array([0, 2, 4]),
+                                     np.array([2.0, 3.0, 2.0]), 3)
+    assert(list(chosen) == [0, 2])
+
+# a gap pushes compatible windows further apart
+def test_schedule_gap():
+    chosen = selection.best_schedule(np.array([0, 2, 4]),
+                                     np.array([2.0, 3.0, 2.0]), 3, gap=2)
+    assert(list(chosen) == [1])
+
+
+
+""" select_epitopes """
+
+# chosen windows never overlap and the total adds up
+def test_select_epitopes_no_overlap():
+    chosen = test_obj.select_epitopes(gap=1)
+    starts = chosen.windows.pos
+    assert(np.all(np.diff(starts) >= 15 + 1))
+    assert(chosen.total == sum(e.hy_score for e in chosen))
+
+# the filter limits the candidates
+def test_select_epitopes_where():
+    chosen = test_obj.select_epitopes(score="str_score", where="hy_score > 5")
+    assert(len(chosen) > 0)
+    assert(all(e.hy_score > 5 for e in chosen))
+
+# a function can score the windows
+def test_select_epitopes_function():
+    chosen = test_obj.select_epitopes(score=lambda r: r.hy_score * r.hy_pct)
+    assert(len(chosen) > 0)
+
+# covering finds the chosen window over a residue of the original sequence
+def test_select_epitopes_covering():
+    chosen = test_obj.select_epitopes()
+    for i, window in enumerate(chosen):
+        start, end = chosen.residues(i)
+        assert(test_obj.first_fasta[start:end] == window.seq.replace("-", ""))
+        for residue in range(start, end):
+            assert([e.pos for e in chosen.covering(residue)] == [window.pos])
+    assert(len(chosen.covering(-100)) == 0)
+
+# residues are placed by where the aligner started, even when the aligned
+# region turns up earlier in the first sequence too
+def test_select_epitopes_repeated_region():
+    region   = test_obj.first_fasta[:250]
+    first    = region + "GGGGG" + region
+    second   = fastaio.read_sequence("sample_data/ENV_HV1VI.fasta")
+    pair     = Analysis.from_sequences(region, second, 15).aligned
+    start    = len(region) + 5 + pair.start
+    analysis = Analysis.from_sequences(first, second, 15,
+                                       aligned=aligner.Alignment(pair, start))
+    chosen   = analysis.select_epitopes()
+    assert(chosen.offset == start)
+    assert(len(chosen) > 0)
+    for i, window in enumerate(chosen):
+        begin, end = chosen.residues(i)
+        assert(begin >= start)
+        assert(first[begin:end] == window.seq.replace("-", ""))
+        assert([e.pos for e in chosen.covering(begin)] == [window.pos])
+        assert(len(chosen.covering(begin - len(region) - 5)) == 0)
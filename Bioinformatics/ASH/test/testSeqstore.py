@@ -0,0 +1,126 @@
+import os
+import pickle
+import sys
+import numpy as np
+import pytest
+
+# add to path so tests can be run from home directory
+sys.path.append(".")
+from ASH import Analysis
+import distinct
+import fastaio
+import seqstore
+
+scorer = Analysis.__new__(Analysis)
+
+# a multi-record file with wrapped lines, an empty record and a header
+# with more than one word
+MULTI = (b">first record\nMRVKGIRRNY\nQHWWGWG\n"
+         b">empty\n"
+         b">second\nMRVRGMQRNW\n"
+         b">third one\nPEPTIDE\n")
+
+
+# write the test data to a temporary file and convert it to a store
+def write_store(tmp_path, data=MULTI):
+    path = tmp_path / "multi.fasta"
+    path.write_bytes(data)
+    return str(path), seqstore.build_store(str(path))
+
+
+
+""" SequenceStore """
+
+# the records read back as they are in the FASTA file
+def test_round_trip(tmp_path):
+    fasta, path = write_store(tmp_path)
+    records     = list(fastaio.read_fasta(fasta))
+    with seqstore.SequenceStore(path) as store:
+        assert(len(store) == 4)
+        assert(store.headers == [r.header for r in records])
+        assert([r.sequence for r in store.records()]
+               == [r.sequence for r in records])
+        assert(store.sequence("second") == "MRVRGMQRNW")
+        assert(store.sequence(-1, 1, 4) == "EPT")
+        assert(store.length(1) == 0 and store.sequence("empty") == "")
+        assert(store.header("third") == "third one")
+        assert("first" in store and "record" not in store)
+        with pytest.raises(KeyError):
+            store.sequence("fourth")
+        with pytest.raises(IndexError):
+            store.sequence(4)
+
+# records are views of the map, not copies
+def test_zero_copy(tmp_path):
+    fasta, path = write_store(tmp_path)
+    store = seqstore.SequenceStore(path)
+    array = store.array("third")
+    assert(array.tobytes() == b"PEPTIDE")
+    assert(not array.flags.owndata and not array.flags.writeable)
+    assert(bytes(store.view(0)) == b"MRVKGIRRNYQHWWGWG")
+    store.close()
+
+# a store goes to another process as its path
+def test_pickle(tmp_path):
+    fasta, path = write_store(tmp_path)
+    store = seqstore.SequenceStore(path)
+    assert(len(pickle.dumps(store)) < 200)
+    copy  = pickle.loads(pickle.dumps(store))
+    assert(copy.sequence(2) == store.sequence(2))
+
+# open_store builds the store once, and again when the FASTA changes
+def test_open_store(tmp_path):
+    fasta = str(tmp_path / "one.fasta")
+    with open(fasta, "w") as outfile:
+        outfile.write(">a\nLAFK\n")
+    store = seqstore.open_store(fasta)
+    assert(store.path == fasta + ".ash" and store.sequence(0) == "LAFK")
+    with open(fasta, "w") as outfile:
+        outfile.write(">a\nKKKK\n")
+    os.utime(fasta, (0, os.path.getmtime(store.path) + 10))
+    assert(seqstore.open_store(fasta).sequence(0) == "KKKK")
+    assert(seqstore.open_store(store.path).path == store.path)
+
+# anything else is not a store
+def test_not_a_store(tmp_path):
+    fasta, path = write_store(tmp_path)
+    assert(seqstore.is_store(path) and not seqstore.is_store(fasta))
+    with pytest.raises(ValueError):
+        seqstore.SequenceStore(fasta)
+
+
+
+""" using a store """
+
+# a store can be named wherever a FASTA file can
+def test_read_sequence(tmp_path):
+    fasta, path = write_store(tmp_path)
+    assert(fastaio.read_sequence(path) == "MRVKGIRRNYQHWWGWG")
+    assert(fastaio.read_sequence(path + ":second") == "MRVRGMQRNW")
+
+# Analysis gives the same results from a store
+def test_analysis(tmp_path):
+    path     = seqstore.build_store("test/test2.fasta",
+                                    str(tmp_path / "test2.ash"))
+    expected = Analysis("test/test1.fasta", "test/test2.fasta", 9)
+    found    = Analysis("test/test1.fasta", path, 9)
+    assert(found.aligned == expected.aligned)
+    assert(list(found.get_entries().hy_score)
+           == list(expected.get_entries().hy_score))
+
+# a KmerIndex of a store uses its buffer as it is, and finds the same
+# distances, in this process or several
+def test_kmer_index(tmp_path):
+    path     = seqstore.build_store("sample_data/ENV_HV1VI.fasta",
+                                    str(tmp_path / "targets.ash"))
+    query    = fastaio.read_sequence("test/test1.fasta")
+    expected = distinct.KmerIndex.from_fasta("sample_data/ENV_HV1VI.fasta",
+                                             9, scorer)
+    index    = distinct.KmerIndex.from_fasta(path, 9, scorer)
+    assert(np.shares_memory(index.codes, index.store.codes))
+    assert("codes" not in index.__getstate__())
+    one      = distinct.min_distances(query, expected, processes=1)
+    many     = distinct.min_distances(query, index, processes=2,
+                                      chunk_size=64)
+    for column in range(len(one)):
+        assert(np.array_equal(one[column], many[column], equal_nan=True))
@@ -0,0 +1,154 @@
+import os
+import sys
+import asyncio
+import subprocess
+import threading
+import pytest
+
+# add to path so tests can be run from home directory
+sys.path.append(".")
+from ASH import Analysis
+import aligner
+import fastaio
+import server
+
+FASTA1 = "sample_data/ENV_HV1MN.fasta"
+FASTA2 = "sample_data/ENV_HV1VI.fasta"
+QUERY  = fastaio.read_sequence(FASTA1)
+TARGET = fastaio.read_sequence(FASTA2)
+# the query with a residue that isn't on the scale
+UNKNOWN = QUERY[:100] + "X" + QUERY[101:]
+
+
+# runs a JobServer on an event loop in another thread for the length
+# of a test, listening on the Unix socket at path or on a free port
+class Running(object):
+
+    def __init__(self, path=None, **options):
+        self.path    = path
+        self.server  = server.JobServer(**options)
+        self.loop    = asyncio.new_event_loop()
+        self.thread  = threading.Thread(target=self.loop.run_forever)
+
+    def __enter__(self):
+        self.thread.start()
+        self.call(self.server.start(self.path))
+        return self
+
+    def __exit__(self, *exc):
+        self.call(self.server.close())
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+
+    def call(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result()
+
+    def client(self):
+        if self.path is not None:
+            return server.Client(self.path)
+        return server.Client(host="127.0.0.1",
+                             port=self.server.address()[1])
+
+
+def same_results(found, expected):
+    assert(found.seq1 == expected.seq1 and found.seq2 == expected.seq2)
+    assert(found.length == expected.length)
+    for name in ("pos", "hy_score", "str_score", "hy_pct", "str_pct"):
+        assert(list(getattr(found, name)) == list(getattr(expected, name)))
+
+
+
+""" JobServer """
+
+# a job through the server gives what Analysis gives, a chunk at a time
+def test_matches_analysis():
+    expected = Analysis(FASTA1, FASTA2, 12).get_entries()
+    with Running(processes=1, chunk_rows=100) as running:
+        with running.client() as client:
+            chunks = list(client.stream(12, query=QUERY, target=TARGET))
+            assert(len(chunks) == (len(expected) + 99) // 100)
+            assert(all(len(chunk) <= 100 for chunk in chunks))
+            # files are read by the server, and kept
+            same_results(client.analyze(12, fasta1=FASTA1, fasta2=FASTA2),
+                         expected)
+            same_results(client.analyze(12, fasta1=FASTA1, fasta2=FASTA2),
+                         expected)
+        assert(sorted(running.server.sequences) == [FASTA1, FASTA2])
+
+# the same over a Unix socket, with jobs run in worker processes
+def test_unix_socket_and_pool(tmpdir):
+    path = str(tmpdir.join("ash.sock"))
+    with Running(path, processes=2) as running:
+        with running.client() as client:
+            same_results(client.analyze(12, query=QUERY, target=TARGET),
+                         Analysis.from_sequences(QUERY, TARGET,
+                                                 12).get_entries())
+
+# a socket left behind is replaced, but any other file is left alone
+def test_socket_path(tmpdir):
+    path = str(tmpdir.join("ash.sock"))
+    with Running(path):
+        pass
+    assert(os.path.exists(path))
+    with Running(path) as running:
+        with running.client() as client:
+            assert(len(client.analyze(12, query=QUERY, target=TARGET)) > 0)
+    other = tmpdir.join("notes.txt")
+    other.write("keep me")
+    with pytest.raises(FileExistsError):
+        asyncio.run(server.JobServer().start(str(other)))
+    assert(other.read() == "keep me")
+
+# requests that share a query and arrive together go as one batch
+def test_batching():
+    jobs = [(QUERY, TARGET), (QUERY, TARGET[:400]), (QUERY, TARGET[300:]),
+            (TARGET, QUERY)]
+
+    async def submit_all(job_server):
+        return await asyncio.gather(*[job_server.submit(query, target, 10)
+                                      for query, target in jobs])
+
+    with Running(processes=1, batch_delay=0.2) as running:
+        hits = running.call(submit_all(running.server))
+        assert(running.server.stats["requests"] == 4)
+        assert(running.server.stats["batches"] == 2)
+    for hit, (query, target) in zip(hits, jobs):
+        same_results(hit.entries, Analysis.from_sequences(query, target,
+                                                          10).get_entries())
+
+# a bad job is reported and the connection can go on
+def test_errors():
+    with Running(processes=1) as running:
+        with running.client() as client:
+            with pytest.raises(RuntimeError) as error:
+                client.analyze(12, query=UNKNOWN, target=TARGET)
+            assert("KeyError" in str(error.value))
+            with pytest.raises(RuntimeError):
+                client.analyze(0, query=QUERY, target=TARGET)
+            with pytest.raises(RuntimeError):
+                client.analyze(12, query=QUERY)
+            found = client.analyze(12, query=UNKNOWN, target=TARGET,
+                                   unknown="ignore")
+            assert(len(found) > 0)
+        assert(running.server.stats["errors"] == 3)
+
+# jobs use the aligner the server was started with
+def test_aligner():
+    with Running(processes=2, align_backend="banded") as running:
+        with running.client() as client:
+            same_results(client.analyze(12, query=QUERY, target=TARGET),
+                         Analysis.from_sequences(
+                             QUERY, TARGET, 12,
+                             align_backend="banded").get_entries())
+    with pytest.raises(ValueError):
+        server.JobServer(align_backend="nope")
+
+# warming a worker imports scikit-bio for ssw
+@pytest.mark.skipif(not aligner.have_skbio(), reason="needs scikit-bio")
+def test_warm_imports_backend():
+    code   = ("import sys, server; assert 'skbio' not in sys.modules; "
+              "server.warm('ssw'); print('skbio' in sys.modules)")
+    output = subprocess.run([sys.executable, "-c", code], check=True,
+                            capture_output=True, text=True).stdout
+    assert(output.strip() == "True")
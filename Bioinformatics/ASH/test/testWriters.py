@@ -0,0 +1,96 @@
+import sys
+import numpy as np
+import pytest
+
+# add to path so tests can be run from home directory
+sys.path.append(".")
+from ASH import Analysis
+import writers
+
+test_obj = Analysis("test/test1.fasta", "test/test2.fasta", 15)
+results = test_obj.get_entries()
+
+
+
+""" tsv """
+
+# each row holds the str() of each attribute, with no stray tab
+def test_tsv_rows(tmp_path):
+    path = str(tmp_path / "out.tsv")
+    with writers.open_writer(path, "tsv") as outfile:
+        outfile.write(results)
+    lines = open(path).read().split("\n")
+    assert(lines[0] == "\t".join(writers.COLUMNS))
+    assert(lines[-1] == "")
+    for line, e in zip(lines[1:-1], results):
+        assert(line == "\t".join(map(str, [e.seq, e.pos, e.hy_score,
+                                           e.str_score, e.analog, e.hy_pct,
+                                           e.str_pct])))
+    assert(len(lines) == len(results) + 2)
+
+# key columns lead each row
+def test_tsv_keys(tmp_path):
+    path = str(tmp_path / "out.tsv")
+    with writers.open_writer(path, "tsv", [("k", int)]) as outfile:
+        outfile.write(results[:2], k = 15)
+        outfile.write(test_obj.seq_to_seq(test_obj.sequence1,
+                                          test_obj.sequence2, 8)[:1], k = 8)
+    lines = open(path).read().split("\n")
+    assert(lines[0].startswith("k\tseq\t"))
+    assert([line.split("\t")[0] for line in lines[1:4]] == ["15", "15", "8"])
+
+
+
+""" binary formats """
+
+# npy keeps native types, one mappable file per column
+def test_npy(tmp_path):
+    path = str(tmp_path / "out")
+    with writers.open_writer(path, "npy", [("target", str)]) as outfile:
+        outfile.write(results, target = "HV1VI")
+    data = writers.read_npy(path)
+    assert(sorted(data) == sorted(["target"] + writers.COLUMNS))
+    assert(isinstance(data["pos"], np.memmap))
+    assert(data["pos"].dtype == np.int64)
+    assert(np.array_equal(data["hy_score"], results.hy_score))
+    assert(data["seq"][3].decode() == results[3].seq)
+    assert(set(data["target"]) == set(["HV1VI"]))
+
+# writes are appended, and a column widens for longer strings
+def test_npy_appends(tmp_path):
+    path  = str(tmp_path / "out")
+    short = test_obj.seq_to_seq(test_obj.sequence1, test_obj.sequence2, 8)
+    with writers.open_writer(path, "npy", [("target", str)]) as outfile:
+        outfile.write(short, target = "a")
+        outfile.write(results, target = "longer")
+    data = writers.read_npy(path)
+    assert(len(data["pos"]) == len(short) + len(results))
+    assert(list(data["pos"]) == short.pos.tolist() + results.pos.tolist())
+    assert([s.decode() for s in data["seq"]] ==
+           [e.seq for e in short] + [e.seq for e in results])
+    assert(list(data["target"]) == ["a"] * len(short) +
+                                   ["longer"] * len(results))
+    # nothing written still gives loadable, empty columns
+    with writers.open_writer(path, "npy", [("k", int)]) as outfile:
+        pass
+    data = writers.read_npy(path)
+    assert(len(data["k"]) == 0 and data["k"].dtype == np.int64)
+
+# arrow and parquet hold the same table
+def test_arrow_and_parquet(tmp_path):
+    pa = pytest.importorskip("pyarrow")
+    import pyarrow.parquet
+    for fmt in ["arrow", "parquet"]:
+        with writers.open_writer(str(tmp_path / fmt), fmt,
+                                 [("k", int)]) as outfile:
+            outfile.write(results, k = 15)
+    arrow = pa.ipc.open_file(pa.memory_map(str(tmp_path / "arrow"))).read_all()
+    parquet = pyarrow.parquet.read_table(str(tmp_path / "parquet"))
+    assert(arrow.equals(parquet))
+    assert(arrow.column("str_score").to_pylist() == results.str_score.tolist())
+    assert(arrow.column("analog").to_pylist()[5] == results[5].analog)
+
+# unknown formats are refused
+def test_unknown_format(tmp_path):
+    with pytest.raises(ValueError):
+        writers.open_writer(str(tmp_path / "out"), "csv")
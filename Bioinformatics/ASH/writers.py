@@ -0,0 +1,330 @@
+#----------------------------------------------------------------------#
+#                       ASH output writers                             #
+#----------------------------------------------------------------------#
+# Writes Results (see models/Results.py) to a file, a column at a time #
+# rather than an Entry at a time. Four formats are supported:          #
+#                                                                      #
+#   tsv      tab separated text, the classic run_ash.py output         #
+#   npy      a directory of NumPy .npy files, one per column, which    #
+#            np.load(..., mmap_mode="r") can memory-map                #
+#   arrow    an Arrow IPC file, which can be memory-mapped as is       #
+#   parquet  a Parquet file                                            #
+#                                                                      #
+# The binary formats keep the numbers as int64/float64 so they can be  #
+# loaded without parsing, and npy and arrow are written as they go.    #
+# arrow and parquet need pyarrow, which is only imported when one of   #
+# them is asked for.                                                   #
+#                                                                      #
+# Every writer can put extra "key" columns in front of the results,    #
+# such as the kmer size of a multi-k scan or the target id of a batch  #
+# screen, so many Results can go to one long table.                    #
+#----------------------------------------------------------------------#
+
+
+import os
+import numpy as np
+
+# the columns of an ASH report, in the order run_ash.py writes them
+COLUMNS = ["seq", "pos", "hy_score", "str_score", "analog", "hy_pct",
+           "str_pct"]
+
+# the formats open_writer knows about
+FORMATS = ["tsv", "parquet", "arrow", "npy"]
+
+# rows formatted and written at a time
+CHUNK_ROWS = 1 << 16
+
+# buffer for the text writer
+BUFFER_SIZE = 1 << 20
+
+# bytes kept for the header of each .npy file, so it can be rewritten
+# in place with the final row count
+NPY_HEADER_SIZE = 128
+
+
+#----------------------------------------------------------------------#
+#                            peptides                                  #
+#----------------------------------------------------------------------#
+# Slices the kmer at each position out of an aligned sequence          #
+#----------------------------------------------------------------------#
+def peptides(seq, positions, length):
+    return [seq[p:p + length] for p in positions]
+
+
+#----------------------------------------------------------------------#
+#                            open_writer                               #
+#----------------------------------------------------------------------#
+# Returns a writer for the given format. keys is a list of (name,      #
+# type) pairs for the leading key columns, type being int or str, and  #
+# every write then gives a value for each key, e.g.                    #
+#                                                                      #
+#   with open_writer("out.tsv", "tsv", [("k", int)]) as out:           #
+#       out.write(results, k = 8)                                      #
+#----------------------------------------------------------------------#
+def open_writer(filename, fmt="tsv", keys=()):
+    writers = { "tsv":     TsvWriter,
+                "npy":     NpyWriter,
+                "arrow":   ArrowWriter,
+                "parquet": ParquetWriter }
+    if fmt not in writers:
+        raise ValueError("unknown output format %r, use one of %s"
+                         % (fmt, ", ".join(FORMATS)))
+    return writers[fmt](filename, list(keys))
+
+
+#----------------------------------------------------------------------#
+#                           Writer(class)                              #
+#----------------------------------------------------------------------#
+# What the writers have in common: the key columns, with-statement     #
+# support, and a check that every write gives all the keys             #
+#----------------------------------------------------------------------#
+class Writer(object):
+
+    def __init__(self, filename, keys):
+        self.filename = filename
+        self.keys     = keys
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # the values of the key columns for one write, in order
+    def key_values(self, values):
+        if sorted(values) != sorted(name for name, kind in self.keys):
+            raise ValueError("expected values for keys %s, got %s"
+                             % ([name for name, kind in self.keys],
+                                sorted(values)))
+        return [values[name] for name, kind in self.keys]
+
+
+#----------------------------------------------------------------------#
+#                          TsvWriter(class)                            #
+#----------------------------------------------------------------------#
+# Tab separated text with a header row. Each chunk of rows is turned   #
+# into strings one column at a time and written in a single call. The  #
+# numbers are written exactly as str() writes them, with the mismatch  #
+# scores written as 0 when nothing mismatched, as the Entry holds them #
+#----------------------------------------------------------------------#
+class TsvWriter(Writer):
+
+    def __init__(self, filename, keys):
+        Writer.__init__(self, filename, keys)
+        self.outfile = open(filename, "w", buffering=BUFFER_SIZE)
+        header = [name for name, kind in keys] + COLUMNS
+        self.outfile.write("\t".join(header) + "\n")
+
+    def write(self, results, **keys):
+        key_values = [str(v) for v in self.key_values(keys)]
+        for start in range(0, len(results), CHUNK_ROWS):
+            rows = results[start:start + CHUNK_ROWS]
+            pos  = rows.pos.tolist()
+            columns = [[value] * len(rows) for value in key_values]
+            columns += [peptides(rows.seq1, pos, rows.length),
+                        list(map(str, pos)),
+                        [str(v) if v else "0" for v in rows.hy_score.tolist()],
+                        [str(v) if v else "0" for v in rows.str_score.tolist()],
+                        peptides(rows.seq2, pos, rows.length),
+                        list(map(str, rows.hy_pct.tolist())),
+                        list(map(str, rows.str_pct.tolist()))]
+            lines = map("\t".join, zip(*columns))
+            self.outfile.write("\n".join(lines) + "\n")
+
+    def close(self):
+        self.outfile.close()
+
+
+#----------------------------------------------------------------------#
+#                         ColumnWriter(class)                          #
+#----------------------------------------------------------------------#
+# Base for the binary writers. Turns each write into a dict of arrays, #
+# one per column, with the peptides as strings                         #
+#----------------------------------------------------------------------#
+class ColumnWriter(Writer):
+
+    def columns(self, results, keys):
+        pos     = results.pos.tolist()
+        columns = {}
+        for (name, kind), value in zip(self.keys, self.key_values(keys)):
+            columns[name] = np.full(len(results), value,
+                                    dtype=np.int64 if kind is int else object)
+        columns["seq"]       = peptides(results.seq1, pos, results.length)
+        columns["pos"]       = results.pos
+        columns["hy_score"]  = results.hy_score
+        columns["str_score"] = results.str_score
+        columns["analog"]    = peptides(results.seq2, pos, results.length)
+        columns["hy_pct"]    = results.hy_pct
+        columns["str_pct"]   = results.str_pct
+        return columns
+
+
+#----------------------------------------------------------------------#
+#                          NpyWriter(class)                            #
+#----------------------------------------------------------------------#
+# Writes filename as a directory holding one .npy file per column,     #
+# which np.load(..., mmap_mode="r") maps without reading it (see       #
+# read_npy). Each write is appended to the files as it comes, and the  #
+# headers are written over with the row counts on close, so nothing    #
+# is kept in memory. Peptides are fixed-width byte strings and string  #
+# keys fixed-width unicode; if a write has longer strings than the     #
+# column so far (a bigger kmer, a longer target id), that one column   #
+# is rewritten at the new width                                        #
+#----------------------------------------------------------------------#
+class NpyWriter(ColumnWriter):
+
+    def __init__(self, filename, keys):
+        ColumnWriter.__init__(self, filename, keys)
+        if not os.path.isdir(filename):
+            os.makedirs(filename)
+        self.rows   = 0
+        self.dtypes = {}
+        self.files  = {}
+        for name in [name for name, kind in keys] + COLUMNS:
+            if name in ("seq", "analog"):
+                self.dtypes[name] = np.dtype("S1")
+            elif (name, str) in keys:
+                self.dtypes[name] = np.dtype("U1")
+            elif name == "pos" or (name, int) in keys:
+                self.dtypes[name] = np.dtype(np.int64)
+            else:
+                self.dtypes[name] = np.dtype(np.float64)
+            path = os.path.join(filename, name + ".npy")
+            self.files[name] = open(path, "w+b")
+            self.files[name].write(npy_header(self.dtypes[name], 0))
+
+    def write(self, results, **keys):
+        for name, values in self.columns(results, keys).items():
+            kind   = self.dtypes[name].kind
+            if kind in "SU":
+                values = np.asarray(values, dtype=kind)
+                if values.dtype.itemsize > self.dtypes[name].itemsize:
+                    self.widen(name, values.dtype)
+            self.files[name].write(values.astype(self.dtypes[name],
+                                                 copy=False).tobytes())
+        self.rows += len(results)
+
+    # rewrites a string column with a wider dtype
+    def widen(self, name, dtype):
+        column = self.files[name]
+        column.seek(NPY_HEADER_SIZE)
+        values = np.frombuffer(column.read(), dtype=self.dtypes[name])
+        column.seek(NPY_HEADER_SIZE)
+        column.truncate()
+        column.write(values.astype(dtype).tobytes())
+        self.dtypes[name] = dtype
+
+    def close(self):
+        for name, column in self.files.items():
+            column.seek(0)
+            column.write(npy_header(self.dtypes[name], self.rows))
+            column.close()
+
+
+#----------------------------------------------------------------------#
+#                            npy_header                                #
+#----------------------------------------------------------------------#
+# The header of a version 1.0 .npy file holding rows values of dtype,  #
+# padded to NPY_HEADER_SIZE bytes whatever the row count               #
+#----------------------------------------------------------------------#
+def npy_header(dtype, rows):
+    text = ("{'descr': %r, 'fortran_order': False, 'shape': (%d,), }"
+            % (np.lib.format.dtype_to_descr(dtype), rows))
+    text = text.ljust(NPY_HEADER_SIZE - 11) + "\n"
+    return (b"\x93NUMPY\x01\x00" + (len(text)).to_bytes(2, "little") +
+            text.encode("latin1"))
+
+
+#----------------------------------------------------------------------#
+#                             read_npy                                 #
+#----------------------------------------------------------------------#
+# Opens what NpyWriter wrote as a dict of column name to array, each   #
+# memory-mapped read-only                                              #
+#----------------------------------------------------------------------#
+def read_npy(dirname, mmap_mode="r"):
+    columns = {}
+    for filename in sorted(os.listdir(dirname)):
+        if filename.endswith(".npy"):
+            columns[filename[:-4]] = np.load(os.path.join(dirname, filename),
+                                             mmap_mode=mmap_mode)
+    return columns
+
+
+#----------------------------------------------------------------------#
+#                          ArrowWriter(class)                          #
+#----------------------------------------------------------------------#
+# Writes each Results as a record batch of an Arrow IPC file. Readers  #
+# can memory-map the file with pyarrow.ipc.open_file and use the       #
+# columns without copying                                              #
+#----------------------------------------------------------------------#
+class ArrowWriter(ColumnWriter):
+
+    def __init__(self, filename, keys):
+        ColumnWriter.__init__(self, filename, keys)
+        pa = import_pyarrow("arrow")
+        self.pa     = pa
+        self.schema = arrow_schema(pa, keys)
+        self.sink   = pa.OSFile(filename, "wb")
+        self.writer = self.open(self.sink)
+
+    def open(self, sink):
+        return self.pa.ipc.new_file(sink, self.schema)
+
+    def write(self, results, **keys):
+        columns = self.columns(results, keys)
+        table   = self.pa.Table.from_pydict(columns, schema=self.schema)
+        self.write_table(table)
+
+    def write_table(self, table):
+        self.writer.write_table(table, max_chunksize=CHUNK_ROWS)
+
+    def close(self):
+        self.writer.close()
+        self.sink.close()
+
+
+#----------------------------------------------------------------------#
+#                         ParquetWriter(class)                         #
+#----------------------------------------------------------------------#
+# Same as ArrowWriter, but each write goes in as a Parquet row group   #
+#----------------------------------------------------------------------#
+class ParquetWriter(ArrowWriter):
+
+    def open(self, sink):
+        import pyarrow.parquet
+        return pyarrow.parquet.ParquetWriter(sink, self.schema)
+
+    def write_table(self, table):
+        self.writer.write_table(table, row_group_size=CHUNK_ROWS)
+
+
+#----------------------------------------------------------------------#
+#                          import_pyarrow                              #
+#----------------------------------------------------------------------#
+# pyarrow is only needed for two of the formats, so it is imported     #
+# when they're used, with a useful message if it isn't installed       #
+#----------------------------------------------------------------------#
+def import_pyarrow(fmt):
+    try:
+        import pyarrow
+        import pyarrow.ipc
+    except ImportError:
+        raise ImportError("the %s format needs pyarrow, install it with "
+                          "'pip install pyarrow'" % fmt)
+    return pyarrow
+
+
+#----------------------------------------------------------------------#
+#                           arrow_schema                               #
+#----------------------------------------------------------------------#
+# The Arrow schema for an ASH report with the given key columns        #
+#----------------------------------------------------------------------#
+def arrow_schema(pa, keys):
+    fields = []
+    for name, kind in keys:
+        fields.append((name, pa.int64() if kind is int else pa.string()))
+    fields += [("seq", pa.string()), ("pos", pa.int64()),
+               ("hy_score", pa.float64()), ("str_score", pa.float64()),
+               ("analog", pa.string()), ("hy_pct", pa.float64()),
+               ("str_pct", pa.float64())]
+    return pa.schema(fields)
@@ -1,53 +1,334 @@
 #!python3
+import os
+import sys
+from collections import Counter
+import numpy as np
+
+# the FASTA parser is shared with ASH
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             "..", "..", "..", "Bioinformatics", "ASH"))
+import fastaio
+import seqstore
+
+# residues read at a time by the counting methods
+BLOCK_SIZE = 1 << 20
+
+# the letters kmer_counts packs, 2 bits each for DNA and 5 for protein
+DNA = "ACGT"
+PROTEIN = "ACDEFGHIKLMNPQRSTVWY"
+
+# the largest dense array of kmer counts, 16M entries
+DENSE_BITS = 24
+
+
+# bits per letter, and a table from byte value to the letter's number
+# (either case) or -1 for letters that aren't in the alphabet
+def kmer_table(alphabet):
+    bits = max(1, (len(alphabet) - 1).bit_length())
+    table = np.full(256, -1, dtype = np.int64)
+    for i, letter in enumerate(alphabet):
+        table[ord(letter.upper())] = i
+        table[ord(letter.lower())] = i
+    return bits, table
+
+# the number kmer_counts packs a kmer into, for looking it up in a dense
+# array of counts
+def kmer_code(kmer, alphabet):
+    bits, table = kmer_table(alphabet)
+    return int(pack_kmers(np.frombuffer(kmer.encode("ascii"), np.uint8),
+                          len(kmer), bits, table)[0])
+
+# packs every kmer of an array of residue codes into a uint64, first
+# letter highest, leaving out kmers with a letter off the alphabet. runs
+# of 1, 2, 4, ... letters are packed at every position, each from two
+# runs half as long, and a kmer is put together from the runs its
+# length adds up to, so it takes log k passes over the array, not k
+def pack_kmers(codes, k, bits, table):
+    count = len(codes) - k + 1
+    if count < 1:
+        return np.empty(0, dtype = np.uint64)
+    ranks = table[codes]
+    runs = {1: np.maximum(ranks, 0).astype(np.uint64)}
+    width = 1
+    while width * 2 <= k:
+        shorter = runs[width]
+        runs[width * 2] = ((shorter[:-width] << np.uint64(width * bits))
+                           | shorter[width:])
+        width *= 2
+    hashes = None
+    done = 0
+    for width in sorted(runs, reverse = True):
+        if done + width > k:
+            continue
+        part = runs[width][done:done + count]
+        if hashes is None:
+            hashes = part.copy()
+        else:
+            hashes <<= np.uint64(width * bits)
+            hashes |= part
+        done += width
+    # kmers with a letter that isn't counted
+    bad = np.zeros(len(codes) + 1, dtype = np.int64)
+    np.cumsum(ranks < 0, out = bad[1:])
+    return hashes[bad[k:] == bad[:count]]
+
+# the kmers packed into numbers, back as strings
+def unpack_kmers(hashes, k, bits, alphabet):
+    letters = np.frombuffer(alphabet.encode("ascii"), dtype = np.uint8)
+    shifts = np.arange(k - 1, -1, -1, dtype = np.uint64) * np.uint64(bits)
+    mask = np.uint64((1 << bits) - 1)
+    ranks = (hashes[:, None] >> shifts) & mask
+    rows = letters[ranks.astype(np.intp)]
+    return [row.tobytes().decode("ascii") for row in rows]
+
+
 class Sequence(object):
 
-    # read fasta file on initialization
-    def __init__(self, filename):
+    # read fasta file on initialization, or with a record id or lazy=True
+    # look the record up in the file's .fai index and read it on demand.
+    # a store made by seqstore.py is mapped, never read whole
+    def __init__(self, filename, record_id = None, lazy = False):
         self.filename = filename
-        self.sequence = self.get_seq(filename)
+        self.header = ''
+        self.record_id = record_id
+        self.index = None
+        self.store = None
+        self._sequence = None
+        if seqstore.is_store(filename):
+            self.store = seqstore.SequenceStore(filename)
+            if record_id is None:
+                self.record_id = 0
+            self.header = self.store.header(self.record_id)
+        elif record_id is not None or lazy == True:
+            self.index = fastaio.FastaIndex(filename)
+            if record_id is None:
+                self.record_id = self.index.names[0]
+            self.header = self.record_id
+        else:
+            self._sequence = self.get_seq(filename)
+
+    # the whole sequence, read from the index the first time it's needed
+    @property
+    def sequence(self):
+        if self._sequence is None and self.store is not None:
+            return self.store.sequence(self.record_id)
+        if self._sequence is None:
+            self._sequence = self.index.fetch(self.record_id)
+        return self._sequence
+
+    @sequence.setter
+    def sequence(self, value):
+        self._sequence = value
 
     # allow sequence to be displayed in text
     def __str__(self):
         return self.sequence
 
-    # funciton that gets the sequence from FASTA
+    # funciton that gets the sequence of the first record from FASTA
     def get_seq(self, filename):
-        seq = ''
-        data = open(filename, 'r').readlines()
-        for line in data:
-            if not line.startswith('>'): # skips header
-                line = line.replace('\n', '')
-                seq += line
-        return seq
+        record = fastaio.first_record(filename)
+        self.header = record.header
+        return record.sequence
+
+    # the residues as a NumPy array of their ASCII codes; from a store
+    # it is a view of the mapped file, not a copy
+    def codes(self):
+        if self._sequence is None and self.store is not None:
+            return self.store.array(self.record_id)
+        return np.frombuffer(self.sequence.encode("ascii", "replace"),
+                             dtype = np.uint8)
+
+    # one Sequence per record of a multi-record FASTA or a store, read
+    # lazily
+    @classmethod
+    def records(cls, filename):
+        if seqstore.is_store(filename):
+            store = seqstore.SequenceStore(filename)
+            for i in range(len(store)):
+                seq = cls.__new__(cls)
+                seq.filename = filename
+                seq.header = store.header(i)
+                seq.record_id = i
+                seq.index = None
+                seq.store = store
+                seq._sequence = None
+                yield seq
+            return
+        for record in fastaio.read_fasta(filename):
+            seq = cls.__new__(cls)
+            seq.filename = filename
+            seq.header = record.header
+            seq.record_id = None
+            seq.index = None
+            seq.store = None
+            seq.sequence = record.sequence
+            yield seq
+
+    # residues start to end (0-based, end excluded); a lazy Sequence only
+    # reads the lines of the file that hold them
+    def subseq(self, start, end):
+        if self._sequence is None and self.store is not None:
+            return self.store.sequence(self.record_id, start, end)
+        if self._sequence is None:
+            return self.index.fetch(self.record_id, start, end)
+        return self._sequence[start:end]
 
     # returns length to be seen as float
     def length(self):
+        if self._sequence is None and self.store is not None:
+            return float(self.store.length(self.record_id))
+        if self._sequence is None:
+            return float(self.index.length(self.record_id))
         return float(len(self.sequence))
 
-    # takes a list of residues to count and return dict or count or %
+    # takes a list of residues to count and return dict or count or %.
+    # every residue is counted in one pass over the sequence
     def res_count(self, res_list, percent = False):
+        histogram = self.histogram()
         res_dict = {}
         for res in res_list:
-            res_count = self.sequence.count(res)
-            res_dict[res] = res_count
+            # the histogram reads letters outside ASCII as "?"
+            if len(res) == 1 and ord(res) < 128 and res != "?":
+                res_dict[res] = int(histogram[ord(res)])
+            else:
+                # a run of residues, counted the old way
+                res_dict[res] = self.sequence.count(res)
         if percent == True:
+            length = self.length()
             for res in res_dict:
-                res_dict[res] = round((res_dict[res] / self.length()) * 100, 2)
+                res_dict[res] = round((res_dict[res] / length) * 100, 2)
         return res_dict
 
-    # takes number for 'k', returns kmers in self.sequence
+    # how many times each letter appears, counted in one pass over the
+    # whole sequence, as a dict of the letters that appear or % of them
+    def composition(self, percent = False):
+        histogram = self.histogram()
+        counts = {chr(code): int(histogram[code])
+                  for code in np.flatnonzero(histogram)}
+        if percent == True:
+            length = self.length()
+            for res in counts:
+                counts[res] = round((counts[res] / length) * 100, 2)
+        return counts
+
+    # counts of every byte value, 256 of them, a block at a time
+    def histogram(self):
+        histogram = np.zeros(256, dtype = np.int64)
+        for start, block in self.blocks():
+            histogram += np.bincount(block, minlength = 256)
+        return histogram
+
+    # (start, codes) for the residues a block at a time, each block
+    # running overlap residues into the next so no kmer is cut in two.
+    # a lazy Sequence reads one block of the file at a time, and a store
+    # hands out views of the map
+    def blocks(self, overlap = 0, size = None):
+        if size is None:
+            size = BLOCK_SIZE
+        length = int(self.length())
+        for start in range(0, max(length - overlap, 1), size):
+            end = min(start + size + overlap, length)
+            if self._sequence is None and self.store is not None:
+                yield start, self.store.array(self.record_id)[start:end]
+            elif self._sequence is None:
+                block = self.index.fetch(self.record_id, start, end)
+                yield start, np.frombuffer(block.encode("ascii", "replace"),
+                                           dtype = np.uint8)
+            else:
+                yield start, self.codes()[start:end]
+
+    # takes number for 'k', returns kmers in self.sequence as a list
     def kmers(self, kmer_length):
-        kmer_pool = []
-        kmer_start = 0
-        kmer_end = int(kmer_length)
-        sequence_end = self.length()
-        # increments along sequence, storing kmers
-        while kmer_start + int(kmer_length) <= sequence_end:
-            kmer = self.sequence[int(kmer_start):int(kmer_end)]
-            kmer_pool.append(kmer)
-            kmer_start += 1
-            kmer_end += 1
-        return kmer_pool
+        return list(self.iter_kmers(kmer_length))
+
+    # the kmers one at a time, without a list of them all
+    def iter_kmers(self, kmer_length):
+        k = int(kmer_length)
+        for start, block in self.blocks(k - 1):
+            text = block.tobytes().decode("ascii", "replace")
+            for i in range(len(text) - k + 1):
+                yield text[i:i + k]
+
+    # every kmer as a row of a (count, k) array of residue codes. the
+    # rows are strided views of the residues, so nothing is copied
+    def kmer_view(self, kmer_length):
+        codes = self.codes()
+        k = int(kmer_length)
+        if k > len(codes):
+            return np.empty((0, k), dtype = np.uint8)
+        return np.lib.stride_tricks.sliding_window_view(codes, k)
+
+    # counts every kmer by packing its residues into an integer, 2 bits
+    # each for DNA and 5 for protein. alphabet is the letters to count,
+    # DNA if the sequence is nothing but ACGTN and protein otherwise by
+    # default; kmers with any other letter in them aren't counted.
+    # returns a Counter of kmer to count, or with dense=True an array
+    # indexed by the packed kmer (see kmer_code), which needs a small k
+    def kmer_counts(self, kmer_length, alphabet = None, dense = False):
+        k = int(kmer_length)
+        if alphabet is None:
+            alphabet = self.guess_alphabet()
+        bits, table = kmer_table(alphabet)
+        if k < 1 or k * bits > 64:
+            raise ValueError("can't pack %d-mers of %d letters into 64 bits"
+                             % (k, len(alphabet)))
+        if dense and k * bits > DENSE_BITS:
+            raise ValueError("too many %d-mers for an array, use a Counter"
+                             % k)
+        counts = (np.zeros(1 << (k * bits), dtype = np.int64) if dense
+                  else Counter())
+        for start, block in self.blocks(k - 1):
+            hashes = pack_kmers(block, k, bits, table)
+            if dense:
+                counts += np.bincount(hashes.astype(np.intp),
+                                      minlength = len(counts))
+                continue
+            found, number = np.unique(hashes, return_counts = True)
+            counts.update(dict(zip(unpack_kmers(found, k, bits, alphabet),
+                                   number.tolist())))
+        return counts
+
+    # "ACGT" if that's all the sequence holds (N, an unknown base, is
+    # allowed but not counted), or the 20 amino acids
+    def guess_alphabet(self):
+        histogram = self.histogram()
+        present = {chr(code).upper() for code in np.flatnonzero(histogram)}
+        if present <= set(DNA + "N"):
+            return DNA
+        return PROTEIN
+
+    # kmer counts over every record of a multi-record file (or store),
+    # read one record at a time. alphabet must be given for dense=True so
+    # every record packs the same way
+    @classmethod
+    def file_kmer_counts(cls, filename, kmer_length, alphabet = None,
+                         dense = False):
+        if dense and alphabet is None:
+            raise ValueError("give the alphabet to count a file densely")
+        total = None
+        for seq in cls.records(filename):
+            counts = seq.kmer_counts(kmer_length, alphabet, dense)
+            if total is None:
+                total = counts
+            else:
+                total += counts
+        if total is None:
+            total = Counter()
+        return total
+
+    # the composition of every record of a multi-record file together
+    @classmethod
+    def file_composition(cls, filename, percent = False):
+        histogram = np.zeros(256, dtype = np.int64)
+        for seq in cls.records(filename):
+            histogram += seq.histogram()
+        counts = {chr(code): int(histogram[code])
+                  for code in np.flatnonzero(histogram)}
+        if percent == True:
+            length = float(histogram.sum())
+            for res in counts:
+                counts[res] = round((counts[res] / length) * 100, 2)
+        return counts
 
     # shows user the available methods.
     def show_methods(self):
@@ -56,5 +337,14 @@ class Sequence(object):
         get_seq() # displays representation of sequence
         length()  # returns integer of length
         res_count() # takes list of residues, returns dicts of counts or %
-        kmers(<value of 'k' for kmers>)\n"""
+        kmers(<value of 'k' for kmers>)
+        subseq(<start>, <end>) # part of the sequence, lazily if lazy
+        codes() # residues as a NumPy array, mapped from a store
+        composition() # count of every letter, in one pass
+        iter_kmers(<k>) # the kmers one at a time
+        kmer_view(<k>) # the kmers as rows of an array, not copied
+        kmer_counts(<k>) # Counter of kmer counts, or an array if dense
+        Sequence.file_kmer_counts(<filename>, <k>) # over every record
+        Sequence.file_composition(<filename>) # over every record
+        Sequence.records(<filename>) # one Sequence per record\n"""
         print(methods_list)
@@ -0,0 +1,158 @@
+import sys
+import random
+from collections import Counter
+import numpy as np
+import pytest
+
+# add to path so tests can be run from home directory
+sys.path.append(".")
+import fasta
+from fasta import Sequence
+import seqstore
+
+
+def write_fasta(path, records):
+    with open(str(path), "w") as handle:
+        for header, residues in records:
+            handle.write(">" + header + "\n")
+            for start in range(0, len(residues), 60):
+                handle.write(residues[start:start + 60] + "\n")
+    return str(path)
+
+# every kmer of every record, upper cased, that is all in alphabet
+def brute_force(sequences, k, alphabet):
+    counts = Counter()
+    for residues in sequences:
+        residues = residues.upper()
+        for i in range(len(residues) - k + 1):
+            kmer = residues[i:i + k]
+            if all(letter in alphabet for letter in kmer):
+                counts[kmer] += 1
+    return counts
+
+# the same residues read whole, lazily and from a store
+def every_source(tmp_path, residues):
+    path = write_fasta(tmp_path / "seq.fasta", [("seq", residues)])
+    store = seqstore.build_store(path, str(tmp_path / "seq.ash"))
+    return [Sequence(path), Sequence(path, lazy = True), Sequence(store)]
+
+@pytest.fixture
+def small_blocks(monkeypatch):
+    monkeypatch.setattr(fasta, "BLOCK_SIZE", 64)
+
+RNG = random.Random(7)
+# DNA with unknown bases and lower case letters, and protein with
+# letters that aren't amino acids
+DNA_SEQ = "".join(RNG.choice("ACGTACGTACGTNacgt") for i in range(3000))
+PROTEIN_SEQ = "".join(RNG.choice(fasta.PROTEIN * 4 + "XBZ*")
+                      for i in range(3000))
+
+
+
+""" kmer_counts """
+
+# DNA kmers, counted across blocks, are the ones a Counter finds
+def test_dna_counts(tmp_path, small_blocks):
+    for seq in every_source(tmp_path, DNA_SEQ):
+        assert(seq.guess_alphabet() == fasta.DNA)
+        for k in (1, 3, 8, 31, 32):
+            assert(seq.kmer_counts(k) ==
+                   brute_force([DNA_SEQ], k, fasta.DNA))
+
+# protein kmers skip the letters off the alphabet
+def test_protein_counts(tmp_path, small_blocks):
+    for seq in every_source(tmp_path, PROTEIN_SEQ):
+        assert(seq.guess_alphabet() == fasta.PROTEIN)
+        for k in (1, 2, 5, 12):
+            assert(seq.kmer_counts(k) ==
+                   brute_force([PROTEIN_SEQ], k, fasta.PROTEIN))
+        with pytest.raises(ValueError):
+            seq.kmer_counts(13)
+
+# a dense array holds the same counts, indexed by kmer_code
+def test_dense_counts(tmp_path, small_blocks):
+    seq = every_source(tmp_path, DNA_SEQ)[1]
+    dense = seq.kmer_counts(6, dense = True)
+    expected = brute_force([DNA_SEQ], 6, fasta.DNA)
+    assert(dense.sum() == sum(expected.values()))
+    for kmer, count in expected.items():
+        assert(dense[fasta.kmer_code(kmer, fasta.DNA)] == count)
+    with pytest.raises(ValueError):
+        seq.kmer_counts(13, dense = True)
+
+# every k packs to the same numbers the letters give one by one
+def test_pack_kmers():
+    bits, table = fasta.kmer_table(fasta.PROTEIN)
+    codes = np.frombuffer(PROTEIN_SEQ[:500].encode("ascii"), np.uint8)
+    for k in range(1, 13):
+        found = fasta.unpack_kmers(fasta.pack_kmers(codes, k, bits, table),
+                                   k, bits, fasta.PROTEIN)
+        assert(Counter(found) ==
+               brute_force([PROTEIN_SEQ[:500]], k, fasta.PROTEIN))
+    assert(len(fasta.pack_kmers(codes[:3], 4, bits, table)) == 0)
+
+# a file's counts are the sum of its records', no kmer spanning two
+def test_file_kmer_counts(tmp_path, small_blocks):
+    records = [("a", DNA_SEQ[:700]), ("b", DNA_SEQ[700:2000]),
+               ("c", DNA_SEQ[2000:])]
+    path = write_fasta(tmp_path / "many.fasta", records)
+    store = seqstore.build_store(path, str(tmp_path / "many.ash"))
+    expected = brute_force([r for h, r in records], 5, fasta.DNA)
+    for name in (path, store):
+        assert(Sequence.file_kmer_counts(name, 5) == expected)
+        dense = Sequence.file_kmer_counts(name, 5, fasta.DNA, dense = True)
+        assert(dense.sum() == sum(expected.values()))
+    with pytest.raises(ValueError):
+        Sequence.file_kmer_counts(path, 5, dense = True)
+
+
+
+""" iter_kmers and kmer_view """
+
+# kmers come out in order, none lost at the block edges
+def test_iter_kmers(tmp_path, small_blocks):
+    expected = [DNA_SEQ[i:i + 10] for i in range(len(DNA_SEQ) - 9)]
+    for seq in every_source(tmp_path, DNA_SEQ):
+        assert(list(seq.iter_kmers(10)) == expected)
+        assert(seq.kmers(10) == expected)
+
+# the view's rows are the kmers, strided over the residues, not copied
+def test_kmer_view(tmp_path):
+    for seq in every_source(tmp_path, PROTEIN_SEQ):
+        view = seq.kmer_view(9)
+        assert(view.shape == (len(PROTEIN_SEQ) - 8, 9))
+        assert(view.strides == (1, 1))
+        assert(not view.flags.owndata)
+        # neighbouring rows are the same memory, one byte apart
+        assert(np.shares_memory(view[0], view[1]))
+        assert(view[5].tobytes().decode() == PROTEIN_SEQ[5:14])
+    # from a store the rows are in the mapped file itself
+    store = seq.store
+    assert(np.shares_memory(view, store.codes))
+    assert(seq.kmer_view(len(PROTEIN_SEQ) + 1).shape ==
+           (0, len(PROTEIN_SEQ) + 1))
+
+
+
+""" composition and res_count """
+
+# one pass gives what counting each letter gives
+def test_composition(tmp_path, small_blocks):
+    for seq in every_source(tmp_path, PROTEIN_SEQ):
+        assert(seq.composition() == dict(Counter(PROTEIN_SEQ)))
+        percent = seq.composition(percent = True)
+        assert(percent["L"] == round(PROTEIN_SEQ.count("L") / 30.0, 2))
+    records = [("a", PROTEIN_SEQ[:1000]), ("b", DNA_SEQ)]
+    path = write_fasta(tmp_path / "both.fasta", records)
+    assert(Sequence.file_composition(path) ==
+           dict(Counter(PROTEIN_SEQ[:1000] + DNA_SEQ)))
+
+# residues are counted as str.count would, letters outside ASCII too
+def test_res_count(tmp_path):
+    seq = every_source(tmp_path, PROTEIN_SEQ)[0]
+    residues = ["L", "K", "X", "O", "LK"]
+    assert(seq.res_count(residues) ==
+           dict((res, PROTEIN_SEQ.count(res)) for res in residues))
+    seq.sequence = "ACDΩΩ"
+    assert(seq.res_count(["Ω", "Ж", "?", "A"]) ==
+           {"Ω": 2, "Ж": 0, "?": 0, "A": 1})
@@ -1,5 +1,10 @@
 
+import os
 import random
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from statistics import NormalDist
+import numpy as np
 
 
 
@@ -84,20 +89,136 @@ class MonteHall(object):
 
 
 
+""" the totals of a simulation: games played, wins when staying and when
+switching, and the win rates with their confidence intervals """
+SimulationResult = namedtuple("SimulationResult", ["games", "stayWins",
+	"switchWins", "stayRate", "switchRate", "stayInterval", "switchInterval"])
+
+# games drawn at a time, enough to keep NumPy busy but small in memory
+CHUNK_SIZE = 1 << 22
+
+
+""" plays one chunk of games with its own random stream, returns only the
+number of games and how many of them staying and switching won """
+def playChunk(task):
+	seed, games, doors, opened, doorToGuess = task
+	rng = np.random.default_rng(seed)
+
+	# where the car is, and the first guess
+	car = rng.integers(0, doors, games, dtype=np.int32)
+	if doorToGuess is None:
+		guess = rng.integers(0, doors, games, dtype=np.int32)
+	else:
+		guess = np.full(games, doorToGuess, dtype=np.int32)
+
+	# staying wins when the first guess was right
+	stayWin = car == guess
+
+	# ~ NOTE: the host opens `opened` goat doors that weren't guessed, which
+	# ~ leaves doors - 1 - opened closed doors to switch to. If the first
+	# ~ guess was wrong the car is always one of them (the host never opens
+	# ~ it), and a random pick among them finds it 1 time in that many, so
+	# ~ which goat doors were opened doesn't need to be drawn at all
+	remaining = doors - 1 - opened
+	switchPick = rng.integers(0, remaining, games, dtype=np.int32)
+	switchWin = ~stayWin & (switchPick == 0)
+
+	return games, int(stayWin.sum()), int(switchWin.sum())
+
+
+""" Wilson score interval for wins out of games at the given confidence """
+def confidenceInterval(wins, games, confidence=0.95):
+	if games == 0:
+		return (0.0, 1.0)
+	z = NormalDist().inv_cdf(0.5 + confidence / 2)
+	rate = wins / games
+	denominator = 1 + z * z / games
+	centre = (rate + z * z / (2 * games)) / denominator
+	spread = z * (rate * (1 - rate) / games + z * z / (4 * games * games)) ** 0.5
+	return (max(0.0, centre - spread / denominator),
+		min(1.0, centre + spread / denominator))
+
+
+""" runs numberOfGames games with NumPy a chunk at a time, across processes
+(all cores by default, 1 plays them here). Each chunk gets its own stream
+spawned from seed, so a seed gives the same counts however many processes
+there are. doors and opened generalize the game: the host opens `opened`
+goat doors out of `doors`. doorToGuess is a door number from 0, or None to
+guess at random. Only the counts are kept, never the games """
+def simulateGames(numberOfGames, doors=3, opened=1, doorToGuess=None,
+		seed=None, processes=None, chunkSize=CHUNK_SIZE, confidence=0.95):
+	if doors < 3:
+		raise ValueError("the game needs at least 3 doors")
+	if not 1 <= opened <= doors - 2:
+		raise ValueError("the host can open from 1 to doors - 2 doors")
+	if doorToGuess is not None and not 0 <= doorToGuess < doors:
+		raise ValueError("doorToGuess must be a door from 0 to doors - 1")
+	if chunkSize < 1:
+		raise ValueError("chunkSize must be at least 1")
+	if numberOfGames < 0:
+		raise ValueError("numberOfGames can't be negative")
+
+	# one independent random stream per chunk
+	sizes = [min(chunkSize, numberOfGames - start)
+		for start in range(0, numberOfGames, chunkSize)]
+	streams = np.random.SeedSequence(seed).spawn(len(sizes))
+	tasks = [(stream, size, doors, opened, doorToGuess)
+		for stream, size in zip(streams, sizes)]
+
+	if processes is None:
+		processes = os.cpu_count() or 1
+	if processes == 1 or len(tasks) <= 1:
+		counts = map(playChunk, tasks)
+	else:
+		with ProcessPoolExecutor(processes) as pool:
+			counts = list(pool.map(playChunk, tasks))
+
+	# running totals
+	games = stayWins = switchWins = 0
+	for chunkGames, chunkStay, chunkSwitch in counts:
+		games += chunkGames
+		stayWins += chunkStay
+		switchWins += chunkSwitch
+
+	return SimulationResult(
+		games = games,
+		stayWins = stayWins,
+		switchWins = switchWins,
+		stayRate = stayWins / games if games else 0.0,
+		switchRate = switchWins / games if games else 0.0,
+		stayInterval = confidenceInterval(stayWins, games, confidence),
+		switchInterval = confidenceInterval(switchWins, games, confidence)
+	)
+
+
+
+
 ############| ~ main ~ |############
 
-# get 5000 runs of the game, with and without switching
-switchResults = MonteHall.runSimulations(
-	doorToGuess = "door1", numberOfGames = 5000, switchDoors = True
-)
-nonSwitchResults = MonteHall.runSimulations(
-	doorToGuess = "door1", numberOfGames = 5000, switchDoors = False
-)
-
-# get number of cars for each set of simulations
-switchWins = [g for g in switchResults if g == "Car"]
-nonSwitchWins = [g for g in nonSwitchResults if g == "Car"]
-
-# find percent
-print("With switching:", len(switchWins)/len(switchResults))
-print("Without switching:", len(nonSwitchWins)/len(nonSwitchResults))
+if __name__ == "__main__":
+
+	# get 5000 runs of the game, with and without switching
+	switchResults = MonteHall.runSimulations(
+		doorToGuess = "door1", numberOfGames = 5000, switchDoors = True
+	)
+	nonSwitchResults = MonteHall.runSimulations(
+		doorToGuess = "door1", numberOfGames = 5000, switchDoors = False
+	)
+
+	# get number of cars for each set of simulations
+	switchWins = [g for g in switchResults if g == "Car"]
+	nonSwitchWins = [g for g in nonSwitchResults if g == "Car"]
+
+	# find percent
+	print("With switching:", len(switchWins)/len(switchResults))
+	print("Without switching:", len(nonSwitchWins)/len(nonSwitchResults))
+
+	# the same with the NumPy engine, on far more games, for 3 doors and
+	# for 10 doors with 8 of them opened
+	for doors, opened in [(3, 1), (10, 8)]:
+		result = simulateGames(10 ** 7, doors = doors, opened = opened, seed = 0)
+		print("%d doors, %d opened, %d games:" % (doors, opened, result.games))
+		print("  With switching: %.5f (95%% CI %.5f-%.5f)"
+			% ((result.switchRate,) + result.switchInterval))
+		print("  Without switching: %.5f (95%% CI %.5f-%.5f)"
+			% ((result.stayRate,) + result.stayInterval))
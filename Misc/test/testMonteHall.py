@@ -0,0 +1,82 @@
+import sys
+import pytest
+
+# add to path so tests can be run from home directory
+sys.path.append(".")
+from MonteHall import simulateGames, playChunk, confidenceInterval
+
+
+# whether rate is inside the interval a simulation gave for it
+def inside(rate, interval):
+	return interval[0] <= rate <= interval[1]
+
+
+
+""" simulateGames """
+
+# a seed gives the same counts however many processes play the chunks
+def test_seed_and_processes():
+	one = simulateGames(100000, seed=3, processes=1, chunkSize=7000)
+	two = simulateGames(100000, seed=3, processes=2, chunkSize=7000)
+	assert(one == two)
+	assert(one.games == 100000)
+	other = simulateGames(100000, seed=4, processes=1, chunkSize=7000)
+	assert((other.stayWins, other.switchWins) !=
+		(one.stayWins, one.switchWins))
+
+# three doors: staying wins 1/3 of the time, switching 2/3
+def test_three_doors():
+	result = simulateGames(200000, seed=0, processes=1, confidence=0.999)
+	assert(inside(1 / 3, result.stayInterval))
+	assert(inside(2 / 3, result.switchInterval))
+	# a fixed first guess doesn't change the odds
+	result = simulateGames(200000, doorToGuess=2, seed=1, processes=1,
+		confidence=0.999)
+	assert(inside(1 / 3, result.stayInterval))
+	assert(inside(2 / 3, result.switchInterval))
+
+# n doors with k opened: staying wins 1/n, switching (n-1)/(n(n-1-k))
+def test_many_doors():
+	for doors, opened in [(4, 1), (4, 2), (10, 3), (10, 8)]:
+		result = simulateGames(200000, doors=doors, opened=opened,
+			seed=doors + opened, processes=1, chunkSize=50000,
+			confidence=0.999)
+		assert(inside(1 / doors, result.stayInterval))
+		assert(inside((doors - 1) / (doors * (doors - 1 - opened)),
+			result.switchInterval))
+		assert(result.stayWins + result.switchWins <= result.games)
+
+# games that can't be played are refused
+def test_errors():
+	for options in [dict(doors=2), dict(opened=0), dict(opened=2),
+			dict(doors=5, opened=4), dict(doorToGuess=3),
+			dict(doorToGuess=-1), dict(chunkSize=0)]:
+		with pytest.raises(ValueError):
+			simulateGames(100, processes=1, **options)
+	with pytest.raises(ValueError):
+		simulateGames(-1, processes=1)
+	# no games gives no wins
+	assert(simulateGames(0, processes=1).stayRate == 0.0)
+
+
+
+""" playChunk and confidenceInterval """
+
+# a chunk returns only its counts
+def test_play_chunk():
+	games, stay, switch = playChunk((5, 1000, 3, 1, None))
+	assert(games == 1000 and stay + switch == 1000)
+	# with one door left to switch to, one of the two always wins
+	games, stay, switch = playChunk((5, 1000, 5, 3, 0))
+	assert(stay + switch == 1000)
+
+# the Wilson interval holds the rate and stays within 0 and 1
+def test_confidence_interval():
+	low, high = confidenceInterval(50, 100)
+	assert(low < 0.5 < high)
+	assert(high - low == pytest.approx(2 * 0.0962, abs=0.001))
+	assert(confidenceInterval(0, 10)[0] == pytest.approx(0.0, abs=1e-12))
+	assert(confidenceInterval(10, 10)[1] == pytest.approx(1.0))
+	assert(confidenceInterval(0, 0) == (0.0, 1.0))
+	wide = confidenceInterval(50, 100, 0.99)
+	assert(wide[0] < low and wide[1] > high)